@@ -0,0 +1,41 @@
+// Sincronización de los paneles admin (index.html y registro-rapido.html).
+// Usa API_URL, getHeaders y fetchConAuth, que define cada página.
+
+// Sincronización incremental: la primera carga trae la lista completa y las
+// siguientes solo lo que cambió desde el cursor (cabecera X-Cursor).
+// Devuelve la lista ordenada, o null si no hubo cambios (304).
+function crearSincronizador(recurso, perteneceALista, ordenar) {
+    const filas = new Map();
+    let cursor = null;
+    return async function sincronizar() {
+        const url = cursor ? `${API_URL}/${recurso}?since=${cursor}` : `${API_URL}/${recurso}`;
+        const response = await fetchConAuth(url, { headers: getHeaders() });
+        if (response.status === 304) return null;
+        const datos = await response.json();
+        if (!response.ok || datos.error) throw new Error(datos.error || `HTTP ${response.status}`);
+
+        if (!cursor) filas.clear();
+        datos.forEach(r => !r.eliminado && perteneceALista(r) ? filas.set(r.id, r) : filas.delete(r.id));
+        cursor = response.headers.get('X-Cursor');
+        return [...filas.values()].sort(ordenar);
+    };
+}
+
+// Avisos del servidor (SSE): ante cualquier cambio en los registros se
+// sincroniza al momento. Al (re)conectar también, por si hubo cambios mientras
+// estaba caído; sin conexión se sigue consultando cada pocos segundos.
+let eventosConectados = false;
+function conectarEventos(alCambiar) {
+    if (!window.EventSource) return;
+    let pendiente = null;
+    const avisar = () => {
+        // Agrupar ráfagas (p. ej. varias validaciones seguidas) en una sola consulta
+        clearTimeout(pendiente);
+        pendiente = setTimeout(alCambiar, 300);
+    };
+    const fuente = new EventSource(`${API_URL}/admin/eventos?token=${localStorage.getItem('admin_token')}`);
+    fuente.onopen = () => { eventosConectados = true; avisar(); };
+    fuente.onerror = () => { eventosConectados = false; };
+    ['registro', 'comprobante', 'pago_validado', 'pago_rechazado', 'estado',
+     'dorsal_entregado', 'asistencia', 'eliminado', 'recargar'].forEach(tipo => fuente.addEventListener(tipo, avisar));
+}
@@ -1,25 +1,97 @@
 import os
+import time
+
+# Inicio de la carga del módulo, para medir el arranque en frío de cada worker
+INICIO_CARGA = time.perf_counter()
+
 from flask import Flask, jsonify, request, session, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json, execute_values
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from dotenv import load_dotenv
 import uuid
-import resend
+import base64
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
+from decimal import Decimal
 import secrets
 import hashlib
-from PIL import Image
+import mimetypes
+import unicodedata
 import io
-import pdfplumber
+import re
+import csv
+import codecs
+import json
+import zlib
+import gzip
+import importlib
+import queue
+import select
+import threading
+from functools import lru_cache
+from itertools import chain, islice
+from concurrent.futures import ThreadPoolExecutor
+
+# Dependencias opcionales: sin ellas se usa el JSON de Flask y solo gzip
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import resource
+except ImportError:  # Windows: sin RSS en el log de arranque
+    resource = None
+
+# Import compatible con `gunicorn backend.app:app` y con `python backend/app.py`
+try:
+    from backend.pdf_resultados import extraer_registros_pdf, campo_encabezado
+    from backend.logs import obtener_logger, configurar_logs
+    from backend.migraciones import VERSION_ESQUEMA, aplicar_migraciones, sql_sin_tildes, version_actual
+except ImportError:
+    from pdf_resultados import extraer_registros_pdf, campo_encabezado
+    from logs import obtener_logger, configurar_logs
+    from migraciones import VERSION_ESQUEMA, aplicar_migraciones, sql_sin_tildes, version_actual
 
 load_dotenv()
 
-# Configurar Resend API Key
-resend.api_key = os.getenv('API_KEY_RESEND')
+# Logs estructurados y no bloqueantes (ver backend/logs.py; APP_ENV=production los reduce)
+configurar_logs()
+log = obtener_logger('app')
+log_email = obtener_logger('email')
+log_comprobantes = obtener_logger('comprobantes')
+log_dorsales = obtener_logger('dorsales')
+log_importacion = obtener_logger('importacion')
+log_sse = obtener_logger('sse')
 
-app = Flask(__name__, static_folder='..', static_url_path='')
+# Dependencias pesadas que solo usan el correo, los comprobantes y la importación
+# de PDFs: se importan en el primer uso, así cada worker arranca antes y no las
+# carga en memoria si nunca las necesita. PRECARGAR_DEPENDENCIAS=1 las importa al
+# arrancar para que esa primera petición no pague la carga.
+DEPENDENCIAS_DIFERIDAS = ('resend', 'PIL.Image', 'pdfplumber')
+
+def cliente_resend():
+    """Módulo resend con la API key configurada (se importa con el primer correo)"""
+    import resend
+    resend.api_key = os.getenv('API_KEY_RESEND')
+    return resend
+
+def precargar_dependencias():
+    """Importa ahora las DEPENDENCIAS_DIFERIDAS"""
+    for modulo in DEPENDENCIAS_DIFERIDAS:
+        inicio = time.perf_counter()
+        importlib.import_module(modulo)
+        log.debug('Dependencia precargada', extra={'modulo': modulo,
+                                                   'ms': round((time.perf_counter() - inicio) * 1000)})
+
+# Sin carpeta static de Flask: los archivos del frontend los sirve servir_estatico
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))
 
 # Configuración de sesión para producción
@@ -48,7 +120,7 @@ def generar_token_admin(admin_id, admin_email):
                 conn.commit()
             conn.close()
     except Exception as e:
-        print(f"Error guardando token en BD: {e}")
+        log.error('Error guardando token en BD: %s', e)
         # Fallback a memoria si hay error
         valid_tokens[token] = {
             'admin_id': admin_id,
@@ -79,7 +151,7 @@ def verificar_token(token):
                         'admin_email': resultado['admin_email']
                     }
     except Exception as e:
-        print(f"Error verificando token en BD: {e}")
+        log.error('Error verificando token en BD: %s', e)
     
     # Fallback a memoria
     if token in valid_tokens:
@@ -92,51 +164,130 @@ def verificar_token(token):
     
     return None
 
-CORS(app, supports_credentials=True)
+# X-Cursor: cursor de sincronización incremental de los paneles (ver respuesta_sincronizada)
+CORS(app, supports_credentials=True, expose_headers=['X-Cursor'])
+
+# ===== JSON Y COMPRESIÓN DE RESPUESTAS =====
+
+COMPRESION_MINIMA = int(os.getenv('COMPRESION_MINIMA', 1024))  # Bytes; por debajo no compensa
+COMPRESION_TIPOS = {
+    'application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain',
+    'text/css', 'text/javascript', 'application/javascript'
+}
+BROTLI_CALIDAD = 5  # Al vuelo: tamaño cercano a gzip -9 a una fracción del costo de la calidad 11
+GZIP_NIVEL = 6
+
+class ProveedorJSONRapido(DefaultJSONProvider):
+    """Proveedor JSON de Flask con orjson: mismo formato que el proveedor por defecto
+    (fechas como fecha HTTP, Decimal como texto, claves ordenadas), serializado en C.
+    Las filas de RealDictCursor son dicts y orjson las recorre sin convertirlas."""
+    
+    def __init__(self, app):
+        super().__init__(app)
+        # Las fechas pasan por default (el _default de Flask) para no cambiar su formato
+        self._opciones = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._opciones).decode('utf-8')
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        opciones = self._opciones | (orjson.OPT_INDENT_2 if self._app.debug else 0)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=opciones),
+            mimetype=self.mimetype
+        )
+
+if orjson is not None:
+    app.json = ProveedorJSONRapido(app)
+
+@app.after_request
+def comprimir_respuesta(response):
+    """Comprime al vuelo (brotli o gzip) las respuestas de texto grandes. Las que ya
+    vienen comprimidas (estáticos, caché pública), los archivos y los streams se dejan igual."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESION_TIPOS):
+        return response
+    
+    cuerpo = response.get_data()
+    if len(cuerpo) < COMPRESION_MINIMA:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and request.accept_encodings.quality('br') > 0:
+        codificacion, comprimido = 'br', brotli.compress(cuerpo, quality=BROTLI_CALIDAD)
+    elif request.accept_encodings.quality('gzip') > 0:
+        codificacion, comprimido = 'gzip', gzip.compress(cuerpo, compresslevel=GZIP_NIVEL, mtime=0)
+    else:
+        return response
+    
+    response.set_data(comprimido)
+    response.headers['Content-Encoding'] = codificacion
+    etag, debil = response.get_etag()
+    if etag and not debil:
+        # Un ETag fuerte identifica los bytes: la versión comprimida necesita otro
+        response.set_etag(f'{etag}-{codificacion}')
+    return response
+
+# Separadores de horas/minutos/segundos que aparecen en los PDFs de cronometraje
+# (dos puntos ASCII, ratio "∶" y dos puntos de ancho completo "：")
+_TIEMPO_RE = re.compile(r'''
+    \s*
+    (?:
+        # HH:MM:SS(.cc) o MM:SS(.cc)
+        (?:(?P<h>\d+)\s*[:∶：]\s*)?(?P<m>\d+)\s*[:∶：]\s*(?P<s>\d+(?:[.,]\d+)?)\s*s?
+      | # 1h 02m 03s, 25m 31s, 45.2s
+        (?:(?P<uh>\d+)\s*h\s*)?(?:(?P<um>\d+)\s*m(?:in)?\s*)?(?:(?P<us>\d+(?:[.,]\d+)?)\s*s)?
+      | # Solo un número
+        (?P<n>\d+(?:[.,]\d+)?)
+    )
+    # Formatos chip/gun ("25:31 / 25:40", "25:31 (25:40)"): se toma el primer tiempo (chip)
+    \s*(?:[/|(].*)?$
+''', re.VERBOSE | re.DOTALL)
+
+# Caso común (HH:MM:SS o MM:SS con dos puntos ASCII), sin alternativas que probar
+_TIEMPO_SIMPLE_RE = re.compile(r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)')
+
+@lru_cache(maxsize=8192)
+def _parsear_tiempo(texto):
+    """Convierte un tiempo ya normalizado a texto en segundos (memoizado)"""
+    match = _TIEMPO_SIMPLE_RE.fullmatch(texto)
+    if match:
+        h, m, s = match.groups()
+        return int(h or 0) * 3600 + int(m) * 60 + float(s)
+    
+    match = _TIEMPO_RE.match(texto)
+    if not match:
+        return float('inf')
+    
+    h, m, s, uh, um, us, n = match.groups()
+    
+    if m is not None:  # HH:MM:SS o MM:SS
+        return int(h or 0) * 3600 + int(m) * 60 + float(s.replace(',', '.'))
+    if n is not None:  # Solo segundos o minutos
+        # Asumimos que es segundos si es un número pequeño, minutos si es grande
+        valor = float(n.replace(',', '.'))
+        return valor if valor < 3600 else valor * 60
+    if uh or um or us:  # Con unidades h/m/s
+        return int(uh or 0) * 3600 + int(um or 0) * 60 + float((us or '0').replace(',', '.'))
+    return float('inf')
 
 # Función auxiliar para convertir tiempo a segundos
 def tiempo_a_segundos(tiempo_str):
     """Convierte un tiempo en varios formatos a segundos"""
     if not tiempo_str:
         return float('inf')  # Los tiempos None van al final
-    
-    tiempo_str = str(tiempo_str).strip()
-    
-    try:
-        # Remover caracteres comunes y normalizar dos puntos
-        tiempo_str = tiempo_str.replace('s', '').replace('m', '').replace('h', '')
-        # Normalizar diferentes tipos de dos puntos a ":"
-        tiempo_str = tiempo_str.replace('∶', ':').replace(':', ':')
-        
-        partes = tiempo_str.split(':')
-        partes = [p.strip() for p in partes if p.strip()]
-        
-        if len(partes) == 3:  # HH:MM:SS
-            horas = int(partes[0])
-            minutos = int(partes[1])
-            segundos = float(partes[2])  # Usar float para decimales
-            return horas * 3600 + minutos * 60 + segundos
-        elif len(partes) == 2:  # MM:SS
-            minutos = int(partes[0])
-            segundos = float(partes[1])  # Usar float para decimales
-            return minutos * 60 + segundos
-        elif len(partes) == 1:  # Solo segundos o minutos
-            # Asumimos que es segundos si es un número pequeño, minutos si es grande
-            valor = float(partes[0])
-            return valor if valor < 3600 else valor * 60
-        else:
-            return float('inf')
-    except Exception as e:
-        print(f"Error convirtiendo tiempo '{tiempo_str}': {e}")
-        return float('inf')
+    return _parsear_tiempo(str(tiempo_str))
 
-def recalcular_posiciones_ranking(conn, ranking_id):
-    """Recalcula las posiciones de todos los registros en un ranking basándose en el tiempo"""
+def recalcular_posiciones_ranking(conn, ranking_id, commit=True):
+    """Recalcula las posiciones de todos los registros en un ranking basándose en el tiempo.
+    Devuelve {registro_id: nueva_posicion} solo para las filas cuya posición cambió.
+    Con commit=False forma parte de la transacción de quien llama y los errores se propagan."""
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
             # Obtener todos los registros del ranking
             cur.execute('''
-                SELECT id, tiempo FROM ranking_registros 
+                SELECT id, posicion, tiempo FROM ranking_registros 
                 WHERE ranking_id = %s
             ''', (ranking_id,))
             
@@ -145,18 +296,28 @@ def recalcular_posiciones_ranking(conn, ranking_id):
             # Ordenar por tiempo convertido a segundos
             registros_ordenados = sorted(registros, key=lambda x: tiempo_a_segundos(x['tiempo']))
             
-            # Actualizar las posiciones de forma secuencial
-            for nueva_posicion, registro in enumerate(registros_ordenados, 1):
-                cur.execute('''
-                    UPDATE ranking_registros 
-                    SET posicion = %s
-                    WHERE id = %s
-                ''', (nueva_posicion, registro['id']))
+            # Actualizar solo las posiciones que cambiaron (en lotes, no fila por fila)
+            cambios = {
+                registro['id']: nueva_posicion
+                for nueva_posicion, registro in enumerate(registros_ordenados, 1)
+                if registro['posicion'] != nueva_posicion
+            }
+            execute_values(cur, '''
+                UPDATE ranking_registros AS r
+                SET posicion = v.posicion
+                FROM (VALUES %s) AS v(id, posicion)
+                WHERE r.id = v.id
+            ''', list(cambios.items()), page_size=1000)
             
-            conn.commit()
+            if commit:
+                conn.commit()
+            return cambios
     except Exception as e:
-        print(f"Error recalculando posiciones: {e}")
+        log.error('Error recalculando posiciones: %s', e)
         conn.rollback()
+        if not commit:
+            raise
+        return {}
 
 # Configuración de carpetas
 # NOTA: En Railway, los archivos se guardan en el sistema de archivos efímero del contenedor
@@ -167,7 +328,7 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf'}
 
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
-    print(f"✓ Directorio de comprobantes creado: {UPLOAD_FOLDER}")
+    log.info('Directorio de comprobantes creado', extra={'ruta': UPLOAD_FOLDER})
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max
@@ -185,7 +346,7 @@ def get_db_connection():
         conn = psycopg2.connect(DATABASE_URL)
         return conn
     except Exception as e:
-        print(f"Error conectando a la base de datos: {e}")
+        log.error('Error conectando a la base de datos: %s', e)
         return None
 
 def send_email(to_email, subject, body):
@@ -198,13 +359,12 @@ def send_email(to_email, subject, body):
             "html": body,
         }
         
-        email = resend.Emails.send(params)
+        email = cliente_resend().Emails.send(params)
         email_id = email.get('id', 'N/A') if isinstance(email, dict) else 'N/A'
-        print(f"✓ Correo enviado exitosamente a {to_email} (ID: {email_id})")
+        log_email.info('Correo enviado', extra={'destino': to_email, 'email_id': email_id})
         return True
     except Exception as e:
-        print(f"✗ Error enviando correo a {to_email}: {str(e)}")
-        print(f"   Tipo de error: {type(e).__name__}")
+        log_email.error('Error enviando correo: %s', e, extra={'destino': to_email, 'tipo_error': type(e).__name__})
         # Con el dominio de prueba de Resend, solo se pueden enviar correos a direcciones verificadas
         # Para enviar a cualquier dirección, necesitas verificar tu propio dominio en Resend
         return False
@@ -261,164 +421,27 @@ def require_auth(f):
         return jsonify({'error': 'No autorizado', 'redirect': '/admin/login.html'}), 401
     return decorated_function
 
-# Inicializar las tablas si no existen
-def init_db():
-    """Inicializa la base de datos con las tablas necesarias"""
+def verificar_esquema():
+    """Compara la versión del esquema con la que espera este código.
+    
+    Las migraciones se aplican antes de arrancar (python backend/migraciones.py);
+    cada worker solo hace esta consulta. Con MIGRAR_AL_INICIAR=1 (desarrollo) las
+    aplica él mismo.
+    """
     conn = get_db_connection()
     if not conn:
         return
-    
     try:
-        with conn.cursor() as cur:
-            # Tabla de carreras
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS carreras (
-                    id SERIAL PRIMARY KEY,
-                    titulo VARCHAR(255) NOT NULL,
-                    descripcion TEXT,
-                    fecha DATE NOT NULL,
-                    estado VARCHAR(50) DEFAULT 'proxima',
-                    categorias VARCHAR(255),
-                    ubicacion VARCHAR(255),
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Tabla de información del club
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS club_info (
-                    id SERIAL PRIMARY KEY,
-                    nombre VARCHAR(255) NOT NULL,
-                    descripcion TEXT,
-                    mision TEXT,
-                    vision TEXT,
-                    whatsapp_link VARCHAR(255),
-                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Tabla de registros de corredores
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS registros (
-                    id SERIAL PRIMARY KEY,
-                    nombre VARCHAR(100) NOT NULL,
-                    apellido VARCHAR(100) NOT NULL,
-                    edad INT NOT NULL,
-                    genero VARCHAR(20) NOT NULL,
-                    correo VARCHAR(150) NOT NULL,
-                    team VARCHAR(100),
-                    categoria VARCHAR(50) NOT NULL,
-                    codigo_registro VARCHAR(50) NOT NULL UNIQUE,
-                    estado VARCHAR(50) DEFAULT 'pendiente',
-                    dorsal INT UNIQUE,
-                    comprobante BYTEA,
-                    comprobante_filename VARCHAR(255),
-                    comprobante_mimetype VARCHAR(50),
-                    dorsal_entregado BOOLEAN DEFAULT FALSE,
-                    asistio BOOLEAN DEFAULT FALSE,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_validacion TIMESTAMP,
-                    fecha_entrega_dorsal TIMESTAMP
-                )
-            ''')
-            
-            # Agregar columnas nuevas si no existen (para tablas ya creadas)
-            cur.execute('''
-                ALTER TABLE registros 
-                ADD COLUMN IF NOT EXISTS comprobante_filename VARCHAR(255);
-            ''')
-            
-            cur.execute('''
-                ALTER TABLE registros 
-                ADD COLUMN IF NOT EXISTS comprobante_mimetype VARCHAR(50);
-            ''')
-            
-            cur.execute('''
-                ALTER TABLE registros 
-                ADD COLUMN IF NOT EXISTS dorsal_entregado BOOLEAN DEFAULT FALSE;
-            ''')
-            
-            cur.execute('''
-                ALTER TABLE registros 
-                ADD COLUMN IF NOT EXISTS asistio BOOLEAN DEFAULT FALSE;
-            ''')
-            
-            cur.execute('''
-                ALTER TABLE registros 
-                ADD COLUMN IF NOT EXISTS fecha_entrega_dorsal TIMESTAMP;
-            ''')
-            
-            # Tabla para almacenar tokens de administradores
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS admin_tokens (
-                    id SERIAL PRIMARY KEY,
-                    token VARCHAR(255) UNIQUE NOT NULL,
-                    admin_id INT NOT NULL,
-                    admin_email VARCHAR(150) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP NOT NULL,
-                    FOREIGN KEY (admin_id) REFERENCES administradores(id)
-                )
-            ''')
-            
-            # Índice para limpiar tokens expirados rápidamente
-            cur.execute('''
-                CREATE INDEX IF NOT EXISTS idx_admin_tokens_expires_at 
-                ON admin_tokens(expires_at)
-            ''')
-            
-            # Tabla de rankings
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS rankings (
-                    id SERIAL PRIMARY KEY,
-                    titulo VARCHAR(255) NOT NULL,
-                    descripcion TEXT,
-                    carrera_id INT,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    estado VARCHAR(50) DEFAULT 'activo',
-                    creado_por INT,
-                    FOREIGN KEY (carrera_id) REFERENCES carreras(id) ON DELETE SET NULL,
-                    FOREIGN KEY (creado_por) REFERENCES administradores(id) ON DELETE SET NULL
-                )
-            ''')
-            
-            # Tabla de registros en rankings
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS ranking_registros (
-                    id SERIAL PRIMARY KEY,
-                    ranking_id INT NOT NULL,
-                    posicion INT NOT NULL,
-                    nombre VARCHAR(100) NOT NULL,
-                    apellido VARCHAR(100),
-                    tiempo VARCHAR(20),
-                    categoria VARCHAR(50),
-                    equipo VARCHAR(100),
-                    puntos DECIMAL(10,2),
-                    dorsal INT,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (ranking_id) REFERENCES rankings(id) ON DELETE CASCADE
-                )
-            ''')
-            
-            # Índices para rankings
-            cur.execute('''
-                CREATE INDEX IF NOT EXISTS idx_ranking_registros_ranking_id 
-                ON ranking_registros(ranking_id)
-            ''')
-            
-            cur.execute('''
-                CREATE INDEX IF NOT EXISTS idx_rankings_carrera_id 
-                ON rankings(carrera_id)
-            ''')
-            
-            # Modificar comprobante a BYTEA si es VARCHAR (nota: esto es complicado en PostgreSQL)
-            # Por ahora, dejaremos que coexistan ambas versiones
-            
-            conn.commit()
-            print("Base de datos inicializada correctamente")
+        if os.getenv('MIGRAR_AL_INICIAR') == '1':
+            aplicar_migraciones(conn)
+        version = version_actual(conn)
+        if version < VERSION_ESQUEMA:
+            log.error('Esquema desactualizado (versión %s, se espera %s): ejecutar python backend/migraciones.py',
+                      version, VERSION_ESQUEMA)
+        elif version > VERSION_ESQUEMA:
+            log.warning('El esquema (versión %s) es más nuevo que este código (%s)', version, VERSION_ESQUEMA)
     except Exception as e:
-        print(f"Error inicializando la base de datos: {e}")
+        log.error('Error verificando el esquema: %s', e)
     finally:
         conn.close()
 
@@ -474,7 +497,7 @@ def login():
                     'message': 'Credenciales incorrectas'
                 }), 401
     except Exception as e:
-        print(f"Error en login: {e}")
+        log.error('Error en login: %s', e)
         return jsonify({
             'success': False,
             'message': 'Error al procesar el login'
@@ -501,7 +524,7 @@ def logout():
                     conn.commit()
                 conn.close()
         except Exception as e:
-            print(f"Error borrando token de BD: {e}")
+            log.error('Error borrando token de BD: %s', e)
     
     # Fallback: eliminar de memoria también
     if token and token in valid_tokens:
@@ -609,7 +632,7 @@ def cambiar_password():
                 'message': 'Contraseña actualizada correctamente'
             })
     except Exception as e:
-        print(f"Error cambiando contraseña: {e}")
+        log.error('Error cambiando contraseña: %s', e)
         return jsonify({
             'success': False,
             'message': 'Error al cambiar contraseña'
@@ -617,21 +640,78 @@ def cambiar_password():
     finally:
         conn.close()
 
+# ===== ARCHIVOS ESTÁTICOS =====
+
+RAIZ_FRONTEND = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DIR_ESTATICOS = os.getenv('ESTATICOS_DIR', os.path.join(RAIZ_FRONTEND, 'dist'))
+ESTATICOS_CARPETAS_PUBLICAS = ('admin', 'img')
+ESTATICOS_EXTENSIONES = {'.html', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp', '.css', '.js'}
+ESTATICOS_CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+EXTENSION_VARIANTE = {'br': '.br', 'gzip': '.gz'}
+
+def _cargar_manifiesto_estaticos():
+    """Lee el manifiesto de construir_estaticos.py; sin build devuelve None"""
+    try:
+        with open(os.path.join(DIR_ESTATICOS, 'manifiesto.json'), encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except FileNotFoundError:
+        log.info('Sin build de estáticos en %s: se sirven los originales', DIR_ESTATICOS)
+        return None
+    manifiesto['con_hash'] = set(manifiesto['archivos'].values())
+    return manifiesto
+
+manifiesto_estaticos = _cargar_manifiesto_estaticos()
+
+def es_estatico_publico(ruta):
+    """Solo el frontend (HTML de la raíz, admin/ e img/): nunca backend/ ni archivos ocultos"""
+    partes = ruta.split('/')
+    return (
+        os.path.splitext(ruta)[1].lower() in ESTATICOS_EXTENSIONES
+        and not any(parte.startswith('.') for parte in partes)
+        and (len(partes) == 1 or partes[0] in ESTATICOS_CARPETAS_PUBLICAS)
+    )
+
+def servir_estatico(ruta):
+    """Sirve un archivo del frontend. Con build (dist/) elige la variante precomprimida
+    según Accept-Encoding y marca como inmutables los archivos con hash en el nombre."""
+    if not es_estatico_publico(ruta):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    
+    if manifiesto_estaticos is None:
+        return send_from_directory(RAIZ_FRONTEND, ruta)
+    
+    # Una URL sin hash (p. ej. un enlace viejo a img/logo.png) también se sirve, pero revalidando
+    archivo = manifiesto_estaticos['archivos'].get(ruta, ruta)
+    variantes = manifiesto_estaticos['variantes'].get(archivo, [])
+    codificacion = next((v for v in ('br', 'gzip') if v in variantes and request.accept_encodings.quality(v) > 0), None)
+    
+    response = send_from_directory(
+        DIR_ESTATICOS,
+        archivo + EXTENSION_VARIANTE[codificacion] if codificacion else archivo,
+        mimetype=mimetypes.guess_type(archivo)[0],
+        download_name=os.path.basename(archivo)
+    )
+    if codificacion:
+        response.headers['Content-Encoding'] = codificacion
+    if variantes:
+        response.vary.add('Accept-Encoding')
+    if archivo == ruta and archivo in manifiesto_estaticos['con_hash']:
+        response.headers['Cache-Control'] = ESTATICOS_CACHE_INMUTABLE
+    return response
+
 # ===== ENDPOINTS PÚBLICOS =====
 
 # Endpoint: Servir página principal
 @app.route('/')
 def serve_index():
     """Sirve la página principal"""
-    return send_from_directory('.', 'index.html')
+    return servir_estatico('index.html')
 
 # Endpoint: Servir archivos HTML
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Sirve archivos estáticos HTML, CSS, JS, imágenes"""
-    if filename.endswith('.html'):
-        return send_from_directory('.', filename)
-    return send_from_directory('.', filename)
+    return servir_estatico(filename)
 
 # Endpoint: Servir archivos de comprobantes desde la base de datos
 @app.route('/comprobantes/<codigo>')
@@ -660,7 +740,7 @@ def serve_comprobante(codigo):
                 headers={'Content-Disposition': f'inline; filename="{result["comprobante_filename"]}"'}
             )
     except Exception as e:
-        print(f"Error sirviendo comprobante: {e}")
+        log.error('Error sirviendo comprobante: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -668,115 +748,223 @@ def serve_comprobante(codigo):
 # Endpoint: Obtener información del club
 @app.route('/api/club-info', methods=['GET'])
 def get_club_info():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    def consultar(cur):
+        cur.execute('SELECT * FROM club_info LIMIT 1')
+        return cur.fetchone()
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('SELECT * FROM club_info LIMIT 1')
-            club_info = cur.fetchone()
-            
-            if club_info:
-                return jsonify(club_info)
-            else:
-                return jsonify({'error': 'Información del club no encontrada'}), 404
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    return respuesta_cacheada('club_info', ('club_info',), consultar,
+                              no_encontrado='Información del club no encontrada')
 
 # Endpoint: Obtener carreras próximas
 @app.route('/api/carreras/proximas', methods=['GET'])
 def get_carreras_proximas():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    def consultar(cur):
+        cur.execute('''
+            SELECT * FROM carreras 
+            WHERE estado = 'proxima' 
+            ORDER BY fecha ASC
+        ''')
+        return cur.fetchall()
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('''
-                SELECT * FROM carreras 
-                WHERE estado = 'proxima' 
-                ORDER BY fecha ASC
-            ''')
-            carreras = cur.fetchall()
-            return jsonify(carreras)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    return respuesta_cacheada('carreras_proximas', ('carreras',), consultar)
 
 # Endpoint: Obtener carreras realizadas
 @app.route('/api/carreras/realizadas', methods=['GET'])
 def get_carreras_realizadas():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    def consultar(cur):
+        cur.execute('''
+            SELECT * FROM carreras 
+            WHERE estado = 'realizada' 
+            ORDER BY fecha DESC
+        ''')
+        return cur.fetchall()
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('''
-                SELECT * FROM carreras 
-                WHERE estado = 'realizada' 
-                ORDER BY fecha DESC
-            ''')
-            carreras = cur.fetchall()
-            return jsonify(carreras)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    return respuesta_cacheada('carreras_realizadas', ('carreras',), consultar)
 
 # Endpoint: Obtener todas las carreras
 @app.route('/api/carreras', methods=['GET'])
 def get_all_carreras():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    def consultar(cur):
+        cur.execute('SELECT * FROM carreras ORDER BY fecha DESC')
+        return cur.fetchall()
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('SELECT * FROM carreras ORDER BY fecha DESC')
-            carreras = cur.fetchall()
-            return jsonify(carreras)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    return respuesta_cacheada('carreras', ('carreras',), consultar)
+
+# Endpoint: Datos de la página principal en una sola respuesta
+@app.route('/api/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """Club, carreras próximas y realizadas y rankings activos con una conexión y una
+    respuesta (cacheada, comprimida y con ETag) en lugar de cinco peticiones"""
+    def consultar(cur):
+        cur.execute('SELECT * FROM club_info LIMIT 1')
+        club_info = cur.fetchone()
+        
+        cur.execute('''
+            SELECT * FROM carreras
+            WHERE estado IN ('proxima', 'realizada')
+            ORDER BY fecha ASC
+        ''')
+        carreras = cur.fetchall()
+        
+        cur.execute('''
+            SELECT id, titulo, descripcion, carrera_id, estado,
+                   fecha_creacion, fecha_actualizacion
+            FROM rankings
+            WHERE estado = 'activo'
+            ORDER BY fecha_actualizacion DESC
+        ''')
+        rankings = cur.fetchall()
+        
+        return {
+            'club_info': club_info,
+            'carreras_proximas': [c for c in carreras if c['estado'] == 'proxima'],
+            'carreras_realizadas': [c for c in reversed(carreras) if c['estado'] == 'realizada'],
+            'rankings': rankings
+        }
+    
+    return respuesta_cacheada('bootstrap', ('club_info', 'carreras', 'rankings'), consultar)
+
+# ===== CUPO E INSCRIPCIONES =====
+
+# Sin carrera_id explícito, la inscripción es para la próxima carrera por fecha
+SQL_CARRERA_INSCRIPCIONES = "SELECT id FROM carreras WHERE estado = 'proxima' ORDER BY fecha ASC, id ASC LIMIT 1"
+MENSAJE_CUPO_AGOTADO = 'Inscripciones cerradas: se alcanzó el cupo de la carrera'
+
+def estado_inscripciones(cur, carrera_id=None):
+    """Inscritos, cupo y si las inscripciones están abiertas (cur debe ser RealDictCursor).
+    Lee la fila del contador por clave primaria, sin contar registros."""
+    cur.execute(f'''
+        SELECT c.id AS carrera_id, c.estado, c.cupo AS limite,
+               COALESCE(ic.inscritos, 0) AS total
+        FROM carreras c
+        LEFT JOIN inscripciones_contador ic ON ic.carrera_id = c.id
+        WHERE c.id = COALESCE(%s, ({SQL_CARRERA_INSCRIPCIONES}))
+    ''', (carrera_id,))
+    estado = cur.fetchone()
+    if not estado:
+        # Sin carrera abierta no hay cupo que aplicar
+        return {'carrera_id': None, 'total': 0, 'limite': None, 'inscripciones_abiertas': True}
+    
+    estado = dict(estado)
+    estado['inscripciones_abiertas'] = (
+        estado.pop('estado') == 'proxima'
+        and (estado['limite'] is None or estado['total'] < estado['limite'])
+    )
+    return estado
+
+def bloquear_cupo(cur, carrera_id):
+    """Bloquea la fila del contador de la carrera hasta el commit, así las validaciones
+    de una misma carrera (y su asignación de dorsal) van en fila. Devuelve False si
+    el cupo ya está lleno."""
+    if carrera_id is None:
+        return True
+    cur.execute('''
+        INSERT INTO inscripciones_contador (carrera_id) VALUES (%s)
+        ON CONFLICT (carrera_id) DO NOTHING
+    ''', (carrera_id,))
+    cur.execute('''
+        SELECT ic.inscritos, c.cupo
+        FROM inscripciones_contador ic
+        LEFT JOIN carreras c ON c.id = ic.carrera_id
+        WHERE ic.carrera_id = %s
+        FOR UPDATE OF ic
+    ''', (carrera_id,))
+    fila = cur.fetchone()
+    return fila['cupo'] is None or fila['inscritos'] < fila['cupo']
+
+def carrera_de_la_peticion(cur, requerida=False):
+    """Carrera a la que se limita una petición del panel o del kiosko: ?carrera_id=
+    (o carrera_id en el JSON) o, si no vino, la de inscripciones. None si no hay
+    ninguna carrera abierta: entonces no se filtra, salvo con requerida=True (buscar
+    o asignar por dorsal, que solo es único dentro de una carrera). ValueError si no
+    es un número, la carrera no existe o falta siendo requerida."""
+    carrera_id = request.args.get('carrera_id')
+    if carrera_id is None and request.is_json:
+        carrera_id = (request.get_json(silent=True) or {}).get('carrera_id')
+    if carrera_id is not None:
+        try:
+            carrera_id = int(carrera_id)
+        except (TypeError, ValueError):
+            raise ValueError('Parámetro carrera_id inválido')
+        cur.execute('SELECT 1 FROM carreras WHERE id = %s', (carrera_id,))
+        if cur.fetchone() is None:
+            raise ValueError(f'La carrera {carrera_id} no existe')
+        return carrera_id
+    
+    cur.execute(SQL_CARRERA_INSCRIPCIONES)
+    fila = cur.fetchone()
+    if fila is None:
+        if requerida:
+            raise ValueError('carrera_id requerido: no hay ninguna carrera abierta')
+        return None
+    return fila['id'] if isinstance(fila, dict) else fila[0]
+
+def condicion_carrera(carrera_id, alias=''):
+    """Condición SQL y parámetros que limitan una consulta de registros a una carrera
+    (sin filtro si carrera_id es None). Usa los índices que empiezan por carrera_id."""
+    if carrera_id is None:
+        return 'TRUE', []
+    return f'{alias}carrera_id = %s', [carrera_id]
+
+def siguiente_dorsal(cur, codigo, carrera_id):
+    """Dorsal para un corredor que pasa a pagado: el primer hueco libre de su carrera
+    desde dorsal_inicial, o el siguiente al mayor. Cada carrera tiene su propia
+    numeración (ver idx_registros_carrera_dorsal). Llamar con el cupo bloqueado (ver
+    bloquear_cupo) para que dos validaciones no elijan el mismo."""
+    # Recorre el índice (carrera_id, dorsal) desde el inicio hasta el primer número
+    # que no tiene siguiente, sin traer todos los dorsales de la carrera
+    cur.execute('''
+        WITH pool AS (
+            SELECT COALESCE((SELECT dorsal_inicial FROM carreras WHERE id = %(carrera)s), 1) AS inicio
+        )
+        SELECT CASE
+            WHEN NOT EXISTS (SELECT 1 FROM registros WHERE carrera_id = %(carrera)s AND dorsal = pool.inicio)
+                THEN pool.inicio
+            ELSE (
+                SELECT r.dorsal + 1
+                FROM registros r
+                WHERE r.carrera_id = %(carrera)s AND r.dorsal >= pool.inicio
+                  AND NOT EXISTS (SELECT 1 FROM registros s
+                                  WHERE s.carrera_id = %(carrera)s AND s.dorsal = r.dorsal + 1)
+                ORDER BY r.dorsal
+                LIMIT 1
+            )
+        END AS dorsal
+        FROM pool
+    ''', {'carrera': carrera_id})
+    dorsal = cur.fetchone()['dorsal']
+    
+    log_dorsales.info('Asignando dorsal', extra={'dorsal': dorsal, 'codigo': codigo, 'carrera_id': carrera_id})
+    return dorsal
+
+def es_cupo_agotado(error):
+    """True si el error viene del trigger de cupo (ver actualizar_contador_inscripciones)"""
+    diag = getattr(error, 'diag', None)
+    return diag is not None and diag.constraint_name == 'cupo_carrera'
 
 # Endpoint: Obtener contador de registros
 @app.route('/api/contador-registros', methods=['GET'])
 def contador_registros():
     """Obtiene el número de registros validados (pagados) con dorsal y si las inscripciones están abiertas"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    carrera_id = request.args.get('carrera_id')
+    if carrera_id is not None:
+        if not (carrera_id.isascii() and carrera_id.isdigit() and len(carrera_id) <= 9):
+            return jsonify({'error': 'Parámetro carrera_id inválido'}), 400
+        carrera_id = int(carrera_id)
     
-    try:
-        with conn.cursor() as cur:
-            # Contar solo registros validados (estado = 'pagado') y con dorsal asignado
-            cur.execute('SELECT COUNT(*) as total FROM registros WHERE estado = %s AND dorsal IS NOT NULL', ('pagado',))
-            resultado = cur.fetchone()
-            total = resultado[0] if resultado else 0
-            
-            # Si hay 300 o más registros validados, las inscripciones están cerradas
-            inscripciones_abiertas = total < 300
-            
-            return jsonify({
-                'total': total,
-                'inscripciones_abiertas': inscripciones_abiertas,
-                'limite': 300
-            })
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    def consultar(cur):
+        estado = estado_inscripciones(cur, carrera_id)
+        # Una carrera inexistente responde 404 sin ocupar una entrada de la caché
+        if carrera_id is not None and estado['carrera_id'] is None:
+            return None
+        return estado
+    
+    return respuesta_cacheada(
+        f"contador_registros:{carrera_id or 'proxima'}",
+        ('inscripciones_contador', 'carreras'),
+        consultar,
+        no_encontrado=f'La carrera {carrera_id} no existe'
+    )
 
 # Endpoint: Registrar corredor
 @app.route('/api/registrar-corredor', methods=['POST'])
@@ -792,12 +980,22 @@ def registrar_corredor():
         return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
     
     try:
-        with conn.cursor() as cur:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            try:
+                carrera_id = carrera_de_la_peticion(cur)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            # El cupo se ocupa al validar el pago; aquí solo se rechaza si ya está lleno
+            inscripciones = estado_inscripciones(cur, carrera_id)
+            if not inscripciones['inscripciones_abiertas']:
+                return jsonify({'error': MENSAJE_CUPO_AGOTADO}), 409
+            
             cur.execute('''
                 INSERT INTO registros (carrera_id, nombre, apellido, edad, genero, correo, team, categoria, codigo_registro)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             ''', (
-                data.get('carrera_id'),
+                inscripciones['carrera_id'],
                 data['nombre'],
                 data['apellido'],
                 data['edad'],
@@ -859,11 +1057,136 @@ def registrar_corredor():
         })
     except Exception as e:
         conn.rollback()
-        print(f"Error: {e}")
+        log.error('Error: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
+def insertar_registro_rapido(cur, data, codigo_registro, carrera_id):
+    """Inserta un corredor ya pagado en la carrera con el siguiente dorsal de su
+    numeración (sin commit). Devuelve el dorsal asignado o None si el cupo de la
+    carrera está lleno."""
+    if not bloquear_cupo(cur, carrera_id):
+        return None
+    
+    dorsal = siguiente_dorsal(cur, codigo_registro, carrera_id)
+    
+    # Insertar registro con estado 'pagado' y dorsal asignado
+    cur.execute('''
+        INSERT INTO registros (carrera_id, nombre, apellido, edad, genero, correo, team, categoria, codigo_registro, estado, dorsal, fecha_validacion)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ''', (
+        carrera_id,
+        data['nombre'],
+        data['apellido'],
+        data['edad'],
+        data['genero'],
+        data['correo'],
+        data.get('team'),
+        data['categoria'],
+        codigo_registro,
+        'pagado',  # Estado directo pagado
+        dorsal,
+        datetime.now()
+    ))
+    return dorsal
+
+def enviar_correos_registro_rapido(data, codigo_registro, dorsal):
+    """Envía el dorsal al corredor y el aviso al admin de un registro rápido"""
+    # Enviar correo al corredor con dorsal
+    asunto = "¡Registrado! Tu Dorsal para la Carrera del Grinch"
+    cuerpo = f"""
+    <html>
+        <head>
+            <style>
+                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+                .header {{ background-color: #38a169; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
+                .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
+                .dorsal {{ background-color: #38a169; color: white; padding: 20px; text-align: center; font-size: 32px; font-weight: bold; border-radius: 10px; margin: 20px 0; }}
+                .info-item {{ display: flex; align-items: start; gap: 10px; margin: 15px 0; }}
+                .icon {{ color: #38a169; min-width: 20px; }}
+                .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 14px; }}
+                ul {{ padding-left: 20px; }}
+                li {{ margin: 8px 0; }}
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <div class="header">
+                    <h2 style="margin: 0;">¡Tu Inscripción ha sido Confirmada!</h2>
+                </div>
+                <div class="content">
+                    <p>Hola <strong>{data['nombre']}</strong>,</p>
+                    <p>¡Estás oficialmente registrado en la Carrera del Grinch! Aquí está tu información:</p>
+                    
+                    <div class="dorsal">
+                        DORSAL: {str(dorsal).zfill(3)}
+                    </div>
+                    
+                    <h3 style="color: #38a169; margin-top: 30px;">Información de la Carrera:</h3>
+                    
+                    <div class="info-item">
+                        <span class="icon">📅</span>
+                        <div><strong>Fecha:</strong> 21 de diciembre de 2025</div>
+                    </div>
+                    
+                    <div class="info-item">
+                        <span class="icon">🕐</span>
+                        <div><strong>Hora:</strong> Desde las 6:00 a.m.</div>
+                    </div>
+                    
+                    <div class="info-item">
+                        <span class="icon">📍</span>
+                        <div><strong>Lugar:</strong> Cancha de San Pablo Viejo, David, Chiriquí</div>
+                    </div>
+                    
+                    <div class="info-item">
+                        <span class="icon">🏃</span>
+                        <div><strong>Categoría:</strong> {data['categoria']}</div>
+                    </div>
+                    
+                    <h3 style="color: #38a169; margin-top: 30px;">Instrucciones Importantes:</h3>
+                    <ul>
+                        <li>Presentarse 30 minutos antes de la hora de inicio</li>
+                        <li>Llevar identificación válida</li>
+                        <li>Usar el dorsal en la parte frontal del pecho</li>
+                        <li>Recoger tu kit en el punto de entrega</li>
+                        <li>Hidratarse bien antes de la carrera</li>
+                    </ul>
+                    
+                    <div class="footer">
+                        <p><strong>¡Que disfrutes la carrera!</strong></p>
+                        <p>VO2Max Team</p>
+                    </div>
+                </div>
+            </div>
+        </body>
+    </html>
+    """
+    
+    # Enviar correo al admin
+    asunto_admin = f"Nuevo Registro Rápido: {data['nombre']} {data['apellido']} - Dorsal {str(dorsal).zfill(3)}"
+    cuerpo_admin = f"""
+    <html>
+        <body>
+            <h2>Nuevo Registro Rápido de Corredor</h2>
+            <p><strong>Código:</strong> {codigo_registro}</p>
+            <p><strong>Nombre:</strong> {data['nombre']} {data['apellido']}</p>
+            <p><strong>Dorsal Asignado:</strong> {str(dorsal).zfill(3)}</p>
+            <p><strong>Correo:</strong> {data['correo']}</p>
+            <p><strong>Edad:</strong> {data['edad']}</p>
+            <p><strong>Género:</strong> {data['genero']}</p>
+            <p><strong>Categoría:</strong> {data['categoria']}</p>
+            <p><strong>Team:</strong> {data.get('team', 'N/A')}</p>
+            <p><strong>Hora de Registro:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+        </body>
+    </html>
+    """
+    
+    send_email(data['correo'], asunto, cuerpo)
+    send_email(ADMIN_EMAIL, asunto_admin, cuerpo_admin)
+
 # Endpoint: Registrar corredor rápido (sin validación de pago - para el día de la carrera)
 @app.route('/api/registrar-corredor-rapido', methods=['POST'])
 @require_auth
@@ -880,153 +1203,19 @@ def registrar_corredor_rapido():
     
     try:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Primero, buscar dorsales faltantes (huecos)
-            cur.execute('SELECT MAX(dorsal) FROM registros WHERE dorsal IS NOT NULL')
-            result = cur.fetchone()
-            max_dorsal = result['max'] if result and result['max'] is not None else None
-            
-            dorsal = None
-            
-            # Si hay dorsales asignados, buscar huecos en el rango
-            if max_dorsal is not None and max_dorsal > 0:
-                # Obtener todos los dorsales asignados en el rango
-                cur.execute('''
-                    SELECT DISTINCT dorsal 
-                    FROM registros 
-                    WHERE dorsal IS NOT NULL AND dorsal > 0
-                    ORDER BY dorsal ASC
-                ''')
-                dorsales_asignados = set(row['dorsal'] for row in cur.fetchall())
-                
-                # Buscar el primer hueco en el rango 1 a max_dorsal
-                for num in range(1, max_dorsal + 1):
-                    if num not in dorsales_asignados:
-                        dorsal = num
-                        print(f"Dorsal faltante encontrado: {dorsal}")
-                        break
-            
-            # Si no hay huecos, asignar el siguiente dorsal secuencial
+            try:
+                carrera_id = carrera_de_la_peticion(cur, requerida=True)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            dorsal = insertar_registro_rapido(cur, data, codigo_registro, carrera_id)
             if dorsal is None:
-                if max_dorsal is None:
-                    dorsal = 1
-                else:
-                    dorsal = max_dorsal + 1
-            
-            print(f"Asignando dorsal {dorsal} al código {codigo_registro}")
-            
-            # Insertar registro con estado 'pagado' y dorsal asignado
-            cur.execute('''
-                INSERT INTO registros (carrera_id, nombre, apellido, edad, genero, correo, team, categoria, codigo_registro, estado, dorsal, fecha_validacion)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                data.get('carrera_id', 1),
-                data['nombre'],
-                data['apellido'],
-                data['edad'],
-                data['genero'],
-                data['correo'],
-                data.get('team'),
-                data['categoria'],
-                codigo_registro,
-                'pagado',  # Estado directo pagado
-                dorsal,
-                datetime.now()
-            ))
+                conn.rollback()
+                return jsonify({'error': MENSAJE_CUPO_AGOTADO}), 409
             conn.commit()
         
-        # Enviar correo al corredor con dorsal
-        asunto = "¡Registrado! Tu Dorsal para la Carrera del Grinch"
-        cuerpo = f"""
-        <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                    .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                    .header {{ background-color: #38a169; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                    .content {{ background-color: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                    .dorsal {{ background-color: #38a169; color: white; padding: 20px; text-align: center; font-size: 32px; font-weight: bold; border-radius: 10px; margin: 20px 0; }}
-                    .info-item {{ display: flex; align-items: start; gap: 10px; margin: 15px 0; }}
-                    .icon {{ color: #38a169; min-width: 20px; }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 14px; }}
-                    ul {{ padding-left: 20px; }}
-                    li {{ margin: 8px 0; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h2 style="margin: 0;">¡Tu Inscripción ha sido Confirmada!</h2>
-                    </div>
-                    <div class="content">
-                        <p>Hola <strong>{data['nombre']}</strong>,</p>
-                        <p>¡Estás oficialmente registrado en la Carrera del Grinch! Aquí está tu información:</p>
-                        
-                        <div class="dorsal">
-                            DORSAL: {str(dorsal).zfill(3)}
-                        </div>
-                        
-                        <h3 style="color: #38a169; margin-top: 30px;">Información de la Carrera:</h3>
-                        
-                        <div class="info-item">
-                            <span class="icon">📅</span>
-                            <div><strong>Fecha:</strong> 21 de diciembre de 2025</div>
-                        </div>
-                        
-                        <div class="info-item">
-                            <span class="icon">🕐</span>
-                            <div><strong>Hora:</strong> Desde las 6:00 a.m.</div>
-                        </div>
-                        
-                        <div class="info-item">
-                            <span class="icon">📍</span>
-                            <div><strong>Lugar:</strong> Cancha de San Pablo Viejo, David, Chiriquí</div>
-                        </div>
-                        
-                        <div class="info-item">
-                            <span class="icon">🏃</span>
-                            <div><strong>Categoría:</strong> {data['categoria']}</div>
-                        </div>
-                        
-                        <h3 style="color: #38a169; margin-top: 30px;">Instrucciones Importantes:</h3>
-                        <ul>
-                            <li>Presentarse 30 minutos antes de la hora de inicio</li>
-                            <li>Llevar identificación válida</li>
-                            <li>Usar el dorsal en la parte frontal del pecho</li>
-                            <li>Recoger tu kit en el punto de entrega</li>
-                            <li>Hidratarse bien antes de la carrera</li>
-                        </ul>
-                        
-                        <div class="footer">
-                            <p><strong>¡Que disfrutes la carrera!</strong></p>
-                            <p>VO2Max Team</p>
-                        </div>
-                    </div>
-                </div>
-            </body>
-        </html>
-        """
-        
-        # Enviar correo al admin
-        asunto_admin = f"Nuevo Registro Rápido: {data['nombre']} {data['apellido']} - Dorsal {str(dorsal).zfill(3)}"
-        cuerpo_admin = f"""
-        <html>
-            <body>
-                <h2>Nuevo Registro Rápido de Corredor</h2>
-                <p><strong>Código:</strong> {codigo_registro}</p>
-                <p><strong>Nombre:</strong> {data['nombre']} {data['apellido']}</p>
-                <p><strong>Dorsal Asignado:</strong> {str(dorsal).zfill(3)}</p>
-                <p><strong>Correo:</strong> {data['correo']}</p>
-                <p><strong>Edad:</strong> {data['edad']}</p>
-                <p><strong>Género:</strong> {data['genero']}</p>
-                <p><strong>Categoría:</strong> {data['categoria']}</p>
-                <p><strong>Team:</strong> {data.get('team', 'N/A')}</p>
-                <p><strong>Hora de Registro:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            </body>
-        </html>
-        """
+        cache_publico.invalidar('inscripciones_contador')
         
-        send_email(data['correo'], asunto, cuerpo)
-        send_email(ADMIN_EMAIL, asunto_admin, cuerpo_admin)
+        enviar_correos_registro_rapido(data, codigo_registro, dorsal)
         
         return jsonify({
             'success': True,
@@ -1034,13 +1223,16 @@ def registrar_corredor_rapido():
             'codigo': codigo_registro,
             'dorsal': dorsal,
             'dorsal_formatted': str(dorsal).zfill(3),
+            'carrera_id': carrera_id,
             'nombre': data['nombre'],
             'apellido': data['apellido'],
             'categoria': data['categoria']
         })
     except Exception as e:
         conn.rollback()
-        print(f"Error: {e}")
+        if es_cupo_agotado(e):
+            return jsonify({'error': MENSAJE_CUPO_AGOTADO}), 409
+        log.error('Error: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -1080,15 +1272,17 @@ def subir_comprobante():
         # Leer el archivo UNA sola vez
         file_data = file.read()
         original_size = len(file_data)
-        print(f"📤 Archivo recibido: {original_filename} ({original_size} bytes)")
-        print(f"   Guardando como: {short_filename}")
+        log_comprobantes.debug('Archivo recibido', extra={'archivo': original_filename, 'bytes': original_size,
+                                                           'guardado_como': short_filename})
         
         # Si es imagen, comprimirla
         if file_extension in ['jpg', 'jpeg', 'png']:
             try:
+                from PIL import Image  # Solo se carga cuando llega una imagen
+                
                 # Abrir imagen con PIL
                 image = Image.open(io.BytesIO(file_data))
-                print(f"📸 Imagen abierta: {image.format} {image.size}")
+                log_comprobantes.debug('Imagen abierta', extra={'formato': image.format, 'dimensiones': image.size})
                 
                 # Convertir a RGB si es necesario (para PNG con transparencia)
                 if image.mode in ('RGBA', 'LA', 'P'):
@@ -1112,10 +1306,11 @@ def subir_comprobante():
                 file_extension = 'jpg'
                 
                 compressed_size = len(file_data)
-                print(f"✓ Imagen comprimida: {original_size}b → {compressed_size}b ({100 - int(compressed_size*100/original_size)}% reducción)")
+                log_comprobantes.debug('Imagen comprimida', extra={'bytes_original': original_size,
+                                                                    'bytes_comprimido': compressed_size})
             except Exception as e:
-                print(f"⚠ Error comprimiendo imagen, guardando original: {e}")
-                print(f"✓ Guardando imagen original: {short_filename} ({original_size} bytes)")
+                log_comprobantes.warning('Error comprimiendo imagen, se guarda la original: %s', e,
+                                         extra={'archivo': short_filename, 'bytes': original_size})
         
         # Determinar mimetype
         mimetype_map = {
@@ -1126,7 +1321,6 @@ def subir_comprobante():
         }
         mimetype = mimetype_map.get(file_extension, 'application/octet-stream')
         
-        print(f"✓ Guardando comprobante en BD: {short_filename} ({len(file_data)} bytes, mimetype: {mimetype})")
         
         with conn.cursor() as cur:
             # Guardar archivo como BYTEA en la base de datos
@@ -1139,7 +1333,8 @@ def subir_comprobante():
                 WHERE codigo_registro = %s
             ''', (psycopg2.Binary(file_data), short_filename, mimetype, 'pendiente_validacion', codigo))
             conn.commit()
-            print(f"✓ Comprobante guardado en BD para {codigo}")
+            log_comprobantes.info('Comprobante guardado', extra={'codigo': codigo, 'archivo': short_filename,
+                                                                  'bytes': len(file_data), 'mimetype': mimetype})
             
             # Obtener datos del corredor para el correo del admin
             cur.execute('SELECT correo, nombre, apellido FROM registros WHERE codigo_registro = %s', (codigo,))
@@ -1168,7 +1363,7 @@ def subir_comprobante():
         })
     except Exception as e:
         conn.rollback()
-        print(f"Error: {e}")
+        log.error('Error: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -1198,7 +1393,7 @@ def get_registro(codigo):
             else:
                 return jsonify({'error': 'Registro no encontrado'}), 404
     except Exception as e:
-        print(f"Error: {e}")
+        log.error('Error: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -1213,7 +1408,7 @@ def validar_pago():
         codigo = data.get('codigo')
         valido = data.get('valido')  # True o False
         
-        print(f"Validando pago - Código: {codigo}, Válido: {valido}")
+        log.info('Validando pago', extra={'codigo': codigo, 'valido': valido})
         
         conn = get_db_connection()
         if not conn:
@@ -1229,45 +1424,26 @@ def validar_pago():
                     return jsonify({'error': 'Registro no encontrado'}), 404
                 
                 if valido:
-                    # Primero, buscar dorsales faltantes (huecos)
-                    cur.execute('SELECT MAX(dorsal) FROM registros WHERE dorsal IS NOT NULL')
-                    result = cur.fetchone()
-                    max_dorsal = result['max'] if result and result['max'] is not None else None
-                    
-                    dorsal = None
+                    # Registros previos al cupo por carrera pueden no tener carrera asignada
+                    try:
+                        carrera_id = registro['carrera_id'] or carrera_de_la_peticion(cur, requerida=True)
+                    except ValueError as e:
+                        return jsonify({'error': str(e)}), 400
                     
-                    # Si hay dorsales asignados, buscar huecos en el rango
-                    if max_dorsal is not None and max_dorsal > 0:
-                        # Obtener todos los dorsales asignados en el rango
-                        cur.execute('''
-                            SELECT DISTINCT dorsal 
-                            FROM registros 
-                            WHERE dorsal IS NOT NULL AND dorsal > 0
-                            ORDER BY dorsal ASC
-                        ''')
-                        dorsales_asignados = set(row['dorsal'] for row in cur.fetchall())
-                        
-                        # Buscar el primer hueco en el rango 1 a max_dorsal
-                        for num in range(1, max_dorsal + 1):
-                            if num not in dorsales_asignados:
-                                dorsal = num
-                                print(f"Dorsal faltante encontrado: {dorsal}")
-                                break
+                    # Quien ya estaba pagado no ocupa un lugar nuevo
+                    if not bloquear_cupo(cur, carrera_id) and registro['estado'] != 'pagado':
+                        conn.rollback()
+                        return jsonify({'error': MENSAJE_CUPO_AGOTADO}), 409
                     
-                    # Si no hay huecos, asignar el siguiente dorsal secuencial
-                    if dorsal is None:
-                        if max_dorsal is None:
-                            dorsal = 1
-                        else:
-                            dorsal = max_dorsal + 1
-                    
-                    print(f"Asignando dorsal {dorsal} al código {codigo}")
+                    dorsal = siguiente_dorsal(cur, codigo, carrera_id)
                     
+                    # El trigger del contador ocupa el cupo en esta misma transacción
                     cur.execute('''
-                        UPDATE registros SET estado = %s, dorsal = %s, fecha_validacion = %s
+                        UPDATE registros SET estado = %s, dorsal = %s, fecha_validacion = %s, carrera_id = %s
                         WHERE codigo_registro = %s
-                    ''', ('pagado', dorsal, datetime.now(), codigo))
+                    ''', ('pagado', dorsal, datetime.now(), carrera_id, codigo))
                     conn.commit()
+                    cache_publico.invalidar('inscripciones_contador')
                     
                     # Enviar correo al corredor con dorsal e instrucciones
                     asunto = "¡Confirmado! Tu Dorsal para la Carrera del Grinch"
@@ -1350,6 +1526,7 @@ def validar_pago():
                         WHERE codigo_registro = %s
                     ''', ('rechazado', datetime.now(), codigo))
                     conn.commit()
+                    cache_publico.invalidar('inscripciones_contador')
                     
                     # Enviar correo de rechazo
                     asunto = "Tu Comprobante de Pago ha Sido Rechazado"
@@ -1377,50 +1554,263 @@ def validar_pago():
                     })
         except Exception as e:
             conn.rollback()
-            print(f"Error en validación: {e}")
-            import traceback
-            traceback.print_exc()
+            if es_cupo_agotado(e):
+                return jsonify({'error': MENSAJE_CUPO_AGOTADO}), 409
+            log.exception('Error en validación: %s', e)
             return jsonify({'error': str(e)}), 500
         finally:
             conn.close()
     except Exception as e:
-        print(f"Error general en validar_pago: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('Error general en validar_pago: %s', e)
         return jsonify({'error': str(e)}), 500
 
-# Endpoint: Obtener registros pendientes (admin)
-@app.route('/api/registros-pendientes', methods=['GET'])
-@require_auth
-def get_registros_pendientes():
-    """Obtiene los registros pendientes de validación (sin traer imagenes)"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+# ===== LISTADOS DEL PANEL ADMIN =====
+
+SYNC_TRANSACCION_LARGA = int(os.getenv('SYNC_TRANSACCION_LARGA', 60))  # Segundos
+_ultimo_aviso_cursor = 0.0
+
+def cursor_sincronizacion(cur, desde=None):
+    """Cursor para pedir después solo los cambios (?since=). Es el xmin del snapshot:
+    las transacciones anteriores ya terminaron y cualquier cambio que se confirme
+    más tarde tendrá version_cambio >= cursor. Se toma antes de leer los datos, así
+    que una fila de una transacción aún abierta puede repetirse, pero no perderse.
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('''
-                SELECT id, nombre, apellido, edad, genero, correo, team, categoria, 
-                       codigo_registro, estado, comprobante_filename, comprobante_mimetype,
-                       CASE WHEN comprobante IS NOT NULL THEN true ELSE false END as tiene_comprobante,
-                       fecha_creacion
-                FROM registros 
-                WHERE estado = 'pendiente_validacion'
-                ORDER BY 
-                    CASE WHEN comprobante IS NOT NULL THEN 0 ELSE 1 END,
-                    fecha_creacion DESC
-            ''')
-            registros = cur.fetchall()
-            return jsonify(registros)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    Límite: cualquier transacción abierta de la BD (una exportación en streaming,
+    una importación, una sesión de psql) retiene el xmin. Mientras dure, el cursor
+    no avanza y cada ?since= repite todo lo cambiado desde que empezó, sin llegar
+    a 304: es correcto, pero cada vez más caro. Si el cursor no avanzó desde
+    `desde` por una transacción de más de SYNC_TRANSACCION_LARGA segundos, se
+    avisa en el log (como mucho una vez por minuto) con cuál es."""
+    cur.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text AS cursor')
+    fila = cur.fetchone()
+    cursor = fila['cursor'] if isinstance(fila, dict) else fila[0]
+    if desde is not None and cursor == desde:
+        _avisar_cursor_detenido(cur, cursor)
+    return cursor
 
-# Endpoint: Marcar entrega de dorsal
-@app.route('/api/entregar-dorsal', methods=['POST'])
+def _avisar_cursor_detenido(cur, cursor):
+    """Registra la transacción más antigua si lleva más de SYNC_TRANSACCION_LARGA segundos
+    (cur debe ser RealDictCursor, como en los listados y la sincronización)"""
+    global _ultimo_aviso_cursor
+    if time.monotonic() - _ultimo_aviso_cursor < 60:
+        return
+    cur.execute('''
+        SELECT pid, application_name, state,
+               EXTRACT(EPOCH FROM now() - xact_start)::int AS segundos, left(query, 200) AS consulta
+        FROM pg_stat_activity
+        WHERE (backend_xid IS NOT NULL OR backend_xmin IS NOT NULL) AND pid <> pg_backend_pid()
+        ORDER BY xact_start
+        LIMIT 1
+    ''')
+    fila = cur.fetchone()
+    if fila is None or fila['segundos'] is None or fila['segundos'] < SYNC_TRANSACCION_LARGA:
+        return
+    _ultimo_aviso_cursor = time.monotonic()
+    log.warning('Cursor de sincronización detenido por una transacción larga: los ?since= repiten cambios',
+                extra={'cursor': cursor, 'pid': fila['pid'], 'segundos': fila['segundos'],
+                       'aplicacion': fila['application_name'], 'estado': fila['state'],
+                       'consulta': fila['consulta']})
+
+def parametro_since():
+    """Cursor recibido en ?since= (None si no vino). ValueError si no es válido."""
+    desde = request.args.get('since')
+    # xid8 es un entero de 64 bits: con hasta 19 dígitos ASCII siempre cabe
+    if desde is not None and not (desde.isascii() and desde.isdigit() and len(desde) <= 19):
+        raise ValueError('Parámetro since inválido')
+    return desde
+
+def registros_eliminados_desde(cur, desde, carrera, params_carrera):
+    """Registros borrados desde el cursor (tabla registros_eliminados, la llena un
+    trigger), como {'id', 'eliminado': true} para que quien sincroniza los quite"""
+    cur.execute(f'''
+        SELECT id, TRUE AS eliminado
+        FROM registros_eliminados
+        WHERE version_cambio >= %s::xid8 AND {carrera}
+    ''', [desde] + params_carrera)
+    return cur.fetchall()
+
+def respuesta_sincronizada(registros, cursor, desde):
+    """Lista completa (sin since) o solo las filas que cambiaron desde el cursor, en
+    cualquier estado para que el panel quite las que ya no le corresponden, más los
+    registros borrados con eliminado: true. Si no cambió nada responde 304 sin cuerpo."""
+    if desde is not None and not registros:
+        response = Response(status=304)
+    else:
+        response = jsonify(registros)
+    response.headers['X-Cursor'] = cursor
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+# Listados del panel admin. 'orden' es la clave del keyset (todas las columnas en
+# el mismo sentido y con id al final para desempatar); coincide con los índices
+# parciales idx_registros_pendientes e idx_registros_inscritos (ver migraciones.py)
+LISTADOS_REGISTROS = {
+    'pendientes': {
+        'estado': 'pendiente_validacion',
+        'columnas': '''id, nombre, apellido, edad, genero, correo, team, categoria, 
+                      codigo_registro, estado, comprobante_filename, comprobante_mimetype,
+                      tiene_comprobante, fecha_creacion''',
+        'orden': ('tiene_comprobante', 'fecha_creacion', 'id'),
+        'descendente': True,
+        'filtros': ('categoria', 'genero', 'team'),
+        'totales': '''COUNT(*) AS total,
+                     COUNT(*) FILTER (WHERE tiene_comprobante) AS con_comprobante'''
+    },
+    'inscritos': {
+        'estado': 'pagado',
+        'columnas': '''id, nombre, apellido, edad, genero, correo, team, categoria, 
+                      codigo_registro, estado, dorsal, dorsal_entregado, asistio, 
+                      fecha_entrega_dorsal, fecha_creacion''',
+        'orden': ('dorsal', 'id'),
+        'descendente': False,
+        'filtros': ('categoria', 'genero', 'team', 'dorsal_entregado', 'asistio'),
+        'totales': '''COUNT(*) AS total,
+                     COUNT(*) FILTER (WHERE dorsal_entregado) AS entregados,
+                     COUNT(*) FILTER (WHERE asistio) AS asistencias'''
+    }
+}
+FILTROS_BOOLEANOS = {'dorsal_entregado', 'asistio'}
+PAGINA_MAXIMA = 500
+
+def filtros_listado(listado):
+    """Condiciones SQL y parámetros de los filtros del listado que vinieron en la query"""
+    condiciones = []
+    params = []
+    for campo in listado['filtros']:
+        valor = request.args.get(campo, '').strip()
+        if not valor:
+            continue
+        if campo in FILTROS_BOOLEANOS:
+            if valor.lower() not in ('1', 'true', 'si', '0', 'false', 'no'):
+                raise ValueError(f'Parámetro {campo} inválido')
+            valor = valor.lower() in ('1', 'true', 'si')
+        condiciones.append(f'{campo} = %s')
+        params.append(valor)
+    return condiciones, params
+
+def cursor_pagina(valores):
+    """Cursor opaco con la clave de orden de la última fila de una página"""
+    return base64.urlsafe_b64encode(json.dumps(valores, default=str).encode()).decode()
+
+def leer_cursor_pagina(texto, columnas):
+    """Valores de la clave de orden guardados en ?despues= (None si no vino)"""
+    if not texto:
+        return None
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(texto.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Parámetro despues inválido')
+    if not isinstance(valores, list) or len(valores) != columnas:
+        raise ValueError('Parámetro despues inválido')
+    return valores
+
+def formatear_dorsales(registros):
+    """Agrega dorsal_formatted (3 dígitos) a los registros con dorsal"""
+    for registro in registros:
+        if registro.get('dorsal'):
+            registro['dorsal_formatted'] = str(registro['dorsal']).zfill(3)
+    return registros
+
+def listar_registros(nombre):
+    """Responde un listado del panel admin (ver LISTADOS_REGISTROS).
+    
+    - Solo la carrera de ?carrera_id= o, si no vino, la de inscripciones.
+    - Sin parámetros: la lista completa, con X-Cursor para pedir después ?since=.
+    - ?since=<cursor>: solo lo que cambió, sin filtros (ver respuesta_sincronizada).
+    - ?categoria=&genero=&team= (y dorsal_entregado/asistio en inscritos) filtran.
+    - ?limite=N: una página con los totales del filtro y 'siguiente', el cursor para
+      pedir la próxima con ?despues=. Paginación por clave (keyset), no por OFFSET.
+    """
+    listado = LISTADOS_REGISTROS[nombre]
+    try:
+        desde = parametro_since()
+        condiciones, params = filtros_listado(listado)
+        despues = leer_cursor_pagina(request.args.get('despues'), len(listado['orden']))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limite = request.args.get('limite', type=int)
+    if limite is not None:
+        limite = max(1, min(limite, PAGINA_MAXIMA))
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    sentido = 'DESC' if listado['descendente'] else 'ASC'
+    orden = ', '.join(f'{columna} {sentido}' for columna in listado['orden'])
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            try:
+                carrera, params_carrera = condicion_carrera(carrera_de_la_peticion(cur))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            if desde is not None:
+                cursor = cursor_sincronizacion(cur, desde)
+                cur.execute(f'''
+                    SELECT {listado['columnas']}
+                    FROM registros
+                    WHERE version_cambio >= %s::xid8 AND {carrera}
+                    ORDER BY {orden}
+                ''', [desde] + params_carrera)
+                cambios = formatear_dorsales(cur.fetchall())
+                cambios += registros_eliminados_desde(cur, desde, carrera, params_carrera)
+                return respuesta_sincronizada(cambios, cursor, desde)
+            
+            filtro = ' AND '.join(['estado = %s', carrera] + condiciones)
+            params = [listado['estado']] + params_carrera + params
+            
+            if limite is None:
+                cursor = cursor_sincronizacion(cur)
+                cur.execute(f'''
+                    SELECT {listado['columnas']}
+                    FROM registros
+                    WHERE {filtro}
+                    ORDER BY {orden}
+                ''', params)
+                return respuesta_sincronizada(formatear_dorsales(cur.fetchall()), cursor, None)
+            
+            cur.execute(f'SELECT {listado["totales"]} FROM registros WHERE {filtro}', params)
+            respuesta = cur.fetchone()
+            
+            if despues is not None:
+                clave = ', '.join(listado['orden'])
+                marcadores = ', '.join(['%s'] * len(despues))
+                filtro += f" AND ({clave}) {'<' if listado['descendente'] else '>'} ({marcadores})"
+                params += despues
+            cur.execute(f'''
+                SELECT {listado['columnas']}
+                FROM registros
+                WHERE {filtro}
+                ORDER BY {orden}
+                LIMIT %s
+            ''', params + [limite + 1])
+            registros = cur.fetchall()
+            
+            siguiente = None
+            if len(registros) > limite:
+                registros = registros[:limite]
+                siguiente = cursor_pagina([registros[-1][columna] for columna in listado['orden']])
+            respuesta['registros'] = formatear_dorsales(registros)
+            respuesta['siguiente'] = siguiente
+            return jsonify(respuesta)
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Endpoint: Obtener registros pendientes (admin)
+@app.route('/api/registros-pendientes', methods=['GET'])
+@require_auth
+def get_registros_pendientes():
+    """Obtiene los registros pendientes de validación (sin traer imagenes).
+    Admite ?since=, filtros y paginación (ver listar_registros)."""
+    return listar_registros('pendientes')
+
+# Endpoint: Marcar entrega de dorsal
+@app.route('/api/entregar-dorsal', methods=['POST'])
 @require_auth
 def entregar_dorsal():
     """Marca que el dorsal fue entregado al corredor"""
@@ -1449,469 +1839,1959 @@ def entregar_dorsal():
             })
     except Exception as e:
         conn.rollback()
-        print(f"Error: {e}")
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Endpoint: Marcar asistencia
+@app.route('/api/marcar-asistencia', methods=['POST'])
+@require_auth
+def marcar_asistencia():
+    """Marca que el corredor asistió a la carrera"""
+    data = request.json
+    codigo = data.get('codigo')
+    asistio = data.get('asistio', True)
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute('''
+                UPDATE registros 
+                SET asistio = %s, fecha_asistencia = %s
+                WHERE codigo_registro = %s AND estado = 'pagado'
+            ''', (asistio, datetime.now(), codigo))
+            conn.commit()
+            
+            if cur.rowcount == 0:
+                return jsonify({'error': 'Registro no encontrado o no está pagado'}), 404
+            
+            return jsonify({
+                'success': True,
+                'message': f'Asistencia marcada como {asistio}'
+            })
+    except Exception as e:
+        conn.rollback()
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Endpoint: Obtener corredores inscritos (pagados) - Para el día de la carrera
+@app.route('/api/registros-inscritos', methods=['GET'])
+@require_auth
+def get_registros_inscritos():
+    """Obtiene los registros con pago validado (estado = pagado).
+    Admite ?since=, filtros y paginación (ver listar_registros)."""
+    return listar_registros('inscritos')
+
+# ===== CHECK-IN POR LOTES =====
+
+CHECKIN_LOTE_MAXIMO = 1000  # Items por petición
+
+def leer_lote_checkin(data):
+    """Listas paralelas (codigos, dorsales) con un elemento por item del lote, en el
+    orden recibido: primero los códigos y después los dorsales. ValueError si el
+    lote no es válido."""
+    codigos = data.get('codigos') or []
+    dorsales = data.get('dorsales') or []
+    if not isinstance(codigos, list) or not isinstance(dorsales, list):
+        raise ValueError('codigos y dorsales deben ser listas')
+    total = len(codigos) + len(dorsales)
+    if total == 0:
+        raise ValueError('Envía codigos o dorsales')
+    if total > CHECKIN_LOTE_MAXIMO:
+        raise ValueError(f'Máximo {CHECKIN_LOTE_MAXIMO} items por lote')
+    try:
+        dorsales = [int(dorsal) for dorsal in dorsales]
+    except (TypeError, ValueError):
+        raise ValueError('Los dorsales deben ser números')
+    
+    codigos = [str(codigo).strip().upper() for codigo in codigos]
+    return codigos + [None] * len(dorsales), [None] * len(codigos) + dorsales
+
+def checkin_lote(columna, valor, asignaciones, params_asignaciones):
+    """Marca columna = valor en todos los corredores pagados del lote con una sola
+    sentencia y devuelve el resultado de cada item para que el kiosko concilie:
+    actualizado, sin_cambios (ya estaba marcado), no_pagado o no_encontrado."""
+    try:
+        codigos, dorsales = leer_lote_checkin(request.json or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # El código es único en toda la tabla; el dorsal, solo dentro de la carrera
+            try:
+                carrera_id = carrera_de_la_peticion(cur, requerida=any(d is not None for d in dorsales))
+                carrera, params_carrera = condicion_carrera(carrera_id, 'rd.')
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            # La consulta final ve los registros como estaban antes del UPDATE
+            cur.execute(f'''
+                WITH entrada AS (
+                    SELECT e.posicion, e.codigo, e.dorsal, COALESCE(rc.id, rd.id) AS registro_id
+                    FROM unnest(%s::text[], %s::int[]) WITH ORDINALITY AS e(codigo, dorsal, posicion)
+                    LEFT JOIN registros rc ON rc.codigo_registro = e.codigo
+                    LEFT JOIN registros rd ON rd.dorsal = e.dorsal AND {carrera}
+                ),
+                actualizados AS (
+                    UPDATE registros r
+                    SET {asignaciones}
+                    WHERE r.id IN (SELECT registro_id FROM entrada)
+                      AND r.estado = 'pagado'
+                      AND r.{columna} IS DISTINCT FROM %s
+                    RETURNING r.id
+                )
+                SELECT e.codigo, e.dorsal, r.codigo_registro, r.dorsal AS dorsal_registro,
+                       r.nombre, r.apellido, r.estado,
+                       a.id IS NOT NULL AS actualizado
+                FROM entrada e
+                LEFT JOIN registros r ON r.id = e.registro_id
+                LEFT JOIN actualizados a ON a.id = e.registro_id
+                ORDER BY e.posicion
+            ''', (codigos, dorsales, *params_carrera, *params_asignaciones, valor))
+            filas = cur.fetchall()
+            conn.commit()
+        
+        resultados = []
+        for fila in filas:
+            if fila['codigo_registro'] is None:
+                resultado = 'no_encontrado'
+            elif fila['estado'] != 'pagado':
+                resultado = 'no_pagado'
+            else:
+                resultado = 'actualizado' if fila['actualizado'] else 'sin_cambios'
+            item = {'codigo': fila['codigo'], 'dorsal': fila['dorsal'], 'resultado': resultado}
+            if fila['codigo_registro'] is not None:
+                item.update({
+                    'codigo_registro': fila['codigo_registro'],
+                    'dorsal_formatted': str(fila['dorsal_registro']).zfill(3) if fila['dorsal_registro'] else None,
+                    'nombre': fila['nombre'],
+                    'apellido': fila['apellido']
+                })
+            resultados.append(item)
+        
+        return jsonify({
+            'success': True,
+            # Un corredor repetido en el lote se actualiza una sola vez
+            'actualizados': len({item['codigo_registro'] for item in resultados if item['resultado'] == 'actualizado'}),
+            'resultados': resultados
+        })
+    except Exception as e:
+        conn.rollback()
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Endpoint: Marcar entrega de dorsales por lote
+@app.route('/api/entregar-dorsal/lote', methods=['POST'])
+@require_auth
+def entregar_dorsal_lote():
+    """Marca como entregados los dorsales de un lote ({"codigos": [...], "dorsales": [...]});
+    los dorsales son de la carrera de carrera_id (por defecto, la de inscripciones)"""
+    return checkin_lote('dorsal_entregado', True,
+                        'dorsal_entregado = TRUE, fecha_entrega_dorsal = %s', (datetime.now(),))
+
+# Endpoint: Marcar asistencia por lote
+@app.route('/api/marcar-asistencia/lote', methods=['POST'])
+@require_auth
+def marcar_asistencia_lote():
+    """Marca la asistencia de un lote ({"codigos": [...], "dorsales": [...], "asistio": true})"""
+    asistio = (request.json or {}).get('asistio', True)
+    if not isinstance(asistio, bool):
+        return jsonify({'error': 'asistio debe ser true o false'}), 400
+    return checkin_lote('asistio', asistio, 'asistio = %s, fecha_asistencia = %s', (asistio, datetime.now()))
+
+# ===== BÚSQUEDA PARA EL MOSTRADOR DE CHECK-IN =====
+
+BUSQUEDA_LIMITE = 10
+BUSQUEDA_LIMITE_MAXIMO = 50
+_PATRON_CODIGO = re.compile(r'^REG-[0-9A-F]*$', re.IGNORECASE)
+
+def _prefijo_like(texto):
+    """Patrón LIKE 'texto%' escapando los comodines que escriba el usuario"""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def clasificar_busqueda(q):
+    """Condición SQL, parámetros y criterio de una búsqueda del mostrador (q ya sin
+    espacios repetidos):
+    - solo dígitos (hasta 9, cabe en INT): dorsal exacto
+    - REG-...: código por prefijo
+    - con @: correo por prefijo
+    - otro texto: prefijo de "nombre apellido" o "apellido nombre", sin tildes ni mayúsculas"""
+    # isascii: isdigit() también acepta '²' o dígitos de otras escrituras, que int() rechaza
+    if q.isascii() and q.isdigit() and len(q) <= 9:
+        return 'dorsal = %s', (int(q),), 'dorsal'
+    if _PATRON_CODIGO.match(q):
+        return 'codigo_registro LIKE %s', (_prefijo_like(q.upper()),), 'codigo'
+    if '@' in q:
+        return 'lower(correo) LIKE %s', (_prefijo_like(q.lower()),), 'correo'
+    patron = _prefijo_like(q)
+    condicion = f'nombre_busqueda LIKE {sql_sin_tildes("%s")} OR apellido_busqueda LIKE {sql_sin_tildes("%s")}'
+    return condicion, (patron, patron), 'nombre'
+
+# Endpoint: Buscar corredor por dorsal, código, correo o nombre
+@app.route('/api/registros/buscar', methods=['GET'])
+@require_auth
+def buscar_registros():
+    """Busca corredores para el mostrador mientras se escribe (?q=), según
+    clasificar_busqueda: dorsal exacto, código, correo o nombre por prefijo.
+    Solo busca en la carrera de ?carrera_id= (por defecto, la de inscripciones). Cada
+    caso es una sola consulta por índice (ver migraciones.py). Los pagados salen primero."""
+    q = ' '.join(request.args.get('q', '').split())
+    if not q:
+        return jsonify({'error': 'Parámetro q requerido'}), 400
+    limite = max(1, min(request.args.get('limite', BUSQUEDA_LIMITE, type=int), BUSQUEDA_LIMITE_MAXIMO))
+    condicion, params, criterio = clasificar_busqueda(q)
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            try:
+                carrera_id = carrera_de_la_peticion(cur, requerida=criterio == 'dorsal')
+                carrera, params_carrera = condicion_carrera(carrera_id)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            cur.execute(f'''
+                SELECT id, nombre, apellido, edad, genero, correo, team, categoria,
+                       codigo_registro, estado, dorsal, dorsal_entregado, asistio
+                FROM registros
+                WHERE {carrera} AND ({condicion})
+                ORDER BY estado = 'pagado' DESC, nombre, apellido
+                LIMIT %s
+            ''', (*params_carrera, *params, limite))
+            registros = formatear_dorsales(cur.fetchall())
+        
+        response = jsonify({'criterio': criterio, 'registros': registros})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# ===== SINCRONIZACIÓN DE KIOSKOS OFFLINE =====
+
+SYNC_OPERACIONES_MAXIMO = 500  # Operaciones por envío
+SYNC_TIPOS = ('entregar_dorsal', 'marcar_asistencia', 'registro_rapido')
+SYNC_CAMPOS_REGISTRO = ('nombre', 'apellido', 'edad', 'genero', 'correo', 'categoria')
+
+# Los correos de los registros rápidos sincronizados salen fuera de la petición
+_executor_correos = ThreadPoolExecutor(max_workers=2, thread_name_prefix='correos-sync')
+
+def _fecha_operacion(texto, ahora):
+    """Fecha ISO 8601 del kiosko como hora local sin zona (la de la BD). Acepta la 'Z'
+    de toISOString(), que fromisoformat no entiende antes de Python 3.11."""
+    if not texto:
+        return ahora
+    if not isinstance(texto, str):
+        raise ValueError(texto)
+    if texto[-1:] in ('Z', 'z'):
+        texto = texto[:-1] + '+00:00'
+    fecha = datetime.fromisoformat(texto)
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    return fecha
+
+def _error_operacion(op):
+    """Motivo por el que se rechaza una operación con datos inválidos, o None"""
+    if op.get('tipo') not in SYNC_TIPOS:
+        return f"Tipo de operación inválido: {op.get('tipo')}"
+    dorsal = op.get('dorsal')
+    if dorsal is not None and (
+            isinstance(dorsal, bool) or not isinstance(dorsal, (int, str)) or _entero_celda(str(dorsal)) is None):
+        return f'Dorsal inválido: {dorsal}'
+    if not isinstance(op.get('asistio', True), bool):
+        return 'asistio debe ser true o false'
+    return None
+
+def leer_operaciones_sync(data):
+    """Valida las operaciones de un envío y devuelve (validas, rechazadas). validas son
+    (fecha, op) ordenadas por fecha del kiosko y op_id, así el mismo conjunto de
+    operaciones llega siempre al mismo estado sin importar en qué orden se enviaron;
+    una fecha futura (reloj del kiosko adelantado) cuenta como ahora. rechazadas es
+    {op_id: resultado} de las que traen datos inválidos (fecha, dorsal, tipo...):
+    se responden como rechazadas sin frenar a las demás. ValueError si el envío en
+    sí no es válido."""
+    operaciones = data.get('operaciones')
+    if not isinstance(operaciones, list) or not operaciones:
+        raise ValueError('Envía la lista de operaciones')
+    if len(operaciones) > SYNC_OPERACIONES_MAXIMO:
+        raise ValueError(f'Máximo {SYNC_OPERACIONES_MAXIMO} operaciones por envío')
+    
+    ahora = datetime.now()
+    validas = []
+    rechazadas = {}
+    for op in operaciones:
+        # Sin op_id no hay a qué asociar el resultado: el envío entero es inválido
+        if not isinstance(op, dict) or not isinstance(op.get('op_id'), str) or not 0 < len(op['op_id']) <= 64:
+            raise ValueError('Cada operación necesita un op_id (texto de hasta 64 caracteres)')
+        error = _error_operacion(op)
+        if error is None:
+            try:
+                fecha = _fecha_operacion(op.get('fecha'), ahora)
+            except (TypeError, ValueError):
+                error = f"Fecha inválida: {op['fecha']}"
+        if error:
+            rechazadas[op['op_id']] = {'resultado': 'rechazada', 'error': error}
+            continue
+        validas.append((min(fecha, ahora), op))
+    
+    validas.sort(key=lambda item: (item[0], item[1]['op_id']))
+    return validas, rechazadas
+
+def _registro_de_operacion(cur, op, carrera_id):
+    """Corredor al que apunta una operación (bloqueado hasta el commit): por codigo,
+    dorsal (dentro de la carrera) o registro_op, el op_id del registro_rapido hecho
+    offline en el kiosko cuando todavía no conoce el código asignado"""
+    if op.get('registro_op'):
+        cur.execute("SELECT resultado->>'codigo_registro' AS codigo FROM operaciones_sync WHERE op_id = %s",
+                    (op['registro_op'],))
+        fila = cur.fetchone()
+        if not fila or not fila['codigo']:
+            return None
+        condicion, params = 'codigo_registro = %s', [fila['codigo']]
+    elif op.get('codigo'):
+        condicion, params = 'codigo_registro = %s', [str(op['codigo']).strip().upper()]
+    elif op.get('dorsal') is not None:
+        carrera, params_carrera = condicion_carrera(carrera_id)
+        condicion, params = f'dorsal = %s AND {carrera}', [int(op['dorsal'])] + params_carrera
+    else:
+        return None
+    
+    cur.execute(f'''
+        SELECT id, codigo_registro, dorsal, estado, dorsal_entregado, asistio, fecha_asistencia
+        FROM registros
+        WHERE {condicion}
+        FOR UPDATE
+    ''', params)
+    return cur.fetchone()
+
+def aplicar_operacion_sync(cur, op, fecha, carrera_id):
+    """Aplica una operación y devuelve (resultado, guardar). Con guardar=False el
+    resultado puede cambiar si se reintenta (corredor aún no sincronizado o no
+    pagado) y la operación no queda registrada. Reglas de conflicto:
+    - entregar_dorsal: una entrega no se deshace y queda la fecha más temprana.
+    - marcar_asistencia: gana la marca con la fecha más reciente; una operación más
+      vieja que la marca guardada se descarta.
+    - registro_rapido: el servidor asigna código y dorsal de la carrera, respetando el cupo."""
+    if op['tipo'] == 'registro_rapido':
+        datos = op.get('registro') or {}
+        faltantes = [campo for campo in SYNC_CAMPOS_REGISTRO if not datos.get(campo)]
+        if faltantes:
+            return {'resultado': 'rechazada', 'error': f"Faltan datos: {', '.join(faltantes)}"}, True
+        codigo_registro = f"REG-{uuid.uuid4().hex[:8].upper()}"
+        dorsal = insertar_registro_rapido(cur, datos, codigo_registro, carrera_id)
+        if dorsal is None:
+            return {'resultado': 'rechazada', 'error': MENSAJE_CUPO_AGOTADO}, True
+        return {'resultado': 'aplicada', 'codigo_registro': codigo_registro, 'dorsal': dorsal}, True
+    
+    registro = _registro_de_operacion(cur, op, carrera_id)
+    if registro is None:
+        return {'resultado': 'no_encontrado'}, False
+    base = {'codigo_registro': registro['codigo_registro'], 'dorsal': registro['dorsal']}
+    if registro['estado'] != 'pagado':
+        return {**base, 'resultado': 'no_pagado'}, False
+    
+    if op['tipo'] == 'entregar_dorsal':
+        cur.execute('''
+            UPDATE registros
+            SET dorsal_entregado = TRUE, fecha_entrega_dorsal = %s
+            WHERE id = %s
+              AND (NOT dorsal_entregado OR fecha_entrega_dorsal IS NULL OR fecha_entrega_dorsal > %s)
+        ''', (fecha, registro['id'], fecha))
+        return {**base, 'resultado': 'sin_cambios' if registro['dorsal_entregado'] else 'aplicada'}, True
+    
+    asistio = op.get('asistio', True)
+    if registro['fecha_asistencia'] is not None and registro['fecha_asistencia'] > fecha:
+        return {**base, 'resultado': 'descartada', 'asistio': registro['asistio']}, True
+    cur.execute('UPDATE registros SET asistio = %s, fecha_asistencia = %s WHERE id = %s',
+                (asistio, fecha, registro['id']))
+    return {**base, 'resultado': 'sin_cambios' if registro['asistio'] == asistio else 'aplicada',
+            'asistio': asistio}, True
+
+# Endpoint: Sincronizar operaciones de un kiosko offline
+@app.route('/api/checkin/sync', methods=['POST'])
+@require_auth
+def sincronizar_checkin():
+    """Aplica en una transacción las operaciones que un kiosko acumuló sin conexión
+    ({"dispositivo": ..., "operaciones": [{"op_id", "tipo", "fecha", ...}]}) y devuelve
+    el resultado de cada una y los inscritos que cambiaron desde ?since= (todos si no
+    vino; los borrados, con eliminado: true), con el cursor para el próximo envío. Los dorsales, los registros nuevos y
+    los cambios son de la carrera de carrera_id (por defecto, la de inscripciones).
+    Cada op_id se aplica una sola vez: reenviarla devuelve el resultado guardado."""
+    data = request.json or {}
+    try:
+        desde = parametro_since()
+        operaciones, rechazadas = leer_operaciones_sync(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    dispositivo = str(data.get('dispositivo') or '')[:100] or None
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    resultados = dict(rechazadas)
+    registrados = []
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Buscar por dorsal y registrar con dorsal nuevo necesitan una carrera
+            por_dorsal = any(
+                op['tipo'] == 'registro_rapido'
+                or (op.get('dorsal') is not None and not op.get('codigo') and not op.get('registro_op'))
+                for _, op in operaciones
+            )
+            try:
+                carrera_id = carrera_de_la_peticion(cur, requerida=por_dorsal)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            cur.execute('''
+                SELECT op_id, resultado FROM operaciones_sync
+                WHERE op_id = ANY(%s) AND resultado IS NOT NULL
+            ''', ([op['op_id'] for _, op in operaciones],))
+            for fila in cur.fetchall():
+                resultados[fila['op_id']] = {**fila['resultado'], 'repetida': True}
+            
+            for fecha, op in operaciones:
+                if op['op_id'] in resultados:
+                    continue
+                
+                # Cada operación en su savepoint: si una falla, las demás se aplican igual
+                cur.execute('SAVEPOINT operacion')
+                try:
+                    cur.execute('''
+                        INSERT INTO operaciones_sync (op_id, dispositivo, tipo, datos, fecha_cliente, admin_id)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (op_id) DO NOTHING
+                        RETURNING op_id
+                    ''', (op['op_id'], dispositivo, op['tipo'], Json(op), fecha, getattr(request, 'admin_id', None)))
+                    if cur.fetchone() is None:
+                        # Otro envío con la misma operación se confirmó mientras tanto
+                        cur.execute('SELECT resultado FROM operaciones_sync WHERE op_id = %s', (op['op_id'],))
+                        resultado, guardar = {**(cur.fetchone()['resultado'] or {}), 'repetida': True}, False
+                    else:
+                        resultado, guardar = aplicar_operacion_sync(cur, op, fecha, carrera_id)
+                    
+                    if guardar:
+                        cur.execute('UPDATE operaciones_sync SET resultado = %s WHERE op_id = %s',
+                                    (Json(resultado), op['op_id']))
+                    else:
+                        cur.execute('ROLLBACK TO SAVEPOINT operacion')
+                    cur.execute('RELEASE SAVEPOINT operacion')
+                except Exception as e:
+                    cur.execute('ROLLBACK TO SAVEPOINT operacion')
+                    cur.execute('RELEASE SAVEPOINT operacion')
+                    if es_cupo_agotado(e):
+                        resultado = {'resultado': 'rechazada', 'error': MENSAJE_CUPO_AGOTADO}
+                    else:
+                        log.error('Error aplicando operación %s: %s', op['op_id'], e)
+                        resultado = {'resultado': 'error', 'error': str(e)}
+                
+                resultados[op['op_id']] = resultado
+                if op['tipo'] == 'registro_rapido' and resultado['resultado'] == 'aplicada' and not resultado.get('repetida'):
+                    registrados.append((op['registro'], resultado))
+            conn.commit()
+        
+        if registrados:
+            cache_publico.invalidar('inscripciones_contador')
+            for datos, resultado in registrados:
+                _executor_correos.submit(enviar_correos_registro_rapido, datos,
+                                         resultado['codigo_registro'], resultado['dorsal'])
+        
+        # Estado del servidor para el kiosko, ya con las operaciones aplicadas
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cursor = cursor_sincronizacion(cur, desde)
+            carrera, params_carrera = condicion_carrera(carrera_id)
+            cur.execute(f'''
+                SELECT {LISTADOS_REGISTROS['inscritos']['columnas']}
+                FROM registros
+                WHERE {'version_cambio >= %s::xid8' if desde else "estado = 'pagado'"} AND {carrera}
+                ORDER BY dorsal ASC
+            ''', ([desde] if desde else []) + params_carrera)
+            cambios = formatear_dorsales(cur.fetchall())
+            if desde:
+                cambios += registros_eliminados_desde(cur, desde, carrera, params_carrera)
+        
+        return jsonify({
+            'resultados': [{'op_id': op['op_id'], **resultados[op['op_id']]} for op in data['operaciones']],
+            'cambios': cambios,
+            'cursor': cursor,
+            'carrera_id': carrera_id
+        })
+    except Exception as e:
+        conn.rollback()
+        log.error('Error: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
-# Endpoint: Marcar asistencia
-@app.route('/api/marcar-asistencia', methods=['POST'])
+# ===== EXPORTACIÓN EN STREAMING =====
+
+EXPORT_FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+EXPORT_FILAS_POR_LOTE = 1000  # Filas que trae el cursor del servidor en cada viaje
+EXPORT_TAMANO_CHUNK = 64 * 1024  # Bytes acumulados antes de enviar un chunk al cliente
+
+def _valor_exportable(valor):
+    """Convierte tipos de PostgreSQL (fechas, Decimal) a tipos serializables"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+def _lineas_exportacion(cur, columnas, formato):
+    """Genera las líneas de texto (CSV o NDJSON) a partir de un cursor"""
+    if formato == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columnas)
+        for fila in cur:
+            writer.writerow(fila)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        for fila in cur:
+            yield json.dumps(
+                {col: _valor_exportable(v) for col, v in zip(columnas, fila)},
+                ensure_ascii=False
+            ) + '\n'
+
+def respuesta_exportacion(conn, nombre_archivo, consulta, params, columnas):
+    """Devuelve una respuesta en streaming con el resultado de una consulta.
+
+    Usa un cursor con nombre (del lado del servidor) para que la memoria del
+    worker no dependa del número de filas. El formato se elige con
+    ?formato=csv|ndjson y ?gzip=1 comprime al vuelo. La conexión se cierra al
+    terminar (o abortar) la descarga.
+    """
+    formato = request.args.get('formato', 'csv').lower()
+    comprimir = request.args.get('gzip', '').lower() in ('1', 'true', 'si')
+    
+    if formato not in EXPORT_FORMATOS:
+        conn.close()
+        return jsonify({'error': f'Formato no soportado: {formato}. Usa csv o ndjson'}), 400
+    
+    def generar():
+        compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+        pendiente = []
+        tamano = 0
+        try:
+            with conn.cursor(name=f'export_{uuid.uuid4().hex}') as cur:
+                cur.itersize = EXPORT_FILAS_POR_LOTE
+                cur.execute(consulta, params)
+                
+                for linea in _lineas_exportacion(cur, columnas, formato):
+                    pendiente.append(linea)
+                    tamano += len(linea)
+                    if tamano >= EXPORT_TAMANO_CHUNK:
+                        chunk = ''.join(pendiente).encode('utf-8')
+                        pendiente, tamano = [], 0
+                        if compresor:
+                            chunk = compresor.compress(chunk)
+                        if chunk:
+                            yield chunk
+            
+            chunk = ''.join(pendiente).encode('utf-8')
+            if compresor:
+                chunk = compresor.compress(chunk) + compresor.flush()
+            if chunk:
+                yield chunk
+        finally:
+            conn.close()
+    
+    extension = formato + ('.gz' if comprimir else '')
+    mimetype = 'application/gzip' if comprimir else EXPORT_FORMATOS[formato]
+    return Response(
+        generar(),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre_archivo}.{extension}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+# Endpoint: Exportar resultados de un ranking
+@app.route('/api/rankings/<int:ranking_id>/export', methods=['GET'])
+def exportar_ranking(ranking_id):
+    """Exporta los registros de un ranking en CSV o NDJSON (streaming)"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT id FROM rankings WHERE id = %s', (ranking_id,))
+            if not cur.fetchone():
+                conn.close()
+                return jsonify({'error': 'Ranking no encontrado'}), 404
+    except Exception as e:
+        conn.close()
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    
+    # Las posiciones se mantienen actualizadas por recalcular_posiciones_ranking
+    return respuesta_exportacion(
+        conn,
+        f'ranking_{ranking_id}',
+        '''
+            SELECT posicion, dorsal, nombre, apellido, categoria, equipo, tiempo, puntos
+            FROM ranking_registros
+            WHERE ranking_id = %s
+            ORDER BY posicion ASC, id ASC
+        ''',
+        (ranking_id,),
+        ['posicion', 'dorsal', 'nombre', 'apellido', 'categoria', 'equipo', 'tiempo', 'puntos']
+    )
+
+# Endpoint: Exportar corredores inscritos (pagados)
+@app.route('/api/registros-inscritos/export', methods=['GET'])
+@require_auth
+def exportar_registros_inscritos():
+    """Exporta los registros con pago validado de la carrera (?carrera_id=, por defecto
+    la de inscripciones) en CSV o NDJSON (streaming)"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor() as cur:
+            carrera, params = condicion_carrera(carrera_de_la_peticion(cur))
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+    
+    return respuesta_exportacion(
+        conn,
+        'inscritos',
+        f'''
+            SELECT LPAD(dorsal::text, 3, '0'), codigo_registro, nombre, apellido, edad, genero,
+                   correo, team, categoria, fecha_validacion, fecha_creacion
+            FROM registros
+            WHERE estado = 'pagado' AND {carrera}
+            ORDER BY dorsal ASC
+        ''',
+        params,
+        ['dorsal', 'codigo_registro', 'nombre', 'apellido', 'edad', 'genero',
+         'correo', 'team', 'categoria', 'fecha_validacion', 'fecha_creacion']
+    )
+
+# Endpoint: Exportar control de entrega de dorsales y asistencia
+@app.route('/api/asistencia/export', methods=['GET'])
+@require_auth
+def exportar_asistencia():
+    """Exporta entrega de dorsales y asistencia de la carrera (?carrera_id=, por defecto
+    la de inscripciones) en CSV o NDJSON (streaming). Acepta ?asistio=true|false para filtrar."""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor() as cur:
+            carrera, params = condicion_carrera(carrera_de_la_peticion(cur))
+    except ValueError as e:
+        conn.close()
+        return jsonify({'error': str(e)}), 400
+    
+    filtro = f'AND {carrera}'
+    asistio = request.args.get('asistio')
+    if asistio is not None:
+        filtro += ' AND asistio = %s'
+        params.append(asistio.lower() in ('1', 'true', 'si'))
+    
+    return respuesta_exportacion(
+        conn,
+        'asistencia',
+        f'''
+            SELECT LPAD(dorsal::text, 3, '0'), codigo_registro, nombre, apellido, categoria,
+                   dorsal_entregado, fecha_entrega_dorsal, asistio
+            FROM registros
+            WHERE estado = 'pagado' {filtro}
+            ORDER BY dorsal ASC
+        ''',
+        params,
+        ['dorsal', 'codigo_registro', 'nombre', 'apellido', 'categoria',
+         'dorsal_entregado', 'fecha_entrega_dorsal', 'asistio']
+    )
+
+# ===== RESULTADOS EN VIVO (SSE) =====
+
+CANAL_RANKINGS = 'ranking_cambios'
+SSE_KEEPALIVE_SEGUNDOS = 15
+SSE_DURACION_MAXIMA = 300  # Segundos; EventSource reconecta solo al cerrarse el stream
+NOTIFY_PAYLOAD_MAXIMO = 7900  # PostgreSQL limita el payload de NOTIFY a 8000 bytes
+
+class DifusorEventos:
+    """Reparte eventos de un canal de PostgreSQL (LISTEN/NOTIFY) entre los
+    suscriptores locales de este worker.
+
+    Cada worker de gunicorn mantiene una conexión LISTEN en un hilo (solo
+    mientras haya alguien suscrito), así que un cambio hecho en cualquier
+    worker llega a todos. Si no se puede escuchar en la BD, el difusor
+    funciona en modo local y reparte solo dentro del proceso.
+    """
+    
+    def __init__(self, canal):
+        self.canal = canal
+        self.escuchando = False
+        self._suscriptores = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+    
+    def suscribir(self, clave):
+        """Devuelve una cola que recibirá los eventos publicados para la clave"""
+        cola = queue.Queue(maxsize=100)
+        with self._lock:
+            self._suscriptores.setdefault(clave, set()).add(cola)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._escuchar, name=f'listen-{self.canal}', daemon=True)
+                self._hilo.start()
+        return cola
+    
+    def desuscribir(self, clave, cola):
+        with self._lock:
+            colas = self._suscriptores.get(clave)
+            if colas:
+                colas.discard(cola)
+                if not colas:
+                    del self._suscriptores[clave]
+    
+    def publicar(self, conn, clave, evento):
+        """Publica un evento para una clave. Con NOTIFY llega a todos los workers
+        al hacer commit; si este worker no está escuchando, se reparte también local."""
+        payload = json.dumps({'clave': clave, 'evento': evento}, default=_valor_exportable)
+        if len(payload.encode('utf-8')) > NOTIFY_PAYLOAD_MAXIMO:
+            # Demasiados cambios para un NOTIFY: que los clientes recarguen completo
+            payload = json.dumps({'clave': clave, 'evento': {'tipo': 'recargar'}})
+        
+        notificado = False
+        if conn is not None:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT pg_notify(%s, %s)', (self.canal, payload))
+                conn.commit()
+                notificado = True
+            except Exception as e:
+                conn.rollback()
+                log_sse.error('Error publicando en canal %s: %s', self.canal, e)
+        
+        if not (notificado and self.escuchando):
+            self._repartir(payload)
+    
+    def _repartir(self, payload):
+        mensaje = json.loads(payload)
+        with self._lock:
+            colas = list(self._suscriptores.get(mensaje['clave'], ()))
+        for cola in colas:
+            try:
+                cola.put_nowait(mensaje['evento'])
+            except queue.Full:
+                # Cliente lento: descartar lo acumulado y pedirle que recargue
+                with cola.mutex:
+                    cola.queue.clear()
+                cola.put_nowait({'tipo': 'recargar'})
+    
+    def _escuchar(self):
+        """Hilo que mantiene el LISTEN mientras haya suscriptores"""
+        while True:
+            with self._lock:
+                if not self._suscriptores:
+                    self._hilo = None
+                    return
+            
+            conn = None
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {self.canal}')
+                self.escuchando = True
+                
+                while True:
+                    with self._lock:
+                        if not self._suscriptores:
+                            break
+                    if select.select([conn], [], [], SSE_KEEPALIVE_SEGUNDOS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._repartir(conn.notifies.pop(0).payload)
+            except Exception as e:
+                log_sse.warning('Error escuchando canal %s, modo local: %s', self.canal, e)
+                time.sleep(5)
+            finally:
+                self.escuchando = False
+                if conn:
+                    conn.close()
+
+difusor_rankings = DifusorEventos(CANAL_RANKINGS)
+
+def notificar_cambio_ranking(conn, ranking_id, accion, posiciones, registro_id=None, eliminado_id=None):
+    """Publica a los clientes en vivo solo las filas que cambiaron y las nuevas posiciones"""
+    try:
+        registros = []
+        if registro_id is not None:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute('''
+                    SELECT id, posicion, nombre, apellido, tiempo, categoria, 
+                           equipo, puntos, dorsal
+                    FROM ranking_registros
+                    WHERE id = %s AND ranking_id = %s
+                ''', (registro_id, ranking_id))
+                registros = cur.fetchall()
+        
+        difusor_rankings.publicar(conn, ranking_id, {
+            'tipo': 'cambios',
+            'accion': accion,
+            'registros': registros,
+            'eliminados': [eliminado_id] if eliminado_id is not None else [],
+            'posiciones': {str(reg_id): pos for reg_id, pos in posiciones.items()}
+        })
+    except Exception as e:
+        log_sse.error('Error notificando cambio en ranking %s: %s', ranking_id, e)
+
+def stream_eventos(difusor, clave):
+    """Respuesta SSE con los eventos que el difusor publique para la clave"""
+    cola = difusor.suscribir(clave)
+    
+    def generar():
+        try:
+            yield 'retry: 3000\n\n'
+            limite = time.monotonic() + SSE_DURACION_MAXIMA
+            while time.monotonic() < limite:
+                try:
+                    evento = cola.get(timeout=SSE_KEEPALIVE_SEGUNDOS)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f"event: {evento['tipo']}\ndata: {json.dumps(evento, default=_valor_exportable)}\n\n"
+        finally:
+            difusor.desuscribir(clave, cola)
+    
+    return Response(
+        generar(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Endpoint: Resultados en vivo de un ranking (Server-Sent Events)
+@app.route('/api/rankings/<int:ranking_id>/live', methods=['GET'])
+def ranking_en_vivo(ranking_id):
+    """Stream SSE con los cambios de un ranking (agregar, editar o eliminar registros)"""
+    return stream_eventos(difusor_rankings, ranking_id)
+
+# ===== EVENTOS DEL PANEL ADMIN =====
+
+CANAL_ADMIN = 'admin_eventos'  # El mismo que usa el trigger de migraciones.py
+
+# Los eventos los publica el trigger eventos_admin_registros (ver migraciones.py)
+difusor_admin = DifusorEventos(CANAL_ADMIN)
+
+# Endpoint: Cambios en los registros para los paneles admin (Server-Sent Events)
+@app.route('/api/admin/eventos', methods=['GET'])
+@require_auth
+def eventos_admin():
+    """Stream SSE con los cambios de registros: registro, comprobante, pago_validado,
+    pago_rechazado, dorsal_entregado, asistencia y eliminado (o recargar si se perdieron eventos).
+    Cada evento trae solo id, código y estado; el panel trae los datos con ?since="""
+    return stream_eventos(difusor_admin, 'registros')
+
+# ===== CACHÉ DE ENDPOINTS PÚBLICOS =====
+
+CACHE_TTL_SEGUNDOS = int(os.getenv('CACHE_TTL_SEGUNDOS', 300))
+CACHE_MAX_ENTRADAS = int(os.getenv('CACHE_MAX_ENTRADAS', 500))  # Por worker; al llenarse sale la más antigua
+CANAL_CACHE = 'cache_invalidacion'  # El mismo que usan los triggers de migraciones.py
+CACHE_GZIP_MINIMO = 1024  # Bytes; por debajo comprimir no compensa
+TABLAS_CACHEADAS = ('club_info', 'carreras', 'rankings', 'inscripciones_contador')
+
+class CacheRespuestas:
+    """Caché en memoria de las respuestas JSON públicas, ya serializadas
+    (y comprimidas, ver precalcular_respuesta).
+    
+    Cada entrada depende de unas tablas y vive CACHE_TTL_SEGUNDOS como máximo;
+    caben max_entradas (las vencidas se descartan al leerlas o al llenarse).
+    Las escrituras de este worker la invalidan al momento con invalidar(); las
+    de otros workers o las hechas directo en la BD llegan por el trigger de
+    NOTIFY (ver migraciones.py) y se aplican en la siguiente lectura. Si el LISTEN
+    falla, el TTL acota cuánto tiempo puede servirse un dato viejo.
+    """
+    
+    def __init__(self, ttl, difusor, max_entradas=CACHE_MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._difusor = difusor
+        self._cola = None
+        self._entradas = {}  # clave -> (expira, respuesta precalculada, tablas)
+        self._versiones = {}  # tabla -> número de invalidaciones
+        self._estadisticas = {}  # endpoint (clave hasta ':') -> {'aciertos', 'fallos'}
+        self._invalidaciones = 0
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave, tablas, calcular):
+        """Devuelve (valor, acierto). Si no hay entrada vigente llama a calcular(),
+        que devuelve el valor a guardar o None para no cachear (p. ej. un 404)."""
+        self._aplicar_invalidaciones_remotas()
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            # Por endpoint: la parte variable de la clave la elige quien hace la petición
+            contador = self._estadisticas.setdefault(clave.split(':', 1)[0], {'aciertos': 0, 'fallos': 0})
+            if entrada and entrada[0] > ahora:
+                contador['aciertos'] += 1
+                return entrada[1], True
+            if entrada:
+                del self._entradas[clave]
+            contador['fallos'] += 1
+            versiones = [self._versiones.get(tabla, 0) for tabla in tablas]
+        
+        valor = calcular()
+        
+        with self._lock:
+            # Si alguna tabla se invalidó mientras se consultaba, el dato ya puede estar viejo
+            if valor is not None and versiones == [self._versiones.get(tabla, 0) for tabla in tablas]:
+                self._entradas.pop(clave, None)
+                self._liberar_espacio(ahora)
+                self._entradas[clave] = (ahora + self.ttl, valor, frozenset(tablas))
+        return valor, False
+    
+    def _liberar_espacio(self, ahora):
+        """Con la caché llena, quita las vencidas y, si no alcanza, las más antiguas
+        (el dict conserva el orden de inserción; todas viven el mismo TTL)"""
+        if len(self._entradas) < self.max_entradas:
+            return
+        for clave in [c for c, (expira, _, _) in self._entradas.items() if expira <= ahora]:
+            del self._entradas[clave]
+        while len(self._entradas) >= self.max_entradas:
+            del self._entradas[next(iter(self._entradas))]
+    
+    def invalidar(self, *tablas):
+        """Descarta las entradas que dependen de alguna de las tablas"""
+        with self._lock:
+            for tabla in tablas:
+                self._versiones[tabla] = self._versiones.get(tabla, 0) + 1
+            for clave in [c for c, (_, _, deps) in self._entradas.items() if deps.intersection(tablas)]:
+                del self._entradas[clave]
+            self._invalidaciones += 1
+    
+    def _aplicar_invalidaciones_remotas(self):
+        if self._cola is None:
+            # La suscripción arranca el hilo LISTEN del difusor en este worker
+            with self._lock:
+                if self._cola is None:
+                    self._cola = self._difusor.suscribir('tablas')
+        while True:
+            try:
+                evento = self._cola.get_nowait()
+            except queue.Empty:
+                return
+            # 'recargar' llega si la cola se llenó: se desconoce qué cambió
+            self.invalidar(*((evento['tabla'],) if 'tabla' in evento else TABLAS_CACHEADAS))
+    
+    def estadisticas(self):
+        with self._lock:
+            claves = {}
+            for clave, contador in self._estadisticas.items():
+                total = contador['aciertos'] + contador['fallos']
+                claves[clave] = dict(contador, ratio=round(contador['aciertos'] / total, 4) if total else None)
+            aciertos = sum(c['aciertos'] for c in claves.values())
+            total = aciertos + sum(c['fallos'] for c in claves.values())
+            return {
+                'ttl_segundos': self.ttl,
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'invalidaciones': self._invalidaciones,
+                'escuchando_bd': self._difusor.escuchando,
+                'ratio': round(aciertos / total, 4) if total else None,
+                'claves': claves
+            }
+
+cache_publico = CacheRespuestas(CACHE_TTL_SEGUNDOS, DifusorEventos(CANAL_CACHE))
+
+def precalcular_respuesta(datos):
+    """Serializa una respuesta una sola vez: JSON, su versión gzip (si vale la pena) y su ETag"""
+    cuerpo = app.json.dumps(datos, separators=(',', ':')).encode('utf-8')
+    return {
+        'json': cuerpo,
+        'gzip': gzip.compress(cuerpo, mtime=0) if len(cuerpo) >= CACHE_GZIP_MINIMO else None,
+        'etag': hashlib.sha1(cuerpo).hexdigest()
+    }
+
+def respuesta_cacheada(clave, tablas, consultar, no_encontrado=None):
+    """Responde un endpoint público desde la caché. consultar(cur) devuelve los datos;
+    si devuelve None se responde 404 con el mensaje no_encontrado (sin cachear)."""
+    def calcular():
+        conn = get_db_connection()
+        if not conn:
+            raise RuntimeError('No se pudo conectar a la base de datos')
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                datos = consultar(cur)
+        finally:
+            conn.close()
+        if datos is None:
+            return None
+        return precalcular_respuesta(datos)
+    
+    try:
+        precalculada, acierto = cache_publico.obtener(clave, tablas, calcular)
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    
+    if precalculada is None:
+        return jsonify({'error': no_encontrado}), 404
+    
+    # accept_encodings respeta q=0 ("gzip;q=0" es un rechazo explícito)
+    comprimir = precalculada['gzip'] is not None and request.accept_encodings['gzip'] > 0
+    response = Response(precalculada['gzip'] if comprimir else precalculada['json'], mimetype='application/json')
+    if comprimir:
+        response.headers['Content-Encoding'] = 'gzip'
+    # En las dos ramas: la misma URL puede llegar comprimida o no según la petición
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Cache'] = 'HIT' if acierto else 'MISS'
+    # El navegador guarda la respuesta pero revalida siempre: si no cambió, 304 sin cuerpo
+    response.headers['Cache-Control'] = 'public, no-cache'
+    response.set_etag(precalculada['etag'], weak=True)
+    return response.make_conditional(request)
+
+# Endpoint: Estadísticas de la caché pública de este worker
+@app.route('/api/cache/estadisticas', methods=['GET'])
+@require_auth
+def estadisticas_cache():
+    """Aciertos, fallos y ratio por endpoint (cada worker de gunicorn tiene su propia caché)"""
+    return jsonify(dict(cache_publico.estadisticas(), pid=os.getpid()))
+
+# ===== ENDPOINTS DE RANKINGS =====
+
+# Obtener todos los rankings
+@app.route('/api/rankings', methods=['GET'])
+def get_rankings():
+    """Obtiene todos los rankings"""
+    def consultar(cur):
+        cur.execute('''
+            SELECT id, titulo, descripcion, carrera_id, estado, 
+                   fecha_creacion, fecha_actualizacion
+            FROM rankings
+            WHERE estado = 'activo'
+            ORDER BY fecha_actualizacion DESC
+        ''')
+        return cur.fetchall()
+    
+    return respuesta_cacheada('rankings', ('rankings',), consultar)
+
+# Obtener un ranking específico con sus registros
+@app.route('/api/rankings/<int:ranking_id>', methods=['GET'])
+def get_ranking(ranking_id):
+    """Obtiene un ranking específico con todos sus registros"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Obtener info del ranking
+            cur.execute('''
+                SELECT id, titulo, descripcion, carrera_id, estado, 
+                       fecha_creacion, fecha_actualizacion
+                FROM rankings
+                WHERE id = %s
+            ''', (ranking_id,))
+            ranking = cur.fetchone()
+            
+            if not ranking:
+                return jsonify({'error': 'Ranking no encontrado'}), 404
+            
+            # Obtener registros del ranking ordenados por tiempo de menor a mayor
+            cur.execute('''
+                SELECT id, posicion, nombre, apellido, tiempo, categoria, 
+                       equipo, puntos, dorsal
+                FROM ranking_registros
+                WHERE ranking_id = %s
+                ORDER BY posicion ASC
+            ''', (ranking_id,))
+            registros = cur.fetchall()
+            
+            # Reordenar en Python usando la función de conversión de tiempos
+            registros = sorted(registros, key=lambda x: tiempo_a_segundos(x['tiempo']))
+            
+            # Recalcular posiciones secuenciales
+            for idx, reg in enumerate(registros, 1):
+                reg['posicion'] = idx
+            
+            ranking['registros'] = registros
+            return jsonify(ranking)
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+def insertar_ranking(conn, titulo, descripcion, carrera_id, admin_id, registros):
+    """Crea un ranking con sus registros en una transacción y devuelve su id"""
+    with conn.cursor() as cur:
+        # Crear ranking
+        cur.execute('''
+            INSERT INTO rankings (titulo, descripcion, carrera_id, estado, creado_por)
+            VALUES (%s, %s, %s, 'activo', %s)
+            RETURNING id
+        ''', (titulo, descripcion, carrera_id, admin_id))
+        
+        ranking_id = cur.fetchone()[0]
+        
+        # Insertar registros en lotes (acepta listas o generadores)
+        execute_values(cur, '''
+            INSERT INTO ranking_registros 
+            (ranking_id, posicion, nombre, apellido, tiempo, categoria, equipo, puntos, dorsal)
+            VALUES %s
+        ''', ((
+            ranking_id,
+            reg.get('posicion'),
+            reg.get('nombre'),
+            reg.get('apellido'),
+            reg.get('tiempo'),
+            reg.get('categoria'),
+            reg.get('equipo'),
+            reg.get('puntos'),
+            reg.get('dorsal')
+        ) for reg in registros), page_size=1000)
+        
+        conn.commit()
+    
+    cache_publico.invalidar('rankings')
+    return ranking_id
+
+# ===== IMPORTACIÓN DE PDF EN SEGUNDO PLANO =====
+
+IMPORT_MAX_JOBS = int(os.getenv('IMPORT_MAX_JOBS', 1))  # Importaciones simultáneas por worker
+IMPORT_MAX_ADVERTENCIAS = 200  # Advertencias guardadas por importación
+# Una importación sin terminar tras estos minutos quedó huérfana (el worker que la
+# procesaba se reinició): el executor vive en memoria y nadie la va a retomar
+IMPORT_TIMEOUT_MINUTOS = int(os.getenv('IMPORT_TIMEOUT_MINUTOS', 30))
+
+_executor_importaciones = ThreadPoolExecutor(max_workers=IMPORT_MAX_JOBS, thread_name_prefix='importacion-pdf')
+
+def _actualizar_importacion(conn, job_id, **campos):
+    """Actualiza el estado/progreso de una importación y hace commit"""
+    asignaciones = ', '.join(f'{campo} = %s' for campo in campos)
+    with conn.cursor() as cur:
+        cur.execute(
+            f'UPDATE importaciones_pdf SET {asignaciones} WHERE id = %s',
+            (*campos.values(), job_id)
+        )
+    conn.commit()
+
+def marcar_importaciones_huerfanas():
+    """Pasa a 'error' las importaciones en cola o procesando desde hace más de
+    IMPORT_TIMEOUT_MINUTOS, para que no se queden así para siempre tras un reinicio"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute('''
+                UPDATE importaciones_pdf
+                SET estado = 'error', fecha_fin = NOW(),
+                    error = 'La importación se interrumpió (reinicio del servidor). Vuelve a subir el PDF.'
+                WHERE estado IN ('en_cola', 'procesando')
+                  AND COALESCE(fecha_inicio, fecha_creacion) < NOW() - make_interval(mins => %s)
+                RETURNING id
+            ''', (IMPORT_TIMEOUT_MINUTOS,))
+            huerfanas = [fila[0] for fila in cur.fetchall()]
+        conn.commit()
+        if huerfanas:
+            log_importacion.warning('Importaciones interrumpidas marcadas como error',
+                                    extra={'importaciones': huerfanas})
+    except Exception as e:
+        conn.rollback()
+        log_importacion.error('Error marcando importaciones interrumpidas: %s', e)
+    finally:
+        conn.close()
+
+def _progreso_importacion(conn, job_id, advertencias):
+    """Callback de progreso para extraer_registros_pdf: guarda páginas y advertencias"""
+    def progreso(paginas_procesadas, paginas_total, registros_extraidos, nuevas_advertencias):
+        advertencias.extend(nuevas_advertencias)
+        campos = {
+            'registros_extraidos': registros_extraidos,
+            'advertencias': Json(advertencias[:IMPORT_MAX_ADVERTENCIAS])
+        }
+        if paginas_total is not None:
+            campos['paginas_procesadas'] = paginas_procesadas
+            campos['paginas_total'] = paginas_total
+        _actualizar_importacion(conn, job_id, **campos)
+    return progreso
+
+def _procesar_importacion_pdf(job_id, pdf_data, titulo, descripcion, carrera_id, admin_id):
+    """Parsea el PDF, inserta el ranking y recalcula posiciones, reportando progreso"""
+    conn = get_db_connection()
+    if not conn:
+        log_importacion.error('Importación sin conexión a la base de datos', extra={'job_id': job_id})
+        return
+    
+    progreso = _progreso_importacion(conn, job_id, [])
+    
+    try:
+        _actualizar_importacion(conn, job_id, estado='procesando', fecha_inicio=datetime.now())
+        
+        registros_extraidos = extraer_registros_pdf(pdf_data, progreso=progreso)
+        
+        if not registros_extraidos:
+            log_importacion.warning('No se pudo extraer datos del PDF', extra={'job_id': job_id})
+            _actualizar_importacion(
+                conn, job_id, estado='error', fecha_fin=datetime.now(),
+                error='No se pudo extraer datos del PDF. Asegúrate de que contenga una tabla con los resultados.'
+            )
+            return
+        
+        log_importacion.info('Registros extraídos del PDF', extra={'job_id': job_id, 'registros': len(registros_extraidos)})
+        
+        ranking_id = insertar_ranking(conn, titulo, descripcion, carrera_id, admin_id, registros_extraidos)
+        
+        # Recalcular posiciones basándose en tiempos
+        recalcular_posiciones_ranking(conn, ranking_id)
+        
+        _actualizar_importacion(
+            conn, job_id, estado='completado', ranking_id=ranking_id,
+            registros_extraidos=len(registros_extraidos), fecha_fin=datetime.now()
+        )
+    except Exception as e:
+        conn.rollback()
+        log_importacion.exception('Error en importación: %s', e, extra={'job_id': job_id})
+        try:
+            _actualizar_importacion(conn, job_id, estado='error', error=str(e), fecha_fin=datetime.now())
+        except Exception as e2:
+            log_importacion.error('Error guardando estado de importación: %s', e2, extra={'job_id': job_id})
+    finally:
+        conn.close()
+
+# Crear ranking desde PDF
+@app.route('/api/rankings/crear-desde-pdf', methods=['POST'])
+@require_auth
+def crear_ranking_desde_pdf():
+    """Encola la creación de un ranking desde un PDF y devuelve el id de la importación"""
+    titulo = request.form.get('titulo')
+    descripcion = request.form.get('descripcion')
+    carrera_id = request.form.get('carrera_id', type=int)
+    
+    if not titulo or 'archivo_pdf' not in request.files:
+        return jsonify({'error': 'Título y archivo PDF son requeridos'}), 400
+    
+    pdf_file = request.files['archivo_pdf']
+    
+    if not pdf_file.filename.lower().endswith('.pdf'):
+        return jsonify({'error': 'Solo se aceptan archivos PDF'}), 400
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        pdf_data = pdf_file.read()
+        admin_id = get_admin_id()
+        job_id = uuid.uuid4().hex
+        
+        with conn.cursor() as cur:
+            cur.execute('''
+                INSERT INTO importaciones_pdf (id, titulo, archivo, estado, creado_por)
+                VALUES (%s, %s, %s, 'en_cola', %s)
+            ''', (job_id, titulo, pdf_file.filename[:255], admin_id))
+            conn.commit()
+        
+        _executor_importaciones.submit(
+            _procesar_importacion_pdf, job_id, pdf_data, titulo, descripcion, carrera_id, admin_id
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': 'Importación en cola',
+            'job_id': job_id,
+            'estado_url': f'/api/rankings/importaciones/{job_id}'
+        }), 202
+    
+    except Exception as e:
+        conn.rollback()
+        log_importacion.error('Error encolando importación de PDF: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Estado de una importación de PDF
+@app.route('/api/rankings/importaciones/<job_id>', methods=['GET'])
+@require_auth
+def get_importacion(job_id):
+    """Obtiene el estado y progreso de una importación de PDF"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute('SELECT * FROM importaciones_pdf WHERE id = %s', (job_id,))
+            importacion = cur.fetchone()
+            
+            if not importacion:
+                return jsonify({'error': 'Importación no encontrada'}), 404
+            
+            return jsonify(importacion)
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# Historial de importaciones de PDF
+@app.route('/api/rankings/importaciones', methods=['GET'])
+@require_auth
+def get_importaciones():
+    """Lista las importaciones de PDF más recientes para revisión"""
+    limite = min(request.args.get('limite', 20, type=int), 100)
+    
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute('''
+                SELECT id, tipo, titulo, archivo, estado, paginas_procesadas, paginas_total,
+                       registros_extraidos, jsonb_array_length(advertencias) AS total_advertencias,
+                       ranking_id, error, fecha_creacion, fecha_inicio, fecha_fin
+                FROM importaciones_pdf
+                ORDER BY fecha_creacion DESC
+                LIMIT %s
+            ''', (limite,))
+            return jsonify(cur.fetchall())
+    except Exception as e:
+        log.error('Error: %s', e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        conn.close()
+
+# ===== IMPORTACIÓN DE CSV / XLSX =====
+
+IMPORT_FILAS_POR_LOTE = 1000  # Filas que se validan y normalizan juntas antes de insertarlas
+IMPORT_CAMPOS = ('posicion', 'dorsal', 'nombre', 'apellido', 'tiempo', 'categoria', 'equipo', 'puntos')
+
+def formatear_tiempo(segundos):
+    """Formatea segundos como HH:MM:SS (con centésimas si las hay)"""
+    centesimas = round(segundos * 100)
+    horas, resto = divmod(centesimas, 360000)
+    minutos, resto = divmod(resto, 6000)
+    segs, centesimas = divmod(resto, 100)
+    texto = f'{horas:02d}:{minutos:02d}:{segs:02d}'
+    return f'{texto}.{centesimas:02d}' if centesimas else texto
+
+def _texto_celda(valor):
+    """Convierte una celda de Excel al texto que tendría en un CSV"""
+    if valor is None:
+        return ''
+    if isinstance(valor, timedelta):
+        return formatear_tiempo(valor.total_seconds())
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if hasattr(valor, 'hour'):  # datetime.time: Excel guarda así los tiempos de carrera
+        return formatear_tiempo(valor.hour * 3600 + valor.minute * 60 + valor.second + valor.microsecond / 1e6)
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+def _filas_csv(stream):
+    """Lee un CSV en streaming, detectando codificación (UTF-8 o Windows-1252) y separador"""
+    inicio = stream.read(64 * 1024)
+    stream.seek(0)
+    
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(inicio)
+        codificacion = 'utf-8-sig'
+    except UnicodeDecodeError:
+        codificacion = 'cp1252'
+    
+    try:
+        dialecto = csv.Sniffer().sniff(inicio[:8192].decode(codificacion, errors='ignore'), delimiters=',;\t|')
+    except csv.Error:
+        dialecto = csv.excel
+    
+    # codecs y no io.TextIOWrapper: en Python < 3.11 el SpooledTemporaryFile de
+    # Werkzeug no implementa readable() y TextIOWrapper lo rechaza
+    return csv.reader(codecs.getreader(codificacion)(stream), dialecto)
+
+def _filas_xlsx(stream):
+    """Lee la primera hoja de un XLSX fila a fila (modo solo lectura de openpyxl)"""
+    from openpyxl import load_workbook  # Solo se carga cuando llega un XLSX
+    
+    libro = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for fila in libro.active.iter_rows(values_only=True):
+            yield [_texto_celda(valor) for valor in fila]
+    finally:
+        libro.close()
+
+def _indices_columnas(encabezado, mapeo=None):
+    """Devuelve {campo: índice de columna}, según el mapeo enviado o detectado por encabezado"""
+    normalizado = [str(h).strip().lower() for h in encabezado]
+    indices = {}
+    
+    if mapeo:
+        for campo, columna in mapeo.items():
+            if campo not in IMPORT_CAMPOS:
+                raise ValueError(f'Campo desconocido en el mapeo: {campo}')
+            if isinstance(columna, int):
+                indices[campo] = columna
+            elif str(columna).strip().lower() in normalizado:
+                indices[campo] = normalizado.index(str(columna).strip().lower())
+            else:
+                raise ValueError(f"La columna '{columna}' no está en el encabezado")
+    else:
+        # Si hay tiempo chip y gun, gana chip
+        for col_idx, col_nombre in enumerate(normalizado):
+            campo = campo_encabezado(col_nombre)
+            if campo and (campo not in indices or (campo == 'tiempo' and 'chip' in col_nombre)):
+                indices[campo] = col_idx
+    
+    if 'nombre' not in indices:
+        raise ValueError('No se encontró la columna de nombre; indícala en el mapeo de columnas')
+    
+    return indices
+
+def _entero_celda(texto):
+    """Entero de una celda de posición o dorsal, o None si no es un número que quepa
+    en INT (isdigit() sola acepta '²' y dígitos de otras escrituras)"""
+    if texto.isascii() and texto.isdigit() and len(texto) <= 9:
+        return int(texto)
+    return None
+
+def _advertir(resumen, mensaje):
+    """Anota una advertencia de importación (hasta IMPORT_MAX_ADVERTENCIAS)"""
+    if len(resumen['advertencias']) < IMPORT_MAX_ADVERTENCIAS:
+        resumen['advertencias'].append(mensaje)
+
+def _registros_desde_filas(filas, indices, resumen):
+    """Valida y normaliza las filas por lotes y genera los registros listos para insertar.
+    Lleva la cuenta de filas, importados y advertencias en resumen."""
+    def celda(fila, campo):
+        idx = indices.get(campo)
+        if idx is None or idx >= len(fila) or fila[idx] is None:
+            return ''
+        return str(fila[idx]).strip()
+    
+    while True:
+        lote = list(islice(filas, IMPORT_FILAS_POR_LOTE))
+        if not lote:
+            return
+        
+        registros = []
+        tiempos = []
+        for fila in lote:
+            resumen['filas'] += 1
+            numero_fila = resumen['filas'] + 1  # La fila 1 es el encabezado
+            
+            if not any(fila):
+                continue
+            
+            nombre = celda(fila, 'nombre')
+            if not nombre:
+                _advertir(resumen, f'Fila {numero_fila}: sin nombre, se omite')
+                continue
+            
+            # Sin columna de apellido, separar el nombre completo como en el PDF
+            if 'apellido' in indices:
+                apellido = celda(fila, 'apellido')
+            else:
+                nombre, _, apellido = nombre.partition(' ')
+            
+            posicion = _entero_celda(celda(fila, 'posicion').rstrip('.º°'))
+            if posicion is None:
+                # Posición provisional: se recalcula por tiempo al terminar
+                posicion = resumen['importados'] + len(registros) + 1
+            
+            texto_dorsal = celda(fila, 'dorsal')
+            dorsal = _entero_celda(texto_dorsal)
+            if texto_dorsal and dorsal is None:
+                _advertir(resumen, f"Fila {numero_fila}: dorsal '{texto_dorsal}' no numérico, se ignora")
+            
+            puntos = celda(fila, 'puntos').replace(',', '.')
+            try:
+                puntos = float(puntos) if puntos else None
+            except ValueError:
+                _advertir(resumen, f"Fila {numero_fila}: puntos '{puntos}' no numéricos, se ignoran")
+                puntos = None
+            
+            registros.append({
+                'posicion': posicion,
+                'nombre': nombre[:100],
+                'apellido': apellido[:100],
+                'tiempo': None,
+                'categoria': celda(fila, 'categoria')[:50] or None,
+                'equipo': celda(fila, 'equipo')[:100] or None,
+                'puntos': puntos,
+                'dorsal': dorsal,
+                'fila': numero_fila
+            })
+            tiempos.append(celda(fila, 'tiempo'))
+        
+        # Normalizar los tiempos del lote
+        for registro, tiempo in zip(registros, tiempos):
+            segundos = tiempo_a_segundos(tiempo)
+            if segundos != float('inf'):
+                registro['tiempo'] = formatear_tiempo(segundos)
+            elif tiempo:
+                _advertir(resumen, f"Fila {registro['fila']}: tiempo '{tiempo}' no reconocido")
+        
+        resumen['importados'] += len(registros)
+        yield from registros
+
+def leer_archivo_resultados(archivo, mapeo, resumen):
+    """Abre un CSV/XLSX subido y devuelve (encabezado, indices, generador de registros).
+    Lanza ValueError si el archivo o el mapeo no sirven."""
+    extension = archivo.filename.rsplit('.', 1)[-1].lower() if '.' in archivo.filename else ''
+    if extension not in ('csv', 'txt', 'xlsx'):
+        raise ValueError('Solo se aceptan archivos CSV o XLSX')
+    
+    filas = _filas_xlsx(archivo.stream) if extension == 'xlsx' else _filas_csv(archivo.stream)
+    
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise ValueError('El archivo está vacío')
+    
+    indices = _indices_columnas(encabezado, mapeo)
+    return encabezado, indices, _registros_desde_filas(filas, indices, resumen)
+
+def _mapeo_desde_form():
+    """Lee el mapeo opcional {campo: nombre o índice de columna} del formulario"""
+    if not request.form.get('mapeo'):
+        return None
+    try:
+        mapeo = json.loads(request.form['mapeo'])
+    except ValueError:
+        raise ValueError('El mapeo de columnas no es JSON válido')
+    if not isinstance(mapeo, dict):
+        raise ValueError('El mapeo de columnas debe ser un objeto {campo: columna}')
+    return mapeo
+
+# Crear ranking desde CSV/XLSX
+@app.route('/api/rankings/crear-desde-archivo', methods=['POST'])
 @require_auth
-def marcar_asistencia():
-    """Marca que el corredor asistió a la carrera"""
-    data = request.json
-    codigo = data.get('codigo')
-    asistio = data.get('asistio', True)
+def crear_ranking_desde_archivo():
+    """Crea un ranking desde un CSV o XLSX exportado por el sistema de cronometraje"""
+    titulo = request.form.get('titulo')
+    descripcion = request.form.get('descripcion')
+    carrera_id = request.form.get('carrera_id', type=int)
+    
+    if not titulo or 'archivo' not in request.files:
+        return jsonify({'error': 'Título y archivo son requeridos'}), 400
     
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
     
     try:
-        with conn.cursor() as cur:
-            cur.execute('''
-                UPDATE registros 
-                SET asistio = %s
-                WHERE codigo_registro = %s AND estado = 'pagado'
-            ''', (asistio, codigo))
-            conn.commit()
-            
-            if cur.rowcount == 0:
-                return jsonify({'error': 'Registro no encontrado o no está pagado'}), 404
-            
+        inicio = time.perf_counter()
+        resumen = {'filas': 0, 'importados': 0, 'advertencias': []}
+        
+        try:
+            encabezado, indices, registros = leer_archivo_resultados(
+                request.files['archivo'], _mapeo_desde_form(), resumen
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        primero = next(registros, None)
+        if primero is None:
             return jsonify({
-                'success': True,
-                'message': f'Asistencia marcada como {asistio}'
-            })
+                'error': 'No se encontraron filas válidas en el archivo',
+                'advertencias': resumen['advertencias']
+            }), 400
+        
+        admin_id = get_admin_id()
+        ranking_id = insertar_ranking(conn, titulo, descripcion, carrera_id, admin_id, chain([primero], registros))
+        
+        # Recalcular posiciones basándose en tiempos
+        recalcular_posiciones_ranking(conn, ranking_id)
+        
+        return jsonify({
+            'success': True,
+            'message': f"Ranking creado exitosamente con {resumen['importados']} registros",
+            'ranking_id': ranking_id,
+            'registros_count': resumen['importados'],
+            'filas_leidas': resumen['filas'],
+            'columnas': {campo: str(encabezado[idx]) if idx < len(encabezado) else idx for campo, idx in indices.items()},
+            'advertencias': resumen['advertencias'],
+            'duracion_ms': round((time.perf_counter() - inicio) * 1000)
+        })
+    
     except Exception as e:
         conn.rollback()
-        print(f"Error: {e}")
+        log_importacion.error('Error importando archivo de resultados: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
-# Endpoint: Obtener corredores inscritos (pagados) - Para el día de la carrera
-@app.route('/api/registros-inscritos', methods=['GET'])
-@require_auth
-def get_registros_inscritos():
-    """Obtiene los registros con pago validado (estado = pagado)"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+# ===== RE-IMPORTACIÓN INCREMENTAL =====
+
+# Campos que se comparan entre el ranking guardado y el archivo corregido
+REIMPORT_CAMPOS = ('nombre', 'apellido', 'tiempo', 'categoria', 'equipo', 'puntos', 'dorsal')
+# Campos que trae siempre el parser de PDF (equipo y puntos no se leen del PDF)
+REIMPORT_CAMPOS_PDF = ('nombre', 'apellido', 'tiempo', 'categoria', 'dorsal')
+
+def _clave_nombre(nombre, apellido):
+    """Nombre completo en minúsculas, sin acentos ni espacios repetidos, para emparejar"""
+    texto = unicodedata.normalize('NFKD', f"{nombre or ''} {apellido or ''}".lower())
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).split())
+
+def _valor_cambio(campo, actual, nuevo):
+    """Indica si el valor del archivo cambia el guardado (los tiempos se comparan en segundos)"""
+    if campo == 'tiempo':
+        segundos_actual, segundos_nuevo = tiempo_a_segundos(actual), tiempo_a_segundos(nuevo)
+        if segundos_actual != float('inf') or segundos_nuevo != float('inf'):
+            return segundos_actual != segundos_nuevo
+    if campo in ('puntos', 'dorsal'):
+        actual = None if actual is None else float(actual)
+        nuevo = None if nuevo is None or nuevo == '' else float(nuevo)
+        return actual != nuevo
+    return (actual or None) != (nuevo or None)
+
+def calcular_diff_ranking(existentes, nuevos, campos):
+    """Empareja las filas del archivo con las guardadas (primero por dorsal, luego por nombre)
+    y devuelve (insertar, actualizar, eliminar, sin_cambios)."""
+    por_dorsal = {}
+    por_nombre = {}
+    for registro in existentes:
+        if registro['dorsal'] is not None:
+            por_dorsal.setdefault(int(registro['dorsal']), []).append(registro)
+        por_nombre.setdefault(_clave_nombre(registro['nombre'], registro['apellido']), []).append(registro)
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    emparejados = {}  # id guardado -> fila del archivo
+    
+    def emparejar(candidatos, nuevo):
+        for registro in candidatos or ():
+            if registro['id'] not in emparejados:
+                emparejados[registro['id']] = (registro, nuevo)
+                return True
+        return False
+    
+    # Dos pasadas: un dorsal coincidente manda sobre un nombre coincidente
+    sin_dorsal = []
+    for nuevo in nuevos:
+        if nuevo.get('dorsal') is None or not emparejar(por_dorsal.get(int(nuevo['dorsal'])), nuevo):
+            sin_dorsal.append(nuevo)
+    
+    insertar = [
+        nuevo for nuevo in sin_dorsal
+        if not emparejar(por_nombre.get(_clave_nombre(nuevo.get('nombre'), nuevo.get('apellido'))), nuevo)
+    ]
+    
+    actualizar = []
+    sin_cambios = 0
+    for registro, nuevo in emparejados.values():
+        cambios = {
+            campo: [registro[campo], nuevo.get(campo)]
+            for campo in campos
+            if _valor_cambio(campo, registro[campo], nuevo.get(campo))
+        }
+        if cambios:
+            actualizar.append({
+                'id': registro['id'],
+                'nombre': registro['nombre'],
+                'apellido': registro['apellido'],
+                'dorsal': registro['dorsal'],
+                'cambios': cambios
+            })
+        else:
+            sin_cambios += 1
+    
+    eliminar = [registro for registro in existentes if registro['id'] not in emparejados]
+    
+    return insertar, actualizar, eliminar, sin_cambios
+
+def _version_ranking(registros):
+    """Huella del contenido actual del ranking, para confirmar sobre la misma vista previa"""
+    contenido = json.dumps(
+        [[r['id']] + [r[campo] for campo in REIMPORT_CAMPOS] for r in sorted(registros, key=lambda r: r['id'])],
+        default=str
+    )
+    return hashlib.sha1(contenido.encode()).hexdigest()
+
+def aplicar_diff_ranking(conn, ranking_id, insertar, actualizar, eliminar):
+    """Aplica inserciones, actualizaciones y borrados en lotes, sin hacer commit"""
+    with conn.cursor() as cur:
+        if eliminar:
             cur.execute('''
-                SELECT id, nombre, apellido, edad, genero, correo, team, categoria, 
-                       codigo_registro, dorsal, dorsal_entregado, asistio, 
-                       fecha_entrega_dorsal, fecha_creacion
-                FROM registros 
-                WHERE estado = 'pagado'
-                ORDER BY dorsal ASC
-            ''')
-            registros = cur.fetchall()
-            
-            # Formatear dorsales con 3 dígitos
-            for registro in registros:
-                if registro['dorsal']:
-                    registro['dorsal_formatted'] = str(registro['dorsal']).zfill(3)
-            
-            return jsonify(registros)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+                DELETE FROM ranking_registros
+                WHERE ranking_id = %s AND id = ANY(%s)
+            ''', (ranking_id, [r['id'] for r in eliminar]))
+        
+        if actualizar:
+            # Cada columna se asigna desde VALUES solo si cambió; si no, se conserva
+            filas = [
+                [a['id']] + [a['cambios'][campo][1] if campo in a['cambios'] else None for campo in REIMPORT_CAMPOS]
+                + [[campo for campo in REIMPORT_CAMPOS if campo in a['cambios']]]
+                for a in actualizar
+            ]
+            asignaciones = ',\n'.join(
+                f"{campo} = CASE WHEN '{campo}' = ANY(v.campos) THEN v.{campo} ELSE r.{campo} END"
+                for campo in REIMPORT_CAMPOS
+            )
+            execute_values(cur, f'''
+                UPDATE ranking_registros AS r
+                SET {asignaciones}
+                FROM (VALUES %s) AS v(id, {', '.join(REIMPORT_CAMPOS)}, campos)
+                WHERE r.id = v.id AND r.ranking_id = {int(ranking_id)}
+            ''', filas, template='(%s, %s, %s, %s, %s, %s, %s::numeric, %s::int, %s::text[])', page_size=1000)
+        
+        if insertar:
+            cur.execute('SELECT COALESCE(MAX(posicion), 0) FROM ranking_registros WHERE ranking_id = %s', (ranking_id,))
+            max_pos = cur.fetchone()[0]
+            # Posición provisional al final: se recalcula por tiempo al terminar
+            execute_values(cur, '''
+                INSERT INTO ranking_registros 
+                (ranking_id, posicion, nombre, apellido, tiempo, categoria, equipo, puntos, dorsal)
+                VALUES %s
+            ''', [(
+                ranking_id,
+                max_pos + i,
+                reg.get('nombre'),
+                reg.get('apellido'),
+                reg.get('tiempo'),
+                reg.get('categoria'),
+                reg.get('equipo'),
+                reg.get('puntos'),
+                reg.get('dorsal')
+            ) for i, reg in enumerate(insertar, 1)], page_size=1000)
+        
+        cur.execute('UPDATE rankings SET fecha_actualizacion = NOW() WHERE id = %s', (ranking_id,))
 
-# ===== ENDPOINTS DE RANKINGS =====
+def _registros_para_reimportar(cur, ranking_id):
+    """Registros guardados del ranking con los campos que compara la re-importación"""
+    cur.execute('''
+        SELECT id, nombre, apellido, tiempo, categoria, equipo, puntos, dorsal
+        FROM ranking_registros
+        WHERE ranking_id = %s
+    ''', (ranking_id,))
+    return cur.fetchall()
 
-# Obtener todos los rankings
-@app.route('/api/rankings', methods=['GET'])
-def get_rankings():
-    """Obtiene todos los rankings"""
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+def vista_previa_reimportacion(ranking_id, existentes, nuevos, campos, advertencias):
+    """Diff entre el ranking guardado y las filas del archivo, con la versión sobre la que se calculó"""
+    insertar, actualizar, eliminar, sin_cambios = calcular_diff_ranking(existentes, nuevos, campos)
+    return {
+        'ranking_id': ranking_id,
+        'version': _version_ranking(existentes),
+        'resumen': {
+            'insertar': len(insertar),
+            'actualizar': len(actualizar),
+            'eliminar': len(eliminar),
+            'sin_cambios': sin_cambios
+        },
+        'insertar': [{k: v for k, v in reg.items() if k != 'fila'} for reg in insertar],
+        'actualizar': actualizar,
+        'eliminar': eliminar,
+        'advertencias': advertencias,
+        'aplicado': False
+    }
+
+def _aplicar_reimportacion(conn, ranking_id, vista_previa):
+    """Aplica el diff y recalcula posiciones una sola vez, en la transacción en curso, y avisa"""
+    aplicar_diff_ranking(conn, ranking_id, vista_previa['insertar'], vista_previa['actualizar'], vista_previa['eliminar'])
+    recalcular_posiciones_ranking(conn, ranking_id, commit=False)
+    conn.commit()
+    cache_publico.invalidar('rankings')
     
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute('''
-                SELECT id, titulo, descripcion, carrera_id, estado, 
-                       fecha_creacion, fecha_actualizacion
-                FROM rankings
-                WHERE estado = 'activo'
-                ORDER BY fecha_actualizacion DESC
-            ''')
-            rankings = cur.fetchall()
-            return jsonify(rankings)
-    except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
-    finally:
-        conn.close()
+    difusor_rankings.publicar(conn, ranking_id, {'tipo': 'recargar'})
+    
+    vista_previa['aplicado'] = True
+    vista_previa['success'] = True
+    return vista_previa
 
-# Obtener un ranking específico con sus registros
-@app.route('/api/rankings/<int:ranking_id>', methods=['GET'])
-def get_ranking(ranking_id):
-    """Obtiene un ranking específico con todos sus registros"""
+def _procesar_reimportacion_pdf(job_id, pdf_data, ranking_id):
+    """Parsea el PDF corregido y guarda la vista previa de cambios para confirmarla después"""
     conn = get_db_connection()
     if not conn:
-        return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+        log_importacion.error('Re-importación sin conexión a la base de datos', extra={'job_id': job_id})
+        return
+    
+    advertencias = []
+    progreso = _progreso_importacion(conn, job_id, advertencias)
     
     try:
+        _actualizar_importacion(conn, job_id, estado='procesando', fecha_inicio=datetime.now())
+        
+        nuevos = extraer_registros_pdf(pdf_data, progreso=progreso)
+        
+        if not nuevos:
+            _actualizar_importacion(
+                conn, job_id, estado='error', fecha_fin=datetime.now(),
+                error='No se encontraron filas válidas en el archivo'
+            )
+            return
+        
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Obtener info del ranking
-            cur.execute('''
-                SELECT id, titulo, descripcion, carrera_id, estado, 
-                       fecha_creacion, fecha_actualizacion
-                FROM rankings
-                WHERE id = %s
-            ''', (ranking_id,))
-            ranking = cur.fetchone()
-            
-            if not ranking:
-                return jsonify({'error': 'Ranking no encontrado'}), 404
-            
-            # Obtener registros del ranking ordenados por tiempo de menor a mayor
-            cur.execute('''
-                SELECT id, posicion, nombre, apellido, tiempo, categoria, 
-                       equipo, puntos, dorsal
-                FROM ranking_registros
-                WHERE ranking_id = %s
-                ORDER BY posicion ASC
-            ''', (ranking_id,))
-            registros = cur.fetchall()
-            
-            # Reordenar en Python usando la función de conversión de tiempos
-            registros = sorted(registros, key=lambda x: tiempo_a_segundos(x['tiempo']))
-            
-            # Recalcular posiciones secuenciales
-            for idx, reg in enumerate(registros, 1):
-                reg['posicion'] = idx
-            
-            ranking['registros'] = registros
-            return jsonify(ranking)
+            existentes = _registros_para_reimportar(cur, ranking_id)
+        
+        vista_previa = vista_previa_reimportacion(
+            ranking_id, existentes, nuevos, REIMPORT_CAMPOS_PDF, advertencias[:IMPORT_MAX_ADVERTENCIAS]
+        )
+        
+        log_importacion.info('Vista previa de re-importación lista',
+                             extra={'job_id': job_id, 'ranking_id': ranking_id, **vista_previa['resumen']})
+        
+        _actualizar_importacion(
+            conn, job_id, estado='completado', registros_extraidos=len(nuevos), fecha_fin=datetime.now(),
+            vista_previa=Json(vista_previa, dumps=lambda valor: json.dumps(valor, default=str))
+        )
     except Exception as e:
-        print(f"Error: {e}")
-        return jsonify({'error': str(e)}), 500
+        conn.rollback()
+        log_importacion.exception('Error en re-importación: %s', e, extra={'job_id': job_id})
+        try:
+            _actualizar_importacion(conn, job_id, estado='error', error=str(e), fecha_fin=datetime.now())
+        except Exception as e2:
+            log_importacion.error('Error guardando estado de importación: %s', e2, extra={'job_id': job_id})
     finally:
         conn.close()
 
-# Crear ranking desde PDF
-@app.route('/api/rankings/crear-desde-pdf', methods=['POST'])
+def _encolar_reimportacion_pdf(conn, ranking_id, archivo):
+    """Encola la lectura del PDF: parsearlo puede tardar más que el timeout de la petición"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT titulo FROM rankings WHERE id = %s', (ranking_id,))
+        ranking = cur.fetchone()
+        if not ranking:
+            return jsonify({'error': 'Ranking no encontrado'}), 404
+        
+        job_id = uuid.uuid4().hex
+        cur.execute('''
+            INSERT INTO importaciones_pdf (id, tipo, titulo, archivo, estado, ranking_id, creado_por)
+            VALUES (%s, 'reimportacion', %s, %s, 'en_cola', %s, %s)
+        ''', (job_id, ranking[0], archivo.filename[:255], ranking_id, get_admin_id()))
+    conn.commit()
+    
+    _executor_importaciones.submit(_procesar_reimportacion_pdf, job_id, archivo.read(), ranking_id)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Re-importación en cola',
+        'job_id': job_id,
+        'estado_url': f'/api/rankings/importaciones/{job_id}'
+    }), 202
+
+def _confirmar_reimportacion_pdf(conn, ranking_id, job_id, version):
+    """Aplica la vista previa que guardó el worker, sin volver a leer el PDF"""
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute('SELECT id FROM rankings WHERE id = %s FOR UPDATE', (ranking_id,))
+        if not cur.fetchone():
+            return jsonify({'error': 'Ranking no encontrado'}), 404
+        
+        cur.execute('''
+            SELECT estado, vista_previa FROM importaciones_pdf
+            WHERE id = %s AND tipo = 'reimportacion' AND ranking_id = %s
+            FOR UPDATE
+        ''', (job_id, ranking_id))
+        importacion = cur.fetchone()
+        if not importacion:
+            return jsonify({'error': 'Importación no encontrada'}), 404
+        if importacion['estado'] != 'completado':
+            return jsonify({'error': f"La re-importación no se puede confirmar (estado: {importacion['estado']})"}), 409
+        
+        vista_previa = importacion['vista_previa']
+        if version != vista_previa['version'] or version != _version_ranking(_registros_para_reimportar(cur, ranking_id)):
+            return jsonify({'error': 'El ranking cambió desde la vista previa (o falta su versión); genera una nueva antes de confirmar'}), 409
+        
+        cur.execute("UPDATE importaciones_pdf SET estado = 'aplicado' WHERE id = %s", (job_id,))
+    
+    return jsonify(_aplicar_reimportacion(conn, ranking_id, vista_previa))
+
+# Re-importar resultados corregidos sobre un ranking existente
+@app.route('/api/rankings/<int:ranking_id>/reimportar', methods=['POST'])
 @require_auth
-def crear_ranking_desde_pdf():
-    """Crea un ranking extrayendo datos de un PDF"""
-    titulo = request.form.get('titulo')
-    descripcion = request.form.get('descripcion')
-    carrera_id = request.form.get('carrera_id', type=int)
+def reimportar_ranking(ranking_id):
+    """Compara un archivo de resultados corregido con el ranking y devuelve la vista previa
+    de cambios; con confirmar=1 los aplica en una sola transacción.
     
-    if not titulo or 'archivo_pdf' not in request.files:
-        return jsonify({'error': 'Título y archivo PDF son requeridos'}), 400
+    Un PDF se procesa en segundo plano (202 con job_id): la vista previa queda en
+    /api/rankings/importaciones/<job_id> y se confirma con importacion=<job_id>."""
+    confirmar = request.form.get('confirmar', '').lower() in ('1', 'true', 'si', 'sí')
+    version = request.form.get('version')
+    job_id = request.form.get('importacion')
     
-    pdf_file = request.files['archivo_pdf']
+    if job_id and not confirmar:
+        return jsonify({'error': 'importacion solo se usa para confirmar'}), 400
+    if not job_id and 'archivo' not in request.files:
+        return jsonify({'error': 'El archivo es requerido'}), 400
     
-    if not pdf_file.filename.lower().endswith('.pdf'):
-        return jsonify({'error': 'Solo se aceptan archivos PDF'}), 400
+    archivo = request.files.get('archivo')
+    es_pdf = not job_id and archivo.filename.lower().endswith('.pdf')
+    if es_pdf and confirmar:
+        return jsonify({'error': 'Un PDF se confirma con el id de su importación (importacion=<job_id>)'}), 400
     
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
     
     try:
-        # Leer y procesar el PDF
-        pdf_data = pdf_file.read()
-        registros_extraidos = []
+        if job_id:
+            respuesta = _confirmar_reimportacion_pdf(conn, ranking_id, job_id, version)
+            conn.rollback()
+            return respuesta
+        if es_pdf:
+            return _encolar_reimportacion_pdf(conn, ranking_id, archivo)
+        
+        resumen = {'filas': 0, 'importados': 0, 'advertencias': []}
         
         try:
-            with pdfplumber.open(io.BytesIO(pdf_data)) as pdf:
-                print(f"📄 PDF abierto: {len(pdf.pages)} páginas")
-                
-                # Procesar todas las páginas
-                for page_num, page in enumerate(pdf.pages):
-                    print(f"\n📖 Procesando página {page_num + 1}/{len(pdf.pages)}...")
-                    
-                    # Intentar extraer tablas con diferentes estrategias
-                    tables = page.extract_tables()
-                    
-                    if tables:
-                        print(f"  ✓ Se encontraron {len(tables)} tabla(s)")
-                        
-                        for table_idx, table in enumerate(tables):
-                            print(f"    Tabla {table_idx + 1}: {len(table)} filas x {len(table[0]) if table else 0} columnas")
-                            
-                            # Identificar columnas por encabezado (primera fila)
-                            if not table or len(table) < 2:
-                                continue
-                            
-                            encabezado = [str(h).strip().lower() if h else "" for h in table[0]]
-                            print(f"      Encabezado (normalized): {encabezado}")
-                            
-                            # Buscar índices de columnas importantes
-                            idx_posicion = None
-                            idx_bib = None
-                            idx_nombre = None
-                            idx_categoria = None
-                            idx_tiempo = None
-                            
-                            for col_idx, col_nombre in enumerate(encabezado):
-                                if 'pl' in col_nombre or 'posicion' in col_nombre or 'position' in col_nombre:
-                                    idx_posicion = col_idx
-                                elif 'bib' in col_nombre or 'dorsal' in col_nombre or 'number' in col_nombre:
-                                    idx_bib = col_idx
-                                elif 'name' in col_nombre or 'nombre' in col_nombre:
-                                    idx_nombre = col_idx
-                                elif 'category' in col_nombre or 'categoria' in col_nombre or 'cat' in col_nombre:
-                                    idx_categoria = col_idx
-                                elif 'time' in col_nombre or 'tiempo' in col_nombre:
-                                    idx_tiempo = col_idx
-                            
-                            print(f"      Columnas: posicion={idx_posicion}, bib={idx_bib}, nombre={idx_nombre}, categoria={idx_categoria}, tiempo={idx_tiempo}")
-                            
-                            # Si no encontró las columnas por encabezado, usar posiciones por defecto
-                            if idx_posicion is None:
-                                idx_posicion = 0
-                            if idx_nombre is None:
-                                idx_nombre = 2
-                            
-                            # Procesar filas de datos (desde la fila 1, saltando encabezado)
-                            for row_idx in range(1, len(table)):
-                                row = table[row_idx]
-                                
-                                if not row or not any(row):
-                                    continue
-                                
-                                try:
-                                    # Extraer posición
-                                    posicion_str = str(row[idx_posicion]).strip() if idx_posicion < len(row) and row[idx_posicion] else ""
-                                    if not posicion_str or not posicion_str.isdigit():
-                                        continue
-                                    
-                                    posicion = int(posicion_str)
-                                    
-                                    # Extraer nombre
-                                    nombre_completo = str(row[idx_nombre]).strip() if idx_nombre < len(row) and row[idx_nombre] else ""
-                                    if not nombre_completo:
-                                        continue
-                                    
-                                    # Extraer dorsal/bib
-                                    bib = None
-                                    if idx_bib is not None and idx_bib < len(row) and row[idx_bib]:
-                                        bib_str = str(row[idx_bib]).strip()
-                                        if bib_str.isdigit():
-                                            bib = bib_str
-                                    
-                                    # Extraer tiempo (buscar específicamente en la columna Time)
-                                    tiempo = None
-                                    if idx_tiempo is not None and idx_tiempo < len(row) and row[idx_tiempo]:
-                                        tiempo_str = str(row[idx_tiempo]).strip()
-                                        # Validar que sea un tiempo (contenga : o ∶)
-                                        if tiempo_str and (':' in tiempo_str or '∶' in tiempo_str):
-                                            tiempo = tiempo_str
-                                    
-                                    # Extraer categoría
-                                    categoria = None
-                                    if idx_categoria is not None and idx_categoria < len(row) and row[idx_categoria]:
-                                        categoria = str(row[idx_categoria]).strip()
-                                    
-                                    # Separar nombre y apellido
-                                    nombre_parts = nombre_completo.split()
-                                    primer_nombre = nombre_parts[0] if nombre_parts else ""
-                                    apellido = ' '.join(nombre_parts[1:]) if len(nombre_parts) > 1 else ""
-                                    
-                                    if posicion and primer_nombre:
-                                        registros_extraidos.append({
-                                            'posicion': posicion,
-                                            'nombre': primer_nombre,
-                                            'apellido': apellido,
-                                            'tiempo': tiempo,
-                                            'categoria': categoria,
-                                            'equipo': None,
-                                            'dorsal': bib,
-                                            'puntos': None
-                                        })
-                                        print(f"      ✓ {posicion}. {primer_nombre} {apellido} ({categoria}) - {tiempo}")
-                                    
-                                except (ValueError, IndexError, AttributeError) as e:
-                                    print(f"      ⚠️  Error en fila {row_idx}: {e}")
-                                    continue
-                    else:
-                        print(f"  ⚠️  No se encontraron tablas, intentando extraer texto...")
-                        text = page.extract_text()
-                        if text:
-                            print(f"  Texto: {text[:200]}...")
-        
-        except Exception as pdf_error:
-            print(f"❌ Error procesando PDF: {pdf_error}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': f'Error al procesar PDF: {str(pdf_error)}'}), 400
-        
-        # Si no se extrajeron registros de tablas, intentar parsear de texto
-        if not registros_extraidos:
-            print(f"\n⚠️  No se encontraron registros en tablas, intentando parsear texto...")
-            
-            with pdfplumber.open(io.BytesIO(pdf_data)) as pdf:
-                texto_completo = ""
-                for page in pdf.pages:
-                    texto_completo += page.extract_text() + "\n"
-            
-            # Parsear líneas de texto
-            lineas = texto_completo.split('\n')
-            
-            for linea in lineas:
-                if not linea.strip():
-                    continue
-                
-                # Saltar encabezados
-                if 'Pl' in linea and 'Bib' in linea:
-                    print(f"  Encabezado detectado: {linea[:50]}")
-                    continue
-                
-                try:
-                    # Dividir por espacios múltiples
-                    partes = linea.strip().split()
-                    
-                    if len(partes) < 3:
-                        continue
-                    
-                    # Intentar parsear posición (debe ser número)
-                    if not partes[0].isdigit():
-                        continue
-                    
-                    posicion = int(partes[0])
-                    
-                    # Estructura esperada: [Posición, Dorsal, Nombre(s)..., Categoría, Tiempo]
-                    # Buscar dorsal (2do elemento, debe ser número)
-                    dorsal = None
-                    nombre_start = 1
-                    
-                    if len(partes) > 1 and partes[1].isdigit():
-                        dorsal = partes[1]
-                        nombre_start = 2
-                    else:
-                        nombre_start = 1
-                    
-                    # Buscar categoría y tiempo desde el final
-                    categoria = None
-                    tiempo = None
-                    nombre_end = len(partes)
-                    
-                    for idx in range(len(partes) - 1, nombre_start - 1, -1):
-                        parte = partes[idx]
-                        
-                        # Buscar tiempo (contiene ":" o "∶" - HH:MM:SS o MM:SS.S)
-                        # Validar que tenga formato de tiempo
-                        if (':' in parte or '∶' in parte) and not tiempo:
-                            # Debe tener dígitos alrededor de los dos puntos
-                            if any(c.isdigit() for c in parte):
-                                tiempo = parte
-                                nombre_end = idx
-                                continue
-                        
-                        # Buscar categoría (M/F seguido de números, o Juvenil)
-                        if not categoria:
-                            if (parte.startswith('M') or parte.startswith('F')) and any(c.isdigit() for c in parte):
-                                categoria = parte
-                                nombre_end = idx
-                                continue
-                            
-                            if 'Juvenil' in parte or 'Senior' in parte or 'Master' in parte or 'y Más' in parte:
-                                categoria = parte
-                                nombre_end = idx
-                                continue
-                        if 'Juvenil' in parte or 'Senior' in parte or 'Master' in parte:
-                            categoria = parte
-                            nombre_end = idx
-                            continue
-                    
-                    # Extraer nombre (entre inicio y fin)
-                    nombre_partes = partes[nombre_start:nombre_end]
-                    nombre_completo = ' '.join(nombre_partes)
-                    
-                    if not nombre_completo or not nombre_completo.strip():
-                        continue
-                    
-                    # Limpiar nombres que contienen caracteres especiales o números
-                    if any(c.isdigit() for c in nombre_completo):
-                        continue
-                    
-                    # Separar nombre y apellido
-                    nombre_split = nombre_completo.split()
-                    primer_nombre = nombre_split[0] if nombre_split else ""
-                    apellido = ' '.join(nombre_split[1:]) if len(nombre_split) > 1 else ""
-                    
-                    if posicion and primer_nombre and len(primer_nombre) > 1:
-                        registros_extraidos.append({
-                            'posicion': posicion,
-                            'nombre': primer_nombre,
-                            'apellido': apellido,
-                            'tiempo': tiempo,
-                            'categoria': categoria,
-                            'equipo': None,
-                            'dorsal': dorsal,
-                            'puntos': None
-                        })
-                        print(f"  ✓ {posicion}. {primer_nombre} {apellido} ({categoria}) - {tiempo}")
-                
-                except Exception as e:
-                    print(f"  ⚠️  Error en línea: {linea[:60]} - {e}")
-                    continue
+            _, indices, registros = leer_archivo_resultados(archivo, _mapeo_desde_form(), resumen)
+            nuevos = list(registros)
+            # Solo se comparan las columnas que trae el archivo (sin apellido, se separa del nombre)
+            campos = [c for c in REIMPORT_CAMPOS if c in indices or (c == 'apellido' and 'nombre' in indices)]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        if not registros_extraidos:
-            print(f"\n❌ No se pudo extraer datos del PDF")
+        if not nuevos:
             return jsonify({
-                'error': 'No se pudo extraer datos del PDF. Asegúrate de que contenga una tabla con los resultados.'
+                'error': 'No se encontraron filas válidas en el archivo',
+                'advertencias': resumen['advertencias']
             }), 400
         
-        print(f"\n✓ Total de registros extraídos: {len(registros_extraidos)}")
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Bloquear el ranking para que dos re-importaciones no se crucen
+            cur.execute('SELECT id FROM rankings WHERE id = %s FOR UPDATE', (ranking_id,))
+            if not cur.fetchone():
+                return jsonify({'error': 'Ranking no encontrado'}), 404
+            
+            existentes = _registros_para_reimportar(cur, ranking_id)
         
-        # Insertar ranking y registros en BD
-        admin_id = get_admin_id()
+        respuesta = vista_previa_reimportacion(ranking_id, existentes, nuevos, campos, resumen['advertencias'])
         
-        with conn.cursor() as cur:
-            # Crear ranking
-            cur.execute('''
-                INSERT INTO rankings (titulo, descripcion, carrera_id, estado, creado_por)
-                VALUES (%s, %s, %s, 'activo', %s)
-                RETURNING id
-            ''', (titulo, descripcion, carrera_id, admin_id))
-            
-            ranking_id = cur.fetchone()[0]
-            
-            # Insertar registros
-            for reg in registros_extraidos:
-                cur.execute('''
-                    INSERT INTO ranking_registros 
-                    (ranking_id, posicion, nombre, apellido, tiempo, categoria, equipo, dorsal, puntos)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ''', (
-                    ranking_id,
-                    reg['posicion'],
-                    reg['nombre'],
-                    reg['apellido'],
-                    reg['tiempo'],
-                    reg['categoria'],
-                    reg['equipo'],
-                    reg.get('dorsal'),
-                    reg['puntos']
-                ))
-            
-            conn.commit()
+        if not confirmar:
+            conn.rollback()
+            return jsonify(respuesta)
         
-        # Recalcular posiciones basándose en tiempos
-        recalcular_posiciones_ranking(conn, ranking_id)
+        # Sin versión no hay forma de saber sobre qué vista previa se confirma
+        if version != respuesta['version']:
+            conn.rollback()
+            return jsonify({'error': 'El ranking cambió desde la vista previa (o falta su versión); genera una nueva antes de confirmar'}), 409
         
-        return jsonify({
-            'success': True,
-            'message': f'Ranking creado exitosamente con {len(registros_extraidos)} registros',
-            'ranking_id': ranking_id,
-            'registros_count': len(registros_extraidos)
-        })
+        # Cambios y una sola recalculación de posiciones, en la misma transacción
+        return jsonify(_aplicar_reimportacion(conn, ranking_id, respuesta))
     
     except Exception as e:
         conn.rollback()
-        print(f"Error creando ranking desde PDF: {e}")
+        log_importacion.error('Error re-importando ranking: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -1936,36 +3816,7 @@ def crear_ranking():
     
     try:
         admin_id = get_admin_id()
-        
-        with conn.cursor() as cur:
-            # Crear ranking
-            cur.execute('''
-                INSERT INTO rankings (titulo, descripcion, carrera_id, estado, creado_por)
-                VALUES (%s, %s, %s, 'activo', %s)
-                RETURNING id
-            ''', (titulo, descripcion, carrera_id, admin_id))
-            
-            ranking_id = cur.fetchone()[0]
-            
-            # Insertar registros
-            for reg in registros:
-                cur.execute('''
-                    INSERT INTO ranking_registros 
-                    (ranking_id, posicion, nombre, apellido, tiempo, categoria, equipo, puntos, dorsal)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ''', (
-                    ranking_id,
-                    reg.get('posicion'),
-                    reg.get('nombre'),
-                    reg.get('apellido'),
-                    reg.get('tiempo'),
-                    reg.get('categoria'),
-                    reg.get('equipo'),
-                    reg.get('puntos'),
-                    reg.get('dorsal')
-                ))
-            
-            conn.commit()
+        ranking_id = insertar_ranking(conn, titulo, descripcion, carrera_id, admin_id, registros)
         
         # Recalcular posiciones basándose en tiempos
         recalcular_posiciones_ranking(conn, ranking_id)
@@ -1979,7 +3830,7 @@ def crear_ranking():
     
     except Exception as e:
         conn.rollback()
-        print(f"Error creando ranking: {e}")
+        log.error('Error creando ranking: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -2027,7 +3878,8 @@ def editar_registro_ranking(ranking_id, registro_id):
             conn.commit()
         
         # Recalcular posiciones basándose en tiempos
-        recalcular_posiciones_ranking(conn, ranking_id)
+        posiciones = recalcular_posiciones_ranking(conn, ranking_id)
+        notificar_cambio_ranking(conn, ranking_id, 'editado', posiciones, registro_id=registro_id)
         
         return jsonify({
             'success': True,
@@ -2036,7 +3888,7 @@ def editar_registro_ranking(ranking_id, registro_id):
     
     except Exception as e:
         conn.rollback()
-        print(f"Error editando registro: {e}")
+        log.error('Error editando registro: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -2070,7 +3922,8 @@ def eliminar_registro_ranking(ranking_id, registro_id):
             conn.commit()
         
         # Recalcular posiciones basándose en tiempos
-        recalcular_posiciones_ranking(conn, ranking_id)
+        posiciones = recalcular_posiciones_ranking(conn, ranking_id)
+        notificar_cambio_ranking(conn, ranking_id, 'eliminado', posiciones, eliminado_id=registro_id)
         
         return jsonify({
             'success': True,
@@ -2079,7 +3932,7 @@ def eliminar_registro_ranking(ranking_id, registro_id):
     
     except Exception as e:
         conn.rollback()
-        print(f"Error eliminando registro: {e}")
+        log.error('Error eliminando registro: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -2131,7 +3984,8 @@ def agregar_registro_ranking(ranking_id):
             conn.commit()
         
         # Recalcular posiciones basándose en tiempos
-        recalcular_posiciones_ranking(conn, ranking_id)
+        posiciones = recalcular_posiciones_ranking(conn, ranking_id)
+        notificar_cambio_ranking(conn, ranking_id, 'agregado', posiciones, registro_id=registro_id)
         
         return jsonify({
             'success': True,
@@ -2141,7 +3995,7 @@ def agregar_registro_ranking(ranking_id):
     
     except Exception as e:
         conn.rollback()
-        print(f"Error agregando registro: {e}")
+        log.error('Error agregando registro: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -2166,6 +4020,8 @@ def eliminar_ranking(ranking_id):
             cur.execute('DELETE FROM rankings WHERE id = %s', (ranking_id,))
             conn.commit()
         
+        cache_publico.invalidar('rankings')
+        
         return jsonify({
             'success': True,
             'message': 'Ranking eliminado exitosamente'
@@ -2173,7 +4029,7 @@ def eliminar_ranking(ranking_id):
     
     except Exception as e:
         conn.rollback()
-        print(f"Error eliminando ranking: {e}")
+        log.error('Error eliminando ranking: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
@@ -2210,6 +4066,8 @@ def editar_ranking(ranking_id):
             
             conn.commit()
         
+        cache_publico.invalidar('rankings')
+        
         return jsonify({
             'success': True,
             'message': 'Ranking actualizado exitosamente'
@@ -2217,13 +4075,23 @@ def editar_ranking(ranking_id):
     
     except Exception as e:
         conn.rollback()
-        print(f"Error editando ranking: {e}")
+        log.error('Error editando ranking: %s', e)
         return jsonify({'error': str(e)}), 500
     finally:
         conn.close()
 
-# Inicializar base de datos al importar el módulo (para gunicorn)
-init_db()
+# Comprobar la versión del esquema al importar el módulo (para gunicorn)
+verificar_esquema()
+marcar_importaciones_huerfanas()
+
+if os.getenv('PRECARGAR_DEPENDENCIAS') == '1':
+    precargar_dependencias()
+
+# Tiempo de arranque en frío del worker (incluye imports y la verificación del esquema)
+log.info('Aplicación cargada', extra={
+    'carga_ms': round((time.perf_counter() - INICIO_CARGA) * 1000),
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024 if resource else None,
+})
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,91 @@
+"""Mide el arranque en frío de un worker: tiempo de importar app.py, RSS y los imports más caros.
+
+Uso:
+    python backend/benchmarks/bench_arranque.py [--repeticiones 5] [--top 15] [--salida arranque.json]
+
+Cada corrida importa app en un proceso nuevo (como un worker de gunicorn recién
+levantado, con una base de datos inexistente para no tocar la real) usando
+python -X importtime. Compara el arranque con las dependencias diferidas y con
+PRECARGAR_DEPENDENCIAS=1, y lista los paquetes de primer nivel que más tardan en
+importarse. Con --salida guarda el resultado para comparar entre versiones.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Se ejecuta en el proceso hijo; los logs de app también van a stdout, por eso la
+# línea con las medidas lleva una marca
+MARCA = 'ARRANQUE'
+CODIGO = f'''
+import resource, sys, time
+inicio = time.perf_counter()
+import app
+print({MARCA!r}, round((time.perf_counter() - inicio) * 1000, 1),
+      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024, len(sys.modules), flush=True)
+'''
+
+# "import time:      self [us] |  cumulative | imported package"
+_LINEA_IMPORTTIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def corrida(precargar):
+    """Un arranque en frío: (ms importando app, RSS MB, módulos cargados, {paquete: ms})"""
+    entorno = dict(os.environ, DATABASE_URL='postgresql://localhost:1/benchmark',
+                   LOG_NIVEL='ERROR', PRECARGAR_DEPENDENCIAS='1' if precargar else '0')
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', CODIGO], cwd=BACKEND,
+                             env=entorno, capture_output=True, text=True, check=True)
+    medidas = next(linea for linea in proceso.stdout.splitlines() if linea.startswith(MARCA))
+    ms, rss, modulos = medidas.split()[1:]
+
+    # importtime escribe cada módulo después de sus dependencias: las de sangría 3
+    # que preceden a la línea de app (sangría 1) son las que importa app.py
+    paquetes = {}
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA_IMPORTTIME.match(linea)
+        if not coincidencia:
+            continue
+        sangria, nombre = len(coincidencia.group(3)), coincidencia.group(4)
+        if sangria == 3:
+            paquetes[nombre] = int(coincidencia.group(2)) / 1000
+        elif sangria == 1 and nombre == 'app':
+            break
+        elif sangria == 1:
+            paquetes = {}
+    return float(ms), int(rss), int(modulos), paquetes
+
+
+def medir(precargar, repeticiones):
+    """La corrida más rápida de varias, para descontar el ruido del disco y del sistema"""
+    return min((corrida(precargar) for _ in range(repeticiones)), key=lambda r: r[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--salida', help='Guardar el resultado en JSON')
+    args = parser.parse_args()
+
+    resultado = {}
+    for etiqueta, precargar in [('diferido', False), ('precargado', True)]:
+        ms, rss, modulos, paquetes = medir(precargar, args.repeticiones)
+        resultado[etiqueta] = {'import_ms': ms, 'rss_mb': rss, 'modulos': modulos, 'paquetes': paquetes}
+        print(f"{etiqueta:<12} import app {ms:>8.1f} ms   RSS {rss:>4} MB   {modulos} módulos")
+        if not precargar:
+            print(f"\n  Imports de app.py más caros (acumulado, {etiqueta}):")
+            for nombre, tiempo in sorted(paquetes.items(), key=lambda p: -p[1])[:args.top]:
+                print(f"    {nombre:<32} {tiempo:>8.1f} ms")
+            print()
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
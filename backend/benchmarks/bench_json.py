@@ -0,0 +1,110 @@
+"""Micro-benchmark de las respuestas JSON grandes: serialización y compresión.
+
+Uso:
+    python backend/benchmarks/bench_json.py [--inscritos 3000] [--registros 5000] [--repeticiones 5]
+
+Arma respuestas con la forma de /api/registros-inscritos y /api/rankings/<id>
+(fechas, Decimal, textos con acentos) y compara el proveedor JSON por defecto de
+Flask con ProveedorJSONRapido (orjson), y el tamaño sin comprimir, con gzip y
+con brotli (los niveles que usa comprimir_respuesta).
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Importar app sin tocar la base de datos real
+os.environ['DATABASE_URL'] = 'postgresql://localhost:1/benchmark'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Lucía', 'Andrés', 'Sofía', 'Óscar']
+APELLIDOS = ['Pérez', 'Gómez', 'Núñez', 'Peña', 'Martínez', 'Castillo']
+
+
+def inscritos(rnd, n):
+    """Filas como las de /api/registros-inscritos"""
+    inicio = datetime(2025, 11, 1, 8, 0)
+    return [{
+        'id': i,
+        'nombre': rnd.choice(NOMBRES),
+        'apellido': rnd.choice(APELLIDOS),
+        'edad': rnd.randint(16, 70),
+        'genero': rnd.choice(['Masculino', 'Femenino']),
+        'correo': f'corredor{i}@correo.com',
+        'team': rnd.choice(['VO2Max', 'Club Andino', None]),
+        'categoria': rnd.choice(['Libre', 'Master A', 'Master B', 'Juvenil']),
+        'codigo_registro': f'REG-{i:08X}',
+        'dorsal': i,
+        'dorsal_formatted': str(i).zfill(3),
+        'dorsal_entregado': rnd.random() < 0.5,
+        'asistio': rnd.random() < 0.3,
+        'fecha_entrega_dorsal': inicio + timedelta(minutes=i) if rnd.random() < 0.5 else None,
+        'fecha_creacion': inicio - timedelta(hours=i),
+    } for i in range(1, n + 1)]
+
+
+def ranking(rnd, n):
+    """Respuesta como la de /api/rankings/<id>"""
+    return {
+        'id': 1,
+        'titulo': 'Carrera del Grinch 10K',
+        'fecha_actualizacion': datetime(2025, 12, 21, 12, 0),
+        'registros': [{
+            'id': i,
+            'posicion': i,
+            'nombre': rnd.choice(NOMBRES),
+            'apellido': rnd.choice(APELLIDOS),
+            'tiempo': app.formatear_tiempo(1500 + i * 3),
+            'categoria': rnd.choice(['Libre', 'Master A', 'Master B']),
+            'equipo': rnd.choice(['VO2Max', '', None]),
+            'puntos': Decimal(rnd.randint(0, 1000)) / 10,
+            'dorsal': i,
+        } for i in range(1, n + 1)]
+    }
+
+
+def medir(nombre, datos, repeticiones):
+    proveedores = [('Flask (json)', DefaultJSONProvider(app.app))]
+    if app.orjson is not None:
+        proveedores.append(('orjson', app.ProveedorJSONRapido(app.app)))
+
+    with app.app.app_context():
+        for etiqueta, proveedor in proveedores:
+            segundos = min(timeit.repeat(lambda: proveedor.response(datos).get_data(),
+                                         number=1, repeat=repeticiones))
+            print(f"{nombre:<22} {etiqueta:<14} {segundos * 1000:>8.1f} ms")
+        cuerpo = proveedores[-1][1].response(datos).get_data()
+
+    tamanos = [('sin comprimir', len(cuerpo), 0.0)]
+    inicio = timeit.default_timer()
+    tamano = len(gzip.compress(cuerpo, compresslevel=app.GZIP_NIVEL, mtime=0))
+    tamanos.append((f'gzip -{app.GZIP_NIVEL}', tamano, timeit.default_timer() - inicio))
+    if app.brotli is not None:
+        inicio = timeit.default_timer()
+        tamano = len(app.brotli.compress(cuerpo, quality=app.BROTLI_CALIDAD))
+        tamanos.append((f'brotli q{app.BROTLI_CALIDAD}', tamano, timeit.default_timer() - inicio))
+    for etiqueta, tamano, segundos in tamanos:
+        print(f"{nombre:<22} {etiqueta:<14} {tamano / 1024:>8.1f} KB  {segundos * 1000:>6.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--inscritos', type=int, default=3000)
+    parser.add_argument('--registros', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    rnd = random.Random(41)
+    medir(f'inscritos ({args.inscritos})', inscritos(rnd, args.inscritos), args.repeticiones)
+    medir(f'ranking ({args.registros})', ranking(rnd, args.registros), args.repeticiones)
+
+
+if __name__ == '__main__':
+    main()
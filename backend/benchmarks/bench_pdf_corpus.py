@@ -0,0 +1,164 @@
+"""Mide exactitud, tiempo y memoria del parser de PDFs sobre el corpus de referencia.
+
+Uso:
+    python backend/benchmarks/bench_pdf_corpus.py [documento ...] [--salida resultados.json]
+                                                  [--base anterior.json] [--tolerancia 0.25]
+
+Cada PDF de backend/benchmarks/corpus/ se procesa con extraer_registros_pdf (la
+misma función que usa la importación de /api/rankings/crear-desde-pdf) en un
+proceso nuevo, para que el pico de memoria de un documento no arrastre el del
+anterior. Las filas extraídas se comparan con el .json golden del documento,
+emparejando por posición.
+
+Con --base compara contra una corrida anterior guardada con --salida y termina
+con código 1 si algún documento pierde exactitud o tarda más que la tolerancia.
+Los PDFs se regeneran con generar_corpus.py.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pdf_resultados  # noqa: E402
+from bench_pdf_paralelo import silenciar_stdout  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+# ru_maxrss está en KB en Linux y en bytes en macOS
+RSS_A_MB = 1 / 1024 if sys.platform != 'darwin' else 1 / (1024 * 1024)
+
+
+def _medir_documento(ruta, procesos):
+    """Se ejecuta en un proceso nuevo: extrae el PDF y mide tiempo y memoria"""
+    with open(ruta, 'rb') as f:
+        pdf_data = f.read()
+
+    rss_base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_A_MB
+    with silenciar_stdout():
+        inicio = time.perf_counter()
+        registros = pdf_resultados.extraer_registros_pdf(pdf_data, procesos=procesos)
+        segundos = time.perf_counter() - inicio
+    rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_A_MB
+
+    return registros, segundos, rss_base, rss_pico
+
+
+def _normalizar(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def evaluar(registros, golden):
+    """Compara las filas extraídas con el golden (por posición) campo a campo"""
+    campos = golden['campos']
+    esperados = {r['posicion']: r for r in golden['registros']}
+
+    extraidos = {}
+    duplicados = 0
+    for registro in registros:
+        if registro['posicion'] in extraidos:
+            duplicados += 1
+        else:
+            extraidos[registro['posicion']] = registro
+
+    aciertos = {campo: 0 for campo in campos}
+    filas_exactas = 0
+    for posicion, esperado in esperados.items():
+        extraido = extraidos.get(posicion)
+        if extraido is None:
+            continue
+        iguales = [campo for campo in campos if _normalizar(extraido.get(campo)) == _normalizar(esperado[campo])]
+        for campo in iguales:
+            aciertos[campo] += 1
+        if len(iguales) == len(campos):
+            filas_exactas += 1
+
+    total = len(esperados)
+    return {
+        'filas': len(registros),
+        'esperadas': total,
+        'faltantes': sum(1 for posicion in esperados if posicion not in extraidos),
+        'sobrantes': sum(1 for posicion in extraidos if posicion not in esperados) + duplicados,
+        'exactitud': filas_exactas / total if total else 1.0,
+        'exactitud_campos': {campo: aciertos[campo] / total if total else 1.0 for campo in campos},
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """Devuelve las regresiones frente a una corrida anterior"""
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        if actual['exactitud'] < anterior['exactitud'] - 1e-9:
+            regresiones.append(f"{nombre}: exactitud {anterior['exactitud']:.1%} -> {actual['exactitud']:.1%}")
+        if actual['segundos'] > anterior['segundos'] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: tiempo {anterior['segundos']:.2f}s -> {actual['segundos']:.2f}s")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('documentos', nargs='*', help='Nombres de documentos del corpus (por defecto, todos)')
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--procesos', type=int, default=1,
+                        help='Procesos del parser (1 = en serie; la memoria solo cuenta el proceso principal)')
+    parser.add_argument('--salida', help='Guardar los resultados en JSON')
+    parser.add_argument('--base', help='Resultados JSON de una corrida anterior para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help='Aumento de tiempo tolerado frente a --base (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    rutas = sorted(glob.glob(os.path.join(args.corpus, '*.pdf')))
+    if args.documentos:
+        rutas = [r for r in rutas if os.path.splitext(os.path.basename(r))[0] in args.documentos]
+    if not rutas:
+        sys.exit(f"No hay PDFs en {args.corpus}; genera el corpus con generar_corpus.py")
+
+    print(f"{'documento':<26} {'filas':>6} {'esper.':>6} {'exact.':>7} {'peor campo':>20} "
+          f"{'tiempo':>8} {'RSS pico':>9} {'(+base)':>8}")
+
+    resultados = {}
+    contexto = multiprocessing.get_context('spawn')
+    for ruta in rutas:
+        nombre = os.path.splitext(os.path.basename(ruta))[0]
+        with open(ruta[:-4] + '.json', encoding='utf-8') as f:
+            golden = json.load(f)
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+            registros, segundos, rss_base, rss_pico = executor.submit(
+                _medir_documento, ruta, args.procesos
+            ).result()
+
+        metricas = evaluar(registros, golden)
+        metricas.update(segundos=segundos, rss_pico_mb=rss_pico, rss_extraccion_mb=rss_pico - rss_base)
+        resultados[nombre] = metricas
+
+        peor = min(metricas['exactitud_campos'].items(), key=lambda par: par[1])
+        print(f"{nombre[:26]:<26} {metricas['filas']:>6} {metricas['esperadas']:>6} "
+              f"{metricas['exactitud']:>7.1%} {f'{peor[0]} {peor[1]:.1%}':>20} "
+              f"{segundos:>7.2f}s {rss_pico:>7.0f}MB {rss_pico - rss_base:>+6.0f}MB")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print('\nRegresiones:')
+            for regresion in regresiones:
+                print(f"  ✗ {regresion}")
+            sys.exit(1)
+        print('\n✓ Sin regresiones frente a la base')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Mide el parseo de PDFs de resultados en serie vs en el pool de procesos.
+
+Uso:
+    python backend/benchmarks/bench_pdf_paralelo.py resultados1.pdf [resultados2.pdf ...] [--procesos 4]
+
+Para cada PDF compara extraer_registros_pdf con un solo proceso y con el pool,
+verifica que ambos devuelven las mismas filas en el mismo orden y reporta el
+speedup.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pdf_resultados  # noqa: E402
+
+
+@contextlib.contextmanager
+def silenciar_stdout():
+    """Silencia la salida del parser (logs incluidos), también la de los procesos hijos"""
+    sys.stdout.flush()
+    original = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(original, 1)
+            os.close(original)
+
+
+def medir(pdf_data, procesos):
+    with silenciar_stdout():
+        inicio = time.perf_counter()
+        registros = pdf_resultados.extraer_registros_pdf(pdf_data, procesos=procesos)
+        return time.perf_counter() - inicio, registros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pdfs', nargs='+')
+    parser.add_argument('--procesos', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    print(f"{'PDF':<40} {'filas':>6} {'serie':>9} {'pool':>9} {'speedup':>8}")
+    for ruta in args.pdfs:
+        with open(ruta, 'rb') as f:
+            pdf_data = f.read()
+
+        serie, registros_serie = medir(pdf_data, 1)
+        pool, registros_pool = medir(pdf_data, args.procesos)
+        assert registros_serie == registros_pool, f"{ruta}: el pool no devuelve las mismas filas"
+
+        print(f"{os.path.basename(ruta)[:40]:<40} {len(registros_serie):>6} "
+              f"{serie:>8.2f}s {pool:>8.2f}s {serie / pool:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
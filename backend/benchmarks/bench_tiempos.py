@@ -0,0 +1,109 @@
+"""Micro-benchmark del parser de tiempos (tiempo_a_segundos).
+
+Uso:
+    python backend/benchmarks/bench_tiempos.py [--filas 5000] [--repeticiones 5]
+
+Compara la implementación anterior (replace + split + try/except por fila) con
+el parser actual en frío y con la caché LRU caliente. El parseo en sí cuesta lo
+mismo que antes; la ganancia viene de la caché, porque los tiempos se repiten
+entre recálculos del mismo ranking.
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+# Importar app sin tocar la base de datos real
+os.environ['DATABASE_URL'] = 'postgresql://localhost:1/benchmark'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app  # noqa: E402
+
+
+def tiempo_a_segundos_anterior(tiempo_str):
+    """Implementación original, conservada solo como referencia"""
+    if not tiempo_str:
+        return float('inf')
+    tiempo_str = str(tiempo_str).strip()
+    try:
+        tiempo_str = tiempo_str.replace('s', '').replace('m', '').replace('h', '')
+        tiempo_str = tiempo_str.replace('∶', ':').replace(':', ':')
+        partes = tiempo_str.split(':')
+        partes = [p.strip() for p in partes if p.strip()]
+        if len(partes) == 3:
+            return int(partes[0]) * 3600 + int(partes[1]) * 60 + float(partes[2])
+        elif len(partes) == 2:
+            return int(partes[0]) * 60 + float(partes[1])
+        elif len(partes) == 1:
+            valor = float(partes[0])
+            return valor if valor < 3600 else valor * 60
+        else:
+            return float('inf')
+    except Exception:
+        return float('inf')
+
+
+def generar_columna(filas, semilla=42):
+    """Genera una columna de tiempos como la que llega de ranking_registros"""
+    rnd = random.Random(semilla)
+    columna = []
+    for _ in range(filas):
+        segundos = rnd.uniform(900, 7200)
+        h, resto = divmod(segundos, 3600)
+        m, s = divmod(resto, 60)
+        formato = rnd.random()
+        if formato < 0.5:
+            columna.append(f"{int(h):02d}:{int(m):02d}:{int(s):02d}")
+        elif formato < 0.7:
+            columna.append(f"{int(h)}:{int(m):02d}:{s:05.2f}")
+        elif formato < 0.8:
+            columna.append(f"{int(h * 60 + m)}∶{int(s):02d}")
+        elif formato < 0.9:
+            columna.append(f"{int(h):02d}:{int(m):02d}:{int(s):02d} / {int(h):02d}:{int(m):02d}:{int(s) + 5:02d}")
+        elif formato < 0.95:
+            columna.append(None)
+        else:
+            columna.append('DNF')
+    return columna
+
+
+def medir(nombre, funcion, repeticiones, filas):
+    mejor = min(timeit.repeat(funcion, number=1, repeat=repeticiones))
+    print(f"{nombre:<38} {mejor * 1000:9.2f} ms   {mejor * 1e9 / filas:8.0f} ns/fila")
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filas', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    columna = generar_columna(args.filas)
+
+    # Verificar que ambos parsers coinciden en los formatos que ya soportaba el anterior
+    for valor in columna:
+        if valor and '/' not in valor:
+            nuevo, anterior = app.tiempo_a_segundos(valor), tiempo_a_segundos_anterior(valor)
+            assert nuevo == anterior or abs(nuevo - anterior) < 1e-6, valor
+
+    print(f"Columna de {args.filas} tiempos, mejor de {args.repeticiones} repeticiones\n")
+
+    base = medir('anterior (por fila)', lambda: [tiempo_a_segundos_anterior(t) for t in columna],
+                 args.repeticiones, args.filas)
+
+    def en_frio():
+        app._parsear_tiempo.cache_clear()
+        return [app.tiempo_a_segundos(t) for t in columna]
+
+    frio = medir('actual, caché vacía (por fila)', en_frio, args.repeticiones, args.filas)
+    caliente = medir('actual, caché caliente (por fila)', lambda: [app.tiempo_a_segundos(t) for t in columna],
+                     args.repeticiones, args.filas)
+
+    print(f"\nSpeedup vs anterior: frío {base / frio:.1f}x, caliente {base / caliente:.1f}x")
+    print(f"Caché: {app._parsear_tiempo.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
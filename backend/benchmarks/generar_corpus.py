@@ -0,0 +1,203 @@
+"""Genera el corpus sintético de PDFs de resultados y sus archivos golden.
+
+Uso:
+    python backend/benchmarks/generar_corpus.py [--destino backend/benchmarks/corpus]
+
+Necesita reportlab (solo para regenerar el corpus; el benchmark usa los PDFs ya
+generados). Los nombres, dorsales y tiempos salen de un generador aleatorio con
+semilla fija, así que el corpus es reproducible y no contiene datos reales.
+Cada PDF va acompañado de un .json con las filas que muestra (la verdad de
+referencia con la que bench_pdf_corpus.py mide la exactitud).
+"""
+import argparse
+import json
+import os
+import random
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfgen import canvas
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Table, TableStyle
+
+rl_config.invariant = 1  # Sin fecha ni id aleatorio: regenerar da los mismos bytes
+
+DESTINO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Pedro', 'Lucía', 'Jorge', 'Elena', 'Raúl',
+           'Sofía', 'Andrés', 'Valeria', 'Miguel', 'Daniela', 'Óscar']
+APELLIDOS = ['Pérez', 'Gómez', 'Rodríguez', 'Sánchez', 'Martínez', 'Castillo', 'Jurado', 'Núñez',
+             'Ortiz', 'Peña', 'Ramírez', 'Villalobos']
+CATEGORIAS = ['M20-29', 'F20-29', 'M30-39', 'F30-39', 'M40-49', 'F40-49', 'Juvenil']
+EQUIPOS = ['VO2Max', 'Club Andino', 'Runners Caracas', 'Trote Libre', '']
+
+ESTILO_GRILLA = TableStyle([
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+])
+
+
+def formato_tiempo(segundos):
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def resultados(rnd, n):
+    """Filas de una carrera ordenadas por tiempo"""
+    filas = []
+    segundos = 1150
+    dorsales = rnd.sample(range(1, 4000), n)
+    for posicion in range(1, n + 1):
+        segundos += rnd.randint(2, 35)
+        filas.append({
+            'posicion': posicion,
+            'dorsal': str(dorsales[posicion - 1]),
+            'nombre': rnd.choice(NOMBRES),
+            'apellido': f"{rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+            'categoria': rnd.choice(CATEGORIAS),
+            'equipo': rnd.choice(EQUIPOS),
+            'tiempo': formato_tiempo(segundos),
+            'segundos': segundos,
+            'segundos_gun': segundos + rnd.randint(3, 40),
+        })
+    return filas
+
+
+def guardar_golden(ruta_pdf, descripcion, filas, campos):
+    # Un registro por línea: los cambios en el golden se revisan bien en un diff
+    registros = ',\n  '.join(
+        json.dumps({campo: fila[campo] for campo in ['posicion'] + campos}, ensure_ascii=False)
+        for fila in filas
+    )
+    with open(ruta_pdf[:-4] + '.json', 'w', encoding='utf-8') as f:
+        f.write(f'{{"descripcion": {json.dumps(descripcion, ensure_ascii=False)},\n'
+                f' "campos": {json.dumps(campos)},\n'
+                f' "registros": [\n  {registros}\n ]}}\n')
+
+
+def tabla_simple(destino, rnd):
+    """Una página, una tabla con grilla y encabezado Pl/Bib/Name/Category/Time"""
+    filas = resultados(rnd, 45)
+    ruta = os.path.join(destino, 'tabla_simple.pdf')
+    tabla = Table([['Pl', 'Bib', 'Name', 'Category', 'Time']] + [
+        [f['posicion'], f['dorsal'], f"{f['nombre']} {f['apellido']}", f['categoria'], f['tiempo']]
+        for f in filas
+    ])
+    tabla.setStyle(ESTILO_GRILLA)
+    SimpleDocTemplate(ruta, pagesize=letter).build([tabla])
+    guardar_golden(ruta, 'Una tabla con grilla en una página', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+def tabla_multiple(destino, rnd):
+    """Varias tablas por página (una por categoría), con título entre tablas"""
+    filas = resultados(rnd, 120)
+    ruta = os.path.join(destino, 'tabla_multiple.pdf')
+    estilos = getSampleStyleSheet()
+    elementos = []
+    for categoria in CATEGORIAS:
+        de_categoria = [f for f in filas if f['categoria'] == categoria]
+        tabla = Table([['Pos', 'Dorsal', 'Nombre', 'Categoría', 'Tiempo']] + [
+            [f['posicion'], f['dorsal'], f"{f['nombre']} {f['apellido']}", f['categoria'], f['tiempo']]
+            for f in de_categoria
+        ])
+        tabla.setStyle(ESTILO_GRILLA)
+        elementos += [Paragraph(f'Categoría {categoria}', estilos['Heading3']), tabla]
+    SimpleDocTemplate(ruta, pagesize=A4).build(elementos)
+    guardar_golden(ruta, 'Una tabla por categoría, varias por página', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+def texto_plano(destino, rnd):
+    """Sin tablas: cada resultado es una línea de texto corrido"""
+    filas = resultados(rnd, 200)
+    ruta = os.path.join(destino, 'texto_plano.pdf')
+    c = canvas.Canvas(ruta, pagesize=letter)
+    for inicio in range(0, len(filas), 50):
+        y = 750
+        c.setFont('Helvetica', 8)
+        c.drawString(40, y, 'Pl Bib Name Category Time')
+        for f in filas[inicio:inicio + 50]:
+            y -= 13
+            c.drawString(40, y, f"{f['posicion']} {f['dorsal']} {f['nombre']} {f['apellido']} "
+                                f"{f['categoria']} {f['tiempo']}")
+        c.showPage()
+    c.save()
+    guardar_golden(ruta, 'Solo texto, sin tablas (parser de texto)', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+def multipagina(destino, rnd):
+    """Tabla larga con grilla partida en páginas; el encabezado solo está en la primera"""
+    filas = resultados(rnd, 1000)
+    ruta = os.path.join(destino, 'multipagina.pdf')
+    tabla = Table([['Pl', 'Bib', 'Name', 'Category', 'Time']] + [
+        [f['posicion'], f['dorsal'], f"{f['nombre']} {f['apellido']}", f['categoria'], f['tiempo']]
+        for f in filas
+    ])
+    tabla.setStyle(ESTILO_GRILLA)
+    SimpleDocTemplate(ruta, pagesize=letter).build([tabla])
+    guardar_golden(ruta, 'Tabla de 1000 filas en ~20 páginas, encabezado solo en la primera', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+def columnas_alineadas(destino, rnd):
+    """Diseño de proveedor sin grilla: columnas alineadas por posición x y encabezado en cada página"""
+    filas = resultados(rnd, 600)
+    ruta = os.path.join(destino, 'columnas_alineadas.pdf')
+    columnas = [('Place', 40), ('Bib', 80), ('Name', 120), ('Category', 300), ('Time', 370), ('Difference', 430)]
+    c = canvas.Canvas(ruta, pagesize=letter)
+    for inicio in range(0, len(filas), 55):
+        c.setFont('Helvetica-Bold', 12)
+        c.drawString(40, 760, 'Resultados 10K - Clasificación general')
+        c.setFont('Helvetica-Bold', 8)
+        for titulo, x in columnas:
+            c.drawString(x, 735, titulo)
+        c.setFont('Helvetica', 8)
+        y = 735
+        for f in filas[inicio:inicio + 55]:
+            y -= 12
+            diferencia = formato_tiempo(f['segundos'] - filas[0]['segundos'])
+            valores = [str(f['posicion']), f['dorsal'], f"{f['nombre']} {f['apellido']}",
+                       f['categoria'], f['tiempo'], f'+{diferencia}']
+            for (_, x), valor in zip(columnas, valores):
+                c.drawString(x, y, valor)
+        c.drawString(40, 40, f'Página {inicio // 55 + 1}')
+        c.showPage()
+    c.save()
+    guardar_golden(ruta, 'Columnas alineadas sin grilla (perfil de cronometraje)', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+def encabezado_desconocido(destino, rnd):
+    """Tabla con grilla de un proveedor sin perfil: tiempo chip y oficial, club"""
+    filas = resultados(rnd, 150)
+    ruta = os.path.join(destino, 'encabezado_desconocido.pdf')
+    tabla = Table([['Puesto', 'Nº', 'Participante', 'Club', 'Cat.', 'Tiempo Oficial', 'Tiempo Chip']] + [
+        [f['posicion'], f['dorsal'], f"{f['nombre']} {f['apellido']}", f['equipo'], f['categoria'],
+         formato_tiempo(f['segundos_gun']), f['tiempo']]
+        for f in filas
+    ], repeatRows=1)
+    tabla.setStyle(ESTILO_GRILLA)
+    SimpleDocTemplate(ruta, pagesize=A4).build([tabla, PageBreak()])
+    guardar_golden(ruta, 'Encabezado sin perfil, gana el tiempo chip', filas,
+                   ['dorsal', 'nombre', 'apellido', 'categoria', 'tiempo'])
+
+
+GENERADORES = [tabla_simple, tabla_multiple, texto_plano, multipagina, columnas_alineadas, encabezado_desconocido]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--destino', default=DESTINO)
+    args = parser.parse_args()
+
+    os.makedirs(args.destino, exist_ok=True)
+    for generador in GENERADORES:
+        # Semilla por documento: regenerar uno no cambia los demás
+        generador(args.destino, random.Random(generador.__name__))
+        print(f"✓ {generador.__name__}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Prepara los archivos estáticos del frontend para servirlos desde Flask.
+
+Uso:
+    python backend/construir_estaticos.py [--destino dist]
+
+Copia las páginas HTML (raíz y admin/), los scripts de admin/ y las imágenes
+(img/) a dist/:
+- Los recursos (imágenes, scripts) llevan el hash de su contenido en el nombre
+  (img/logovo2max.3f2a9c1b7e.png), así el navegador puede guardarlos un año sin
+  revalidar; las referencias en el HTML se reescriben al nombre nuevo.
+- Los HTML conservan su nombre (son la URL que visita la gente).
+- De cada archivo comprimible se generan .gz y .br (brotli, si está instalado)
+  con el nivel máximo, que Flask sirve según Accept-Encoding sin comprimir
+  nada al vuelo.
+
+dist/manifiesto.json lista los nombres con hash y las variantes de cada
+archivo. Sin dist/, la app sirve los archivos originales sin caché larga.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DESTINO = os.path.join(RAIZ, 'dist')
+
+PAGINAS = ['*.html', 'admin/*.html']
+RECURSOS = ['img/*', 'admin/*.js']
+COMPRIMIBLES = {'.html', '.css', '.js', '.svg', '.json', '.txt', '.ico'}
+TAMANO_MINIMO = 1024  # Bytes; por debajo la cabecera de la compresión no compensa
+
+_REFERENCIA = re.compile(r'''((?:src|href)=["'])([^"'#?]+)''')
+
+def _archivos(patrones):
+    for patron in patrones:
+        for ruta in sorted(glob.glob(os.path.join(RAIZ, patron))):
+            if os.path.isfile(ruta):
+                yield os.path.relpath(ruta, RAIZ).replace(os.sep, '/')
+
+def _con_hash(ruta, contenido):
+    base, extension = posixpath.splitext(ruta)
+    return f"{base}.{hashlib.sha256(contenido).hexdigest()[:10]}{extension}"
+
+def _reescribir_referencias(pagina, html, archivos):
+    """Cambia las referencias a recursos por su nombre con hash, respetando cómo
+    estaban escritas (relativas a la página o absolutas desde la raíz)"""
+    directorio = posixpath.dirname(pagina)
+
+    def reemplazar(coincidencia):
+        prefijo, valor = coincidencia.groups()
+        if '://' in valor or valor.startswith(('data:', 'mailto:', '${')):
+            return coincidencia.group(0)
+        destino = posixpath.normpath(valor.lstrip('/') if valor.startswith('/') else posixpath.join(directorio, valor))
+        if destino not in archivos:
+            return coincidencia.group(0)
+        return prefijo + posixpath.join(posixpath.dirname(valor), posixpath.basename(archivos[destino]))
+
+    return _REFERENCIA.sub(reemplazar, html)
+
+def _comprimir(ruta_absoluta, contenido):
+    """Escribe las variantes .gz y .br que resulten más chicas que el original"""
+    variantes = []
+    comprimido = gzip.compress(contenido, compresslevel=9, mtime=0)
+    if len(comprimido) < len(contenido):
+        with open(ruta_absoluta + '.gz', 'wb') as f:
+            f.write(comprimido)
+        variantes.append('gzip')
+
+    try:
+        import brotli
+    except ImportError:
+        return variantes
+    comprimido = brotli.compress(contenido, quality=11)
+    if len(comprimido) < len(contenido):
+        with open(ruta_absoluta + '.br', 'wb') as f:
+            f.write(comprimido)
+        variantes.append('br')
+    return variantes
+
+def construir(destino=DESTINO):
+    """Genera destino/ y devuelve el manifiesto"""
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+
+    salida = {}
+    archivos = {}
+    for ruta in _archivos(RECURSOS):
+        with open(os.path.join(RAIZ, ruta), 'rb') as f:
+            contenido = f.read()
+        archivos[ruta] = _con_hash(ruta, contenido)
+        salida[archivos[ruta]] = contenido
+
+    for ruta in _archivos(PAGINAS):
+        with open(os.path.join(RAIZ, ruta), encoding='utf-8') as f:
+            salida[ruta] = _reescribir_referencias(ruta, f.read(), archivos).encode('utf-8')
+
+    variantes = {}
+    for ruta, contenido in salida.items():
+        ruta_absoluta = os.path.join(destino, *ruta.split('/'))
+        os.makedirs(os.path.dirname(ruta_absoluta), exist_ok=True)
+        with open(ruta_absoluta, 'wb') as f:
+            f.write(contenido)
+        if posixpath.splitext(ruta)[1].lower() in COMPRIMIBLES and len(contenido) >= TAMANO_MINIMO:
+            variantes[ruta] = _comprimir(ruta_absoluta, contenido)
+
+    manifiesto = {'archivos': archivos, 'variantes': {r: v for r, v in variantes.items() if v}}
+    with open(os.path.join(destino, 'manifiesto.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, sort_keys=True)
+    return manifiesto
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--destino', default=DESTINO)
+    args = parser.parse_args()
+
+    manifiesto = construir(args.destino)
+    for original, con_hash in sorted(manifiesto['archivos'].items()):
+        print(f"✓ {original} -> {con_hash}")
+    for ruta, variantes in sorted(manifiesto['variantes'].items()):
+        print(f"✓ {ruta} ({', '.join(variantes)})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Logging estructurado de la aplicación.
+
+Los módulos piden su logger con obtener_logger('pdf'), obtener_logger('email'),
+etc. (todos cuelgan de 'vo2max'). configurar_logs() instala un QueueHandler: el
+hilo que registra un mensaje solo lo encola y un hilo aparte lo formatea y lo
+escribe en stdout, así un log no bloquea la petición.
+
+Variables de entorno:
+    APP_ENV       'production' sube el nivel por defecto a INFO (sin DEBUG por fila)
+    LOG_NIVEL     Nivel por defecto (DEBUG en desarrollo, INFO en producción)
+    LOG_NIVELES   Niveles por módulo, p. ej. 'pdf=DEBUG,email=WARNING'
+    LOG_FORMATO   'json' (una línea JSON por evento) o 'texto'
+    LOG_MUESTREO  Los loggers '*.filas' solo emiten 1 de cada N mensajes DEBUG
+                  (1 en desarrollo, 100 en producción)
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+
+RAIZ = 'vo2max'
+
+# Atributos propios de LogRecord: el resto son campos estructurados pasados con extra={...}
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_filtros_muestreo = []
+
+def _campos_extra(record):
+    return {clave: valor for clave, valor in vars(record).items() if clave not in _ATRIBUTOS_RECORD}
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por evento, con los campos de extra={...} al mismo nivel"""
+
+    def format(self, record):
+        evento = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'funcion': record.funcName,
+            'mensaje': record.getMessage(),
+        }
+        evento.update(_campos_extra(record))
+        if record.exc_info:
+            evento['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+class FormatoTexto(logging.Formatter):
+    """Formato legible para desarrollo: los campos extra van como clave=valor"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s', '%H:%M:%S')
+
+    def format(self, record):
+        texto = super().format(record)
+        extra = _campos_extra(record)
+        if extra:
+            texto += ' ' + ' '.join(f'{clave}={valor}' for clave, valor in extra.items())
+        return texto
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar 1 de cada n mensajes (para los logs de depuración por fila)"""
+
+    def __init__(self, n=1):
+        super().__init__()
+        self.n = n
+        self._contador = itertools.count()
+
+    def filter(self, record):
+        # next() sobre itertools.count es atómico bajo el GIL
+        return record.levelno > logging.DEBUG or next(self._contador) % self.n == 0
+
+def obtener_logger(modulo):
+    """Logger de un módulo de la aplicación ('pdf', 'email', 'pdf.filas'...)"""
+    logger = logging.getLogger(f'{RAIZ}.{modulo}')
+    if modulo.endswith('.filas') and not any(isinstance(f, FiltroMuestreo) for f in logger.filters):
+        filtro = FiltroMuestreo()
+        _filtros_muestreo.append(filtro)
+        logger.addFilter(filtro)
+    return logger
+
+def configurar_logs():
+    """Lee la configuración del entorno e instala el handler en cola (una sola vez)"""
+    global _listener
+    produccion = os.getenv('APP_ENV', 'development').lower() == 'production'
+    raiz = logging.getLogger(RAIZ)
+    raiz.setLevel(os.getenv('LOG_NIVEL', 'INFO' if produccion else 'DEBUG').upper())
+
+    for asignacion in filter(None, (a.strip() for a in os.getenv('LOG_NIVELES', '').split(','))):
+        modulo, _, nivel = asignacion.partition('=')
+        logging.getLogger(f'{RAIZ}.{modulo.strip()}').setLevel(nivel.strip().upper())
+
+    muestreo = max(1, int(os.getenv('LOG_MUESTREO', 100 if produccion else 1)))
+    for filtro in _filtros_muestreo:
+        filtro.n = muestreo
+
+    if _listener is not None:
+        return
+
+    formato = os.getenv('LOG_FORMATO', 'json' if produccion else 'texto').lower()
+    salida = logging.StreamHandler(sys.stdout)
+    salida.setFormatter(FormatoJSON() if formato == 'json' else FormatoTexto())
+
+    cola = queue.SimpleQueue()
+    raiz.addHandler(logging.handlers.QueueHandler(cola))
+    raiz.propagate = False
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    # Vaciar la cola al salir para no perder los últimos mensajes
+    atexit.register(_listener.stop)
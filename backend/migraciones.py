@@ -0,0 +1,785 @@
+"""Migraciones versionadas del esquema de la base de datos.
+
+Uso:
+    python backend/migraciones.py            # Aplica las migraciones pendientes
+    python backend/migraciones.py --estado   # Muestra la versión actual y las pendientes
+
+Cada migración tiene un número y se aplica una sola vez, en su propia transacción,
+y queda anotada en la tabla schema_version. Se ejecutan como paso previo al
+despliegue (ver Dockerfile y railway.json), no en cada worker: al arrancar, la
+app solo compara la versión de la BD con VERSION_ESQUEMA (ver verificar_esquema
+en app.py).
+
+Para cambiar el esquema se agrega una migración nueva al final; las ya aplicadas
+no se modifican. Las sentencias usan IF NOT EXISTS para que una BD creada antes
+de este sistema (con el antiguo init_db) pueda adoptar las migraciones sin error.
+
+Se aplican con la app en marcha, así que no deben bloquear registros más que un
+instante: las columnas nuevas son anulables y sin valor por defecto (no reescriben
+la tabla, que guarda los comprobantes) y los índices se crean con CONCURRENTLY en
+una migración con transaccion=False, que corre fuera de una transacción y tiene
+que poder repetirse si falla a mitad.
+
+Variables de entorno:
+    DATABASE_URL               Conexión a PostgreSQL
+    MIGRACIONES_LOCK_TIMEOUT   Espera máxima por un lock (10s): si hay tráfico que lo
+                               retiene, la migración falla en vez de bloquear a todos
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from dotenv import load_dotenv
+
+try:
+    from backend.logs import obtener_logger
+except ImportError:
+    from logs import obtener_logger
+
+log = obtener_logger('migraciones')
+
+# Un solo proceso migra a la vez (pg_advisory_lock)
+CLAVE_LOCK = 72_018_048
+
+# Letras con tilde que se igualan a la letra base al buscar (con translate() el trigger y el
+# relleno calculan lo mismo sin depender de la extensión unaccent)
+TILDES = ('áàäâãéèëêíìïîóòöôõúùüûñçÁÀÄÂÃÉÈËÊÍÌÏÎÓÒÖÔÕÚÙÜÛÑÇ',
+          'aaaaaeeeeiiiiooooouuuuncaaaaaeeeeiiiiooooouuuunc')
+
+MIGRACIONES = []
+
+def sql_sin_tildes(expresion):
+    """Expresión SQL con el texto en minúsculas y sin tildes"""
+    return f"lower(translate({expresion}, '{TILDES[0]}', '{TILDES[1]}'))"
+
+def migracion(version, descripcion, transaccion=True):
+    """Registra una migración; las versiones deben ir en orden creciente. Con
+    transaccion=False cada sentencia se confirma sola (CREATE INDEX CONCURRENTLY)."""
+    def registrar(funcion):
+        if MIGRACIONES and version <= MIGRACIONES[-1][0]:
+            raise ValueError(f'Migración {version} fuera de orden')
+        funcion.transaccion = transaccion
+        MIGRACIONES.append((version, descripcion, funcion))
+        return funcion
+    return registrar
+
+def crear_indice_concurrente(cur, nombre, definicion, unico=False):
+    """CREATE INDEX CONCURRENTLY, que no bloquea las escrituras (solo en migraciones
+    con transaccion=False). Si un intento anterior falló a mitad, el índice quedó
+    marcado como inválido: se borra y se vuelve a crear."""
+    cur.execute('SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', (nombre,))
+    fila = cur.fetchone()
+    if fila is not None and not fila[0]:
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {nombre}')
+    cur.execute(f"CREATE {'UNIQUE ' if unico else ''}INDEX CONCURRENTLY IF NOT EXISTS {nombre} {definicion}")
+
+@migracion(1, 'Tablas de carreras, club, registros, administradores, rankings e importaciones de PDF')
+def _001_esquema_inicial(cur):
+    # Tabla de carreras
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS carreras (
+            id SERIAL PRIMARY KEY,
+            titulo VARCHAR(255) NOT NULL,
+            descripcion TEXT,
+            fecha DATE NOT NULL,
+            estado VARCHAR(50) DEFAULT 'proxima',
+            categorias VARCHAR(255),
+            ubicacion VARCHAR(255),
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabla de información del club
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS club_info (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            descripcion TEXT,
+            mision TEXT,
+            vision TEXT,
+            whatsapp_link VARCHAR(255),
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabla de registros de corredores
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS registros (
+            id SERIAL PRIMARY KEY,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100) NOT NULL,
+            edad INT NOT NULL,
+            genero VARCHAR(20) NOT NULL,
+            correo VARCHAR(150) NOT NULL,
+            team VARCHAR(100),
+            categoria VARCHAR(50) NOT NULL,
+            codigo_registro VARCHAR(50) NOT NULL UNIQUE,
+            estado VARCHAR(50) DEFAULT 'pendiente',
+            dorsal INT UNIQUE,
+            comprobante BYTEA,
+            comprobante_filename VARCHAR(255),
+            comprobante_mimetype VARCHAR(50),
+            dorsal_entregado BOOLEAN DEFAULT FALSE,
+            asistio BOOLEAN DEFAULT FALSE,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_validacion TIMESTAMP,
+            fecha_entrega_dorsal TIMESTAMP
+        )
+    ''')
+    
+    # Agregar columnas nuevas si no existen (para tablas ya creadas)
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS comprobante_filename VARCHAR(255);
+    ''')
+    
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS comprobante_mimetype VARCHAR(50);
+    ''')
+    
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS dorsal_entregado BOOLEAN DEFAULT FALSE;
+    ''')
+    
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS asistio BOOLEAN DEFAULT FALSE;
+    ''')
+    
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS fecha_entrega_dorsal TIMESTAMP;
+    ''')
+    
+    # Administradores del panel (antes se creaba a mano, ver DEPLOYMENT.md)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS administradores (
+            id SERIAL PRIMARY KEY,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            nombre VARCHAR(100),
+            activo BOOLEAN DEFAULT TRUE,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabla para almacenar tokens de administradores
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS admin_tokens (
+            id SERIAL PRIMARY KEY,
+            token VARCHAR(255) UNIQUE NOT NULL,
+            admin_id INT NOT NULL,
+            admin_email VARCHAR(150) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (admin_id) REFERENCES administradores(id)
+        )
+    ''')
+    
+    # Índice para limpiar tokens expirados rápidamente
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_admin_tokens_expires_at 
+        ON admin_tokens(expires_at)
+    ''')
+    
+    # Tabla de rankings
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS rankings (
+            id SERIAL PRIMARY KEY,
+            titulo VARCHAR(255) NOT NULL,
+            descripcion TEXT,
+            carrera_id INT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            estado VARCHAR(50) DEFAULT 'activo',
+            creado_por INT,
+            FOREIGN KEY (carrera_id) REFERENCES carreras(id) ON DELETE SET NULL,
+            FOREIGN KEY (creado_por) REFERENCES administradores(id) ON DELETE SET NULL
+        )
+    ''')
+    
+    # Tabla de registros en rankings
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS ranking_registros (
+            id SERIAL PRIMARY KEY,
+            ranking_id INT NOT NULL,
+            posicion INT NOT NULL,
+            nombre VARCHAR(100) NOT NULL,
+            apellido VARCHAR(100),
+            tiempo VARCHAR(20),
+            categoria VARCHAR(50),
+            equipo VARCHAR(100),
+            puntos DECIMAL(10,2),
+            dorsal INT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (ranking_id) REFERENCES rankings(id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # Índices para rankings
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ranking_registros_ranking_id 
+        ON ranking_registros(ranking_id)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_rankings_carrera_id 
+        ON rankings(carrera_id)
+    ''')
+    
+    # Tabla de importaciones de PDF (trabajos en segundo plano)
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS importaciones_pdf (
+            id VARCHAR(32) PRIMARY KEY,
+            titulo VARCHAR(255) NOT NULL,
+            archivo VARCHAR(255),
+            estado VARCHAR(20) NOT NULL DEFAULT 'en_cola',
+            paginas_procesadas INT DEFAULT 0,
+            paginas_total INT,
+            registros_extraidos INT DEFAULT 0,
+            advertencias JSONB DEFAULT '[]'::jsonb,
+            ranking_id INT,
+            error TEXT,
+            creado_por INT,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            fecha_inicio TIMESTAMP,
+            fecha_fin TIMESTAMP,
+            FOREIGN KEY (ranking_id) REFERENCES rankings(id) ON DELETE SET NULL,
+            FOREIGN KEY (creado_por) REFERENCES administradores(id) ON DELETE SET NULL
+        )
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_importaciones_pdf_fecha_creacion 
+        ON importaciones_pdf(fecha_creacion DESC)
+    ''')
+
+@migracion(2, 'Cupo por carrera y contador de inscritos mantenido por trigger')
+def _002_cupo_por_carrera(cur):
+    cur.execute('''
+        ALTER TABLE registros
+        ADD COLUMN IF NOT EXISTS carrera_id INT;
+    ''')
+    
+    # Cupo por carrera (NULL = sin límite); 300 era el límite fijo anterior
+    cur.execute('''
+        ALTER TABLE carreras
+        ADD COLUMN IF NOT EXISTS cupo INT DEFAULT 300;
+    ''')
+    
+    # Inscritos (pagados con dorsal) por carrera, mantenido por trigger
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS inscripciones_contador (
+            carrera_id INT PRIMARY KEY,
+            inscritos INT NOT NULL DEFAULT 0,
+            fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Antes había un solo cupo global: los registros sin carrera son de la carrera abierta
+    cur.execute('''
+        UPDATE registros SET carrera_id = (
+            SELECT id FROM carreras WHERE estado = 'proxima' ORDER BY fecha ASC, id ASC LIMIT 1
+        )
+        WHERE carrera_id IS NULL
+    ''')
+    
+    cur.execute('''
+        INSERT INTO inscripciones_contador (carrera_id, inscritos)
+        SELECT carrera_id, COUNT(*) FROM registros
+        WHERE estado = 'pagado' AND dorsal IS NOT NULL AND carrera_id IS NOT NULL
+        GROUP BY carrera_id
+        ON CONFLICT (carrera_id) DO NOTHING
+    ''')
+    
+    # El contador se actualiza en la misma transacción que la validación o el
+    # registro; el UPSERT bloquea la fila de la carrera, así que dos validaciones
+    # simultáneas no pueden pasar ambas del cupo
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION actualizar_contador_inscripciones() RETURNS trigger AS $$
+        DECLARE
+            contaba BOOLEAN := TG_OP <> 'INSERT' AND OLD.estado = 'pagado'
+                               AND OLD.dorsal IS NOT NULL AND OLD.carrera_id IS NOT NULL;
+            cuenta BOOLEAN := TG_OP <> 'DELETE' AND NEW.estado = 'pagado'
+                              AND NEW.dorsal IS NOT NULL AND NEW.carrera_id IS NOT NULL;
+            total INT;
+            cupo_carrera INT;
+        BEGIN
+            IF contaba AND cuenta AND OLD.carrera_id = NEW.carrera_id THEN
+                RETURN NULL;
+            END IF;
+            IF contaba THEN
+                UPDATE inscripciones_contador
+                SET inscritos = inscritos - 1, fecha_actualizacion = NOW()
+                WHERE carrera_id = OLD.carrera_id;
+            END IF;
+            IF cuenta THEN
+                INSERT INTO inscripciones_contador AS c (carrera_id, inscritos)
+                VALUES (NEW.carrera_id, 1)
+                ON CONFLICT (carrera_id) DO UPDATE
+                SET inscritos = c.inscritos + 1, fecha_actualizacion = NOW()
+                RETURNING inscritos INTO total;
+                
+                SELECT cupo INTO cupo_carrera FROM carreras WHERE id = NEW.carrera_id;
+                IF cupo_carrera IS NOT NULL AND total > cupo_carrera THEN
+                    RAISE EXCEPTION 'Cupo agotado para la carrera %', NEW.carrera_id
+                        USING ERRCODE = 'check_violation', CONSTRAINT = 'cupo_carrera';
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'contador_inscripciones') THEN
+                CREATE TRIGGER contador_inscripciones
+                AFTER INSERT OR DELETE OR UPDATE OF estado, dorsal, carrera_id ON registros
+                FOR EACH ROW EXECUTE FUNCTION actualizar_contador_inscripciones();
+            END IF;
+        END
+        $$
+    ''')
+
+@migracion(3, 'Triggers que avisan a todos los workers que invaliden la caché pública')
+def _003_invalidacion_cache(cur):
+    # Avisar a todos los workers (y de cambios hechos directo en la BD) que
+    # invaliden la caché de endpoints públicos; el payload sigue el formato de DifusorEventos
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION notificar_invalidacion_cache() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('cache_invalidacion', json_build_object(
+                'clave', 'tablas', 'evento', json_build_object('tabla', TG_TABLE_NAME)
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    for tabla in ('club_info', 'carreras', 'rankings', 'inscripciones_contador'):
+        cur.execute(f'''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'cache_{tabla}') THEN
+                    CREATE TRIGGER cache_{tabla}
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {tabla}
+                    FOR EACH STATEMENT EXECUTE FUNCTION notificar_invalidacion_cache();
+                END IF;
+            END
+            $$
+        ''')
+
+@migracion(4, 'Versión de cada cambio en registros para los paneles (?since=)')
+def _004_sincronizacion_incremental(cur):
+    # Versión de cada cambio (id de la transacción que escribió la fila) para
+    # la sincronización incremental de los paneles (ver cursor_sincronizacion)
+    cur.execute('''
+        ALTER TABLE registros
+        ADD COLUMN IF NOT EXISTS version_cambio xid8;
+    ''')
+    
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION marcar_version_registro() RETURNS trigger AS $$
+        BEGIN
+            NEW.version_cambio := pg_current_xact_id();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'version_registro') THEN
+                CREATE TRIGGER version_registro
+                BEFORE INSERT OR UPDATE ON registros
+                FOR EACH ROW EXECUTE FUNCTION marcar_version_registro();
+            END IF;
+        END
+        $$
+    ''')
+    # Su índice se crea sin bloquear escrituras en la migración 12
+
+@migracion(5, 'Avisos de cambios en registros para los paneles admin (SSE)')
+def _005_eventos_admin(cur):
+    # Avisar a los paneles admin (SSE, ver eventos_admin) de los cambios que les
+    # interesan, se hagan desde cualquier worker o directo en la BD
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION notificar_evento_admin() RETURNS trigger AS $$
+        DECLARE
+            tipo TEXT;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                tipo := 'registro';
+            ELSIF NEW.comprobante_filename IS DISTINCT FROM OLD.comprobante_filename
+                  OR (OLD.comprobante IS NULL AND NEW.comprobante IS NOT NULL) THEN
+                tipo := 'comprobante';
+            ELSIF NEW.estado IS DISTINCT FROM OLD.estado THEN
+                tipo := CASE NEW.estado
+                            WHEN 'pagado' THEN 'pago_validado'
+                            WHEN 'rechazado' THEN 'pago_rechazado'
+                            ELSE 'estado'
+                        END;
+            ELSIF NEW.dorsal_entregado IS DISTINCT FROM OLD.dorsal_entregado THEN
+                tipo := 'dorsal_entregado';
+            ELSIF NEW.asistio IS DISTINCT FROM OLD.asistio THEN
+                tipo := 'asistencia';
+            ELSE
+                RETURN NULL;
+            END IF;
+            
+            PERFORM pg_notify('admin_eventos', json_build_object(
+                'clave', 'registros', 'evento', json_build_object(
+                    'tipo', tipo, 'id', NEW.id,
+                    'codigo_registro', NEW.codigo_registro, 'estado', NEW.estado
+                )
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'eventos_admin_registros') THEN
+                CREATE TRIGGER eventos_admin_registros
+                AFTER INSERT OR UPDATE OF comprobante, comprobante_filename, estado,
+                                          dorsal_entregado, asistio ON registros
+                FOR EACH ROW EXECUTE FUNCTION notificar_evento_admin();
+            END IF;
+        END
+        $$
+    ''')
+
+@migracion(6, 'Columna tiene_comprobante de los listados admin')
+def _006_tiene_comprobante(cur):
+    # Listados del panel admin (ver LISTADOS_REGISTROS): ordenar por
+    # "comprobante IS NOT NULL" revisaba la columna BYTEA en cada fila; una
+    # columna propia permite indexar el orden completo de cada listado. No es
+    # GENERATED ... STORED porque agregarla reescribiría toda la tabla (con los
+    # comprobantes) bloqueándola: la mantiene un trigger y la migración 12
+    # rellena las filas existentes por lotes, junto con los índices
+    cur.execute('''
+        ALTER TABLE registros
+        ADD COLUMN IF NOT EXISTS tiene_comprobante BOOLEAN
+    ''')
+    
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION marcar_tiene_comprobante() RETURNS trigger AS $$
+        BEGIN
+            NEW.tiene_comprobante := NEW.comprobante IS NOT NULL;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'tiene_comprobante_registro') THEN
+                CREATE TRIGGER tiene_comprobante_registro
+                BEFORE INSERT OR UPDATE OF comprobante ON registros
+                FOR EACH ROW EXECUTE FUNCTION marcar_tiene_comprobante();
+            END IF;
+        END
+        $$
+    ''')
+
+@migracion(7, 'Fecha de asistencia y registro de operaciones de los kioskos offline')
+def _007_operaciones_sync(cur):
+    # Momento de la última marca de asistencia (resuelve conflictos de los kioskos offline)
+    cur.execute('''
+        ALTER TABLE registros 
+        ADD COLUMN IF NOT EXISTS fecha_asistencia TIMESTAMP;
+    ''')
+    
+    # Operaciones de los kioskos offline ya aplicadas (ver sincronizar_checkin):
+    # reenviar una operación devuelve el resultado guardado sin aplicarla de nuevo
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS operaciones_sync (
+            op_id VARCHAR(64) PRIMARY KEY,
+            dispositivo VARCHAR(100),
+            tipo VARCHAR(30) NOT NULL,
+            datos JSONB NOT NULL,
+            resultado JSONB,
+            fecha_cliente TIMESTAMP,
+            fecha_aplicada TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            admin_id INT,
+            FOREIGN KEY (admin_id) REFERENCES administradores(id) ON DELETE SET NULL
+        )
+    ''')
+
+# Nombre y apellido en minúsculas y sin tildes, en los dos órdenes (ver migración 8);
+# {fila} es 'NEW.' dentro del trigger y '' al rellenar
+COLUMNAS_BUSQUEDA = (('nombre_busqueda', "{fila}nombre || ' ' || {fila}apellido"),
+                     ('apellido_busqueda', "{fila}apellido || ' ' || {fila}nombre"))
+
+@migracion(8, 'Columnas de búsqueda sin tildes para el mostrador')
+def _008_busqueda_mostrador(cur):
+    # Búsqueda del mostrador de check-in (ver buscar_registros) por prefijo del
+    # nombre completo. Como tiene_comprobante: columnas comunes que mantiene un
+    # trigger (rellenadas e indexadas en la migración 12) para no reescribir la tabla
+    for columna, _ in COLUMNAS_BUSQUEDA:
+        cur.execute(f'''
+            ALTER TABLE registros
+            ADD COLUMN IF NOT EXISTS {columna} TEXT
+        ''')
+    
+    asignaciones = '\n'.join(
+        f"NEW.{columna} := {sql_sin_tildes(expresion.format(fila='NEW.'))};"
+        for columna, expresion in COLUMNAS_BUSQUEDA
+    )
+    cur.execute(f'''
+        CREATE OR REPLACE FUNCTION calcular_busqueda_registro() RETURNS trigger AS $$
+        BEGIN
+            {asignaciones}
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'busqueda_registro') THEN
+                CREATE TRIGGER busqueda_registro
+                BEFORE INSERT OR UPDATE OF nombre, apellido ON registros
+                FOR EACH ROW EXECUTE FUNCTION calcular_busqueda_registro();
+            END IF;
+        END
+        $$
+    ''')
+
+@migracion(9, 'Dorsales por carrera')
+def _009_dorsales_por_carrera(cur):
+    # Cada carrera numera sus dorsales desde dorsal_inicial (ver siguiente_dorsal);
+    # dos carreras el mismo día pueden usar rangos distintos, p. ej. 1 y 500
+    cur.execute('''
+        ALTER TABLE carreras
+        ADD COLUMN IF NOT EXISTS dorsal_inicial INT NOT NULL DEFAULT 1
+    ''')
+    
+    # Registros hechos sin carrera abierta: pasan a la próxima, como en cupo_por_carrera
+    cur.execute('''
+        UPDATE registros SET carrera_id = (
+            SELECT id FROM carreras WHERE estado = 'proxima' ORDER BY fecha ASC, id ASC LIMIT 1
+        )
+        WHERE carrera_id IS NULL
+    ''')
+    # El dorsal pasa a ser único dentro de su carrera: el índice nuevo y el retiro
+    # del UNIQUE global van en la migración 12, sin bloquear escrituras
+
+@migracion(10, 'Registros eliminados para la sincronización incremental (?since=)')
+def _010_registros_eliminados(cur):
+    # Un registro borrado no deja fila con version_cambio: se guarda su id para que
+    # los paneles y kioskos que sincronizan con ?since= lo quiten de su lista
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS registros_eliminados (
+            id INT PRIMARY KEY,
+            carrera_id INT,
+            version_cambio xid8 NOT NULL DEFAULT pg_current_xact_id(),
+            fecha_eliminacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_registros_eliminados_version_cambio
+        ON registros_eliminados(version_cambio)
+    ''')
+    
+    # También avisa a los paneles (SSE) como los demás cambios de eventos_admin
+    cur.execute('''
+        CREATE OR REPLACE FUNCTION registrar_registro_eliminado() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO registros_eliminados (id, carrera_id)
+            VALUES (OLD.id, OLD.carrera_id)
+            ON CONFLICT (id) DO NOTHING;
+    
+            PERFORM pg_notify('admin_eventos', json_build_object(
+                'clave', 'registros', 'evento', json_build_object(
+                    'tipo', 'eliminado', 'id', OLD.id,
+                    'codigo_registro', OLD.codigo_registro, 'estado', OLD.estado
+                )
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    
+    cur.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'registros_eliminados') THEN
+                CREATE TRIGGER registros_eliminados
+                AFTER DELETE ON registros
+                FOR EACH ROW EXECUTE FUNCTION registrar_registro_eliminado();
+            END IF;
+        END
+        $$
+    ''')
+
+@migracion(11, 'Re-importaciones de PDF en segundo plano con su vista previa')
+def _011_reimportaciones_pdf(cur):
+    # Una re-importación de PDF se procesa como las importaciones: el worker guarda
+    # la vista previa (diff y versión) y la confirmación la aplica sin volver a leer el PDF
+    cur.execute('''
+        ALTER TABLE importaciones_pdf
+        ADD COLUMN IF NOT EXISTS tipo VARCHAR(20) NOT NULL DEFAULT 'creacion',
+        ADD COLUMN IF NOT EXISTS vista_previa JSONB
+    ''')
+
+# Filas por lote al rellenar columnas nuevas de registros: cada lote se confirma solo
+LOTE_RELLENO = 2000
+
+@migracion(12, 'Relleno por lotes e índices de registros por carrera (CONCURRENTLY)', transaccion=False)
+def _012_indices_registros(cur):
+    # Columnas de las migraciones 6 y 8 en las filas anteriores a sus triggers. Por
+    # lotes de id para no retener locks ni dejar una transacción larga abierta;
+    # el trigger de version_cambio marca cada fila, así que los paneles las reciben
+    # una vez en su próximo ?since=
+    asignaciones = ', '.join(
+        ['tiene_comprobante = comprobante IS NOT NULL']
+        + [f"{columna} = {sql_sin_tildes(expresion.format(fila=''))}" for columna, expresion in COLUMNAS_BUSQUEDA]
+    )
+    ultimo_id = 0
+    while True:
+        cur.execute(f'''
+            UPDATE registros SET {asignaciones}
+            WHERE id IN (
+                SELECT id FROM registros
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            )
+            RETURNING id
+        ''', (ultimo_id, LOTE_RELLENO))
+        ids = [fila[0] for fila in cur.fetchall()]
+        if not ids:
+            break
+        ultimo_id = max(ids)
+    
+    # Sincronización incremental de los paneles (?since=, migración 4)
+    crear_indice_concurrente(cur, 'idx_registros_version_cambio', 'ON registros(version_cambio)')
+    
+    # El dorsal es único dentro de su carrera, no en toda la tabla: primero el índice
+    # nuevo y después se retira la restricción vieja, así nunca falta la unicidad
+    crear_indice_concurrente(cur, 'idx_registros_carrera_dorsal', 'ON registros(carrera_id, dorsal)', unico=True)
+    cur.execute('ALTER TABLE registros DROP CONSTRAINT IF EXISTS registros_dorsal_key')
+    crear_indice_concurrente(cur, 'idx_registros_carrera_estado', 'ON registros(carrera_id, estado)')
+    
+    # Los índices de los listados y de la búsqueda empiezan por la carrera, así cada
+    # consulta recorre solo la carrera pedida aunque se acumulen carreras pasadas
+    crear_indice_concurrente(cur, 'idx_registros_pendientes', '''
+        ON registros(carrera_id, tiene_comprobante DESC, fecha_creacion DESC, id DESC)
+        INCLUDE (categoria, genero, team)
+        WHERE estado = 'pendiente_validacion'
+    ''')
+    crear_indice_concurrente(cur, 'idx_registros_inscritos', '''
+        ON registros(carrera_id, dorsal, id)
+        INCLUDE (categoria, genero, team, dorsal_entregado, asistio)
+        WHERE estado = 'pagado'
+    ''')
+    for columna, _ in COLUMNAS_BUSQUEDA:
+        crear_indice_concurrente(cur, f'idx_registros_carrera_{columna}',
+                                 f'ON registros(carrera_id, {columna} text_pattern_ops)')
+    crear_indice_concurrente(cur, 'idx_registros_carrera_correo',
+                             'ON registros(carrera_id, lower(correo) text_pattern_ops)')
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+def version_actual(conn):
+    """Última versión aplicada (0 si la BD nunca se migró)"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+            return cur.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0
+
+def aplicar_migraciones(conn):
+    """Aplica las migraciones pendientes y devuelve [(version, descripcion, ms)]"""
+    aplicadas = []
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_advisory_lock(%s)', (CLAVE_LOCK,))
+        try:
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    descripcion VARCHAR(255) NOT NULL,
+                    duracion_ms INT,
+                    fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute("SELECT set_config('lock_timeout', %s, false)",
+                        (os.getenv('MIGRACIONES_LOCK_TIMEOUT', '10s'),))
+            conn.commit()
+            actual = version_actual(conn)
+            for version, descripcion, migrar in MIGRACIONES:
+                if version <= actual:
+                    continue
+                inicio = time.monotonic()
+                try:
+                    if migrar.transaccion:
+                        migrar(cur)
+                    else:
+                        # CONCURRENTLY no puede ir dentro de una transacción
+                        conn.commit()
+                        conn.autocommit = True
+                        try:
+                            migrar(cur)
+                        finally:
+                            conn.autocommit = False
+                    duracion = round((time.monotonic() - inicio) * 1000)
+                    cur.execute('''
+                        INSERT INTO schema_version (version, descripcion, duracion_ms)
+                        VALUES (%s, %s, %s)
+                    ''', (version, descripcion, duracion))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    log.error('Falló la migración %s (%s)', version, descripcion)
+                    raise
+                log.info('Migración aplicada', extra={'version': version, 'duracion_ms': duracion})
+                aplicadas.append((version, descripcion, duracion))
+        finally:
+            conn.rollback()
+            cur.execute('SELECT pg_advisory_unlock(%s)', (CLAVE_LOCK,))
+            conn.commit()
+    return aplicadas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--estado', action='store_true', help='Solo mostrar la versión y las migraciones pendientes')
+    args = parser.parse_args()
+    
+    load_dotenv()
+    if not os.getenv('DATABASE_URL'):
+        sys.exit('Falta DATABASE_URL')
+    conn = psycopg2.connect(os.getenv('DATABASE_URL'))
+    try:
+        actual = version_actual(conn)
+        pendientes = [(v, d) for v, d, _ in MIGRACIONES if v > actual]
+        if args.estado:
+            print(f"Versión del esquema: {actual} (última: {VERSION_ESQUEMA})")
+            for version, descripcion in pendientes:
+                print(f"  pendiente {version:03d}: {descripcion}")
+            sys.exit(1 if pendientes else 0)
+        
+        if not pendientes:
+            print(f"✓ Esquema al día (versión {actual})")
+            return
+        for version, descripcion, duracion in aplicar_migraciones(conn):
+            print(f"✓ {version:03d} {descripcion} ({duracion} ms)")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
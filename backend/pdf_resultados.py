@@ -0,0 +1,541 @@
+"""Extracción de resultados de carrera desde PDFs de empresas de cronometraje.
+
+Este módulo no depende de Flask ni de la base de datos, para que los procesos
+del pool de páginas puedan importarlo sin inicializar la aplicación.
+"""
+import io
+import logging
+import os
+import re
+import unicodedata
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+import multiprocessing
+
+# Import compatible con `gunicorn backend.app:app` y con `python backend/app.py`
+try:
+    from backend.logs import obtener_logger, configurar_logs
+except ImportError:
+    from logs import obtener_logger, configurar_logs
+
+log = obtener_logger('pdf')
+# Una línea por fila extraída: DEBUG y muestreado (nada en producción salvo LOG_NIVELES=pdf.filas=DEBUG)
+log_filas = obtener_logger('pdf.filas')
+
+# Procesos para parsear páginas en paralelo. Por defecto 1 (en serie): arrancar
+# cada proceso con spawn cuesta ~0.9 s y en contenedores de 1-2 CPUs el pool
+# resultó más lento (0.4x-0.8x, ver benchmarks/bench_pdf_paralelo.py)
+PDF_MAX_PROCESOS = int(os.getenv('PDF_MAX_PROCESOS', 1))
+# Aun con PDF_MAX_PROCESOS > 1, por debajo de estas páginas (~55 ms cada una en
+# serie) el arranque de los procesos se come la ganancia
+PDF_PAGINAS_MINIMAS_POOL = int(os.getenv('PDF_PAGINAS_MINIMAS_POOL', 30))
+
+# Palabras de encabezado que identifican cada campo (se comparan palabras
+# completas ya normalizadas, para que 'pl' no coincida dentro de otras palabras).
+# El orden importa: "Last Name" es apellido y "Team Name" es equipo, no nombre.
+_PALABRAS_ENCABEZADO = {
+    'posicion': {'pl', 'pos', 'posicion', 'position', 'place', 'lugar', 'puesto', 'rank'},
+    'dorsal': {'bib', 'dorsal', 'number', 'no', 'num', '#'},
+    'apellido': {'apellido', 'apellidos', 'last', 'surname', 'lastname'},
+    'equipo': {'team', 'equipo', 'club'},
+    'nombre': {'name', 'nombre', 'corredor', 'atleta', 'participante', 'first', 'firstname'},
+    'categoria': {'category', 'categoria', 'cat', 'div', 'division'},
+    'tiempo': {'time', 'tiempo', 'chip', 'gun', 'neto', 'oficial'},
+    'puntos': {'puntos', 'points', 'pts'},
+}
+# Columnas de diferencias o ritmo que también dicen "time" pero no son el tiempo final
+_PALABRAS_EXCLUIDAS = {'diff', 'dif', 'diferencia', 'gap', 'behind', 'pace', 'ritmo'}
+
+# Perfiles de diseño por empresa de cronometraje. 'columnas' es la firma del
+# encabezado: todas sus columnas, en orden, con el campo que representan (None
+# si no se usa). Los rangos x de cada columna se calculan con el encabezado de
+# la primera página, salvo que el perfil los fije en 'limites_x'.
+PERFILES_CRONOMETRAJE = [
+    {
+        'nombre': 'pl-bib-name',
+        'columnas': [('pl', 'posicion'), ('bib', 'dorsal'), ('name', 'nombre'),
+                     ('category', 'categoria'), ('time', 'tiempo')],
+        'formato_tiempo': r'\d{1,2}[:∶]\d{2}(?:[:∶]\d{2})?(?:[.,]\d+)?',
+    },
+    {
+        'nombre': 'webscorer',
+        'columnas': [('place', 'posicion'), ('bib', 'dorsal'), ('name', 'nombre'),
+                     ('category', 'categoria'), ('time', 'tiempo'), ('difference', None)],
+        'formato_tiempo': r'\d{1,2}(?::\d{2}){1,2}(?:\.\d+)?',
+    },
+    {
+        'nombre': 'pos-dorsal-nombre',
+        'columnas': [('pos', 'posicion'), ('dorsal', 'dorsal'), ('nombre', 'nombre'),
+                     ('categoria', 'categoria'), ('tiempo', 'tiempo')],
+        'formato_tiempo': r'\d{1,2}(?::\d{2}){1,2}(?:[.,]\d+)?',
+    },
+]
+PERFIL_TOLERANCIA_X = 3  # Puntos que un valor puede empezar antes que su encabezado
+PERFIL_TOLERANCIA_Y = 3  # Diferencia de 'top' para considerar dos palabras en la misma línea
+PERFIL_SEPARACION_MINIMA = 6  # Hueco mínimo entre encabezados para tratarlos como columnas
+
+def _normalizar(texto):
+    """Minúsculas y sin acentos, para comparar encabezados"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+def campo_encabezado(texto):
+    """Devuelve el campo que representa una celda de encabezado, o None"""
+    palabras = set(re.findall(r'[a-z]+|#', _normalizar(texto)))
+    if palabras & _PALABRAS_EXCLUIDAS:
+        return None
+    # "Nombre y Apellidos" es el nombre completo
+    if palabras & {'nombre', 'first', 'firstname'} and palabras & _PALABRAS_ENCABEZADO['apellido']:
+        return 'nombre'
+    for campo, claves in _PALABRAS_ENCABEZADO.items():
+        if palabras & claves:
+            return campo
+    return None
+
+def _registro_desde_fila(row, indices):
+    """Convierte una fila (lista de celdas) en un registro, o None si no es una fila de resultado"""
+    idx_posicion = indices['posicion']
+    idx_nombre = indices['nombre']
+    idx_bib = indices.get('dorsal')
+    idx_categoria = indices.get('categoria')
+    idx_tiempo = indices.get('tiempo')
+
+    # Extraer posición
+    posicion_str = str(row[idx_posicion]).strip() if idx_posicion < len(row) and row[idx_posicion] else ""
+    if not posicion_str or not posicion_str.isdigit():
+        return None
+
+    posicion = int(posicion_str)
+
+    # Extraer nombre
+    nombre_completo = str(row[idx_nombre]).strip() if idx_nombre < len(row) and row[idx_nombre] else ""
+    if not nombre_completo:
+        return None
+
+    # Extraer dorsal/bib
+    bib = None
+    if idx_bib is not None and idx_bib < len(row) and row[idx_bib]:
+        bib_str = str(row[idx_bib]).strip()
+        if bib_str.isdigit():
+            bib = bib_str
+
+    # Extraer tiempo (buscar específicamente en la columna Time)
+    tiempo = None
+    if idx_tiempo is not None and idx_tiempo < len(row) and row[idx_tiempo]:
+        tiempo_str = str(row[idx_tiempo]).strip()
+        # Validar que sea un tiempo (contenga : o ∶)
+        if tiempo_str and (':' in tiempo_str or '∶' in tiempo_str):
+            tiempo = tiempo_str
+
+    # Extraer categoría
+    categoria = None
+    if idx_categoria is not None and idx_categoria < len(row) and row[idx_categoria]:
+        categoria = str(row[idx_categoria]).strip()
+
+    # Separar nombre y apellido
+    nombre_parts = nombre_completo.split()
+    primer_nombre = nombre_parts[0] if nombre_parts else ""
+    apellido = ' '.join(nombre_parts[1:]) if len(nombre_parts) > 1 else ""
+
+    if not (posicion and primer_nombre):
+        return None
+
+    if log_filas.isEnabledFor(logging.DEBUG):
+        log_filas.debug('Fila extraída', extra={'posicion': posicion, 'nombre': f'{primer_nombre} {apellido}',
+                                                'categoria': categoria, 'tiempo': tiempo})
+    return {
+        'posicion': posicion,
+        'nombre': primer_nombre,
+        'apellido': apellido,
+        'tiempo': tiempo,
+        'categoria': categoria,
+        'equipo': None,
+        'dorsal': bib,
+        'puntos': None
+    }
+
+def _extraer_registros_tabla(table, advertencias):
+    """Convierte una tabla extraída (lista de filas) en registros de ranking.
+    Las filas que no se pueden leer se anotan en advertencias."""
+    registros = []
+
+    # Identificar columnas por encabezado (primera fila)
+    if not table or len(table) < 2:
+        return registros
+
+    encabezado = [str(h).strip().lower() if h else "" for h in table[0]]
+    log.debug('Encabezado de tabla', extra={'encabezado': encabezado})
+
+    # Buscar índices de columnas importantes (si hay tiempo chip y gun, gana chip)
+    indices = {}
+    for col_idx, col_nombre in enumerate(encabezado):
+        campo = campo_encabezado(col_nombre)
+        if campo and (campo not in indices or (campo == 'tiempo' and 'chip' in col_nombre)):
+            indices[campo] = col_idx
+
+    log.debug('Columnas detectadas', extra={'columnas': indices})
+
+    # Si no encontró las columnas por encabezado, usar posiciones por defecto
+    indices.setdefault('posicion', 0)
+    indices.setdefault('nombre', 2)
+
+    # Procesar filas de datos (desde la fila 1, saltando encabezado)
+    for row_idx in range(1, len(table)):
+        row = table[row_idx]
+
+        if not row or not any(row):
+            continue
+
+        try:
+            registro = _registro_desde_fila(row, indices)
+            if registro:
+                registros.append(registro)
+        except (ValueError, IndexError, AttributeError) as e:
+            log.warning('Error en fila %s: %s', row_idx, e)
+            advertencias.append(f"Fila {row_idx}: {e}")
+            continue
+
+    return registros
+
+def _agrupar_lineas(words):
+    """Agrupa las palabras de una página en líneas (ordenadas de arriba a abajo y por x)"""
+    lineas = []
+    for word in sorted(words, key=lambda w: (round(w['top']), w['x0'])):
+        if lineas and abs(word['top'] - lineas[-1][0]['top']) <= PERFIL_TOLERANCIA_Y:
+            lineas[-1].append(word)
+        else:
+            lineas.append([word])
+    for linea in lineas:
+        linea.sort(key=lambda w: w['x0'])
+    return lineas
+
+def _limites_encabezado(linea, perfil):
+    """Si la línea es el encabezado del perfil, devuelve las fronteras x entre columnas"""
+    textos = [_normalizar(w['text']).strip('.:') for w in linea]
+    firma = [palabra for encabezado, _ in perfil['columnas'] for palabra in encabezado.split()]
+    if textos != firma:
+        return None
+
+    # Primera y última palabra de cada columna del encabezado
+    columnas = []
+    i = 0
+    for encabezado, _ in perfil['columnas']:
+        n = len(encabezado.split())
+        columnas.append((linea[i], linea[i + n - 1]))
+        i += n
+
+    # Un encabezado escrito como texto corrido no es un diseño en columnas
+    if any(sig[0]['x0'] - ant[1]['x1'] < PERFIL_SEPARACION_MINIMA
+           for ant, sig in zip(columnas, columnas[1:])):
+        return None
+
+    return [inicio['x0'] - PERFIL_TOLERANCIA_X for inicio, _ in columnas[1:]]
+
+def detectar_perfil(page):
+    """Busca en la página un encabezado que coincida con algún perfil de cronometraje.
+
+    Devuelve una copia del perfil con 'limites_x' (fronteras entre columnas)
+    calculados a partir de la posición de cada encabezado, o None.
+    """
+    for linea in _agrupar_lineas(page.extract_words()):
+        for perfil in PERFILES_CRONOMETRAJE:
+            limites = _limites_encabezado(linea, perfil)
+            if limites is None:
+                continue
+
+            perfil = dict(perfil)
+            if 'limites_x' in perfil:
+                perfil['limites_fijos'] = True
+            else:
+                perfil['limites_x'] = limites
+            log.info('Perfil de cronometraje detectado', extra={'perfil': perfil['nombre']})
+            return perfil
+    return None
+
+def _extraer_registros_perfil(page, perfil, advertencias):
+    """Extrae registros por posición de palabras usando los rangos x del perfil,
+    sin detección de tablas. Sirve también para páginas sin encabezado (se usan
+    los rangos del último encabezado visto en la página o, si no, los detectados)."""
+    registros = []
+    lineas_sin_columnas = []
+    limites = perfil['limites_x']
+    indices = {campo: i for i, (_, campo) in enumerate(perfil['columnas']) if campo}
+    formato_tiempo = re.compile(perfil['formato_tiempo'])
+
+    for linea in _agrupar_lineas(page.extract_words()):
+        # Cada tabla puede tener otro ancho de columnas: su encabezado vuelve a fijarlas
+        limites_tabla = _limites_encabezado(linea, perfil)
+        if limites_tabla is not None:
+            if not perfil.get('limites_fijos'):
+                limites = limites_tabla
+            continue
+
+        celdas = [[] for _ in perfil['columnas']]
+        for word in linea:
+            columna = bisect_right(limites, word['x0'])
+            # Una palabra que invade la columna siguiente indica que la línea no sigue el diseño
+            if columna < len(limites) and word['x1'] > limites[columna] + PERFIL_TOLERANCIA_X:
+                celdas = None
+                break
+            celdas[columna].append(word['text'])
+        if celdas is None:
+            lineas_sin_columnas.append(' '.join(w['text'] for w in linea))
+            continue
+        row = [' '.join(celda) for celda in celdas]
+
+        try:
+            registro = _registro_desde_fila(row, indices)
+        except (ValueError, IndexError, AttributeError) as e:
+            advertencias.append(f"Línea '{' '.join(row)[:60]}': {e}")
+            continue
+
+        if registro:
+            if registro['tiempo'] and not formato_tiempo.fullmatch(registro['tiempo']):
+                advertencias.append(f"Tiempo con formato inesperado en posición {registro['posicion']}: {registro['tiempo']}")
+                registro['tiempo'] = None
+            registros.append(registro)
+
+    # Filas de una tabla cuyo encabezado quedó en la página anterior (con otro
+    # ancho de columnas): se leen como texto
+    rescatados = list(_parsear_lineas_texto(lineas_sin_columnas))
+    if rescatados:
+        advertencias.append(f"{len(rescatados)} fila(s) fuera de las columnas del perfil, leídas como texto")
+        registros.extend(rescatados)
+
+    return registros
+
+def _procesar_pagina(page, page_num, total_paginas, perfil=None):
+    """Extrae los registros de las tablas de una página.
+
+    Devuelve (registros, advertencias, lineas). El texto solo se extrae si la
+    página no dio filas desde tablas (es lo único que necesitaría el parser de
+    texto), y al terminar se liberan los objetos cacheados de la página.
+    """
+    log.debug('Procesando página %s/%s', page_num + 1, total_paginas)
+    registros = []
+    advertencias = []
+    lineas = None
+
+    # Con un perfil de cronometraje, leer por posición de palabras (mucho más rápido)
+    if perfil:
+        registros = _extraer_registros_perfil(page, perfil, advertencias)
+        advertencias = [f"Página {page_num + 1}: {a}" for a in advertencias]
+
+    # Sin perfil (o si el perfil no encontró filas), detección genérica de tablas
+    if not registros:
+        tables = page.extract_tables()
+
+        if tables:
+            log.debug('Se encontraron %s tabla(s)', len(tables))
+
+            for table_idx, table in enumerate(tables):
+                log.debug('Tabla %s: %s filas x %s columnas', table_idx + 1, len(table), len(table[0]) if table else 0)
+                advertencias_tabla = []
+                registros.extend(_extraer_registros_tabla(table, advertencias_tabla))
+                advertencias.extend(f"Página {page_num + 1}, tabla {table_idx + 1}: {a}" for a in advertencias_tabla)
+        else:
+            log.debug('Página %s sin tablas, se extrae el texto', page_num + 1)
+            advertencias.append(f"Página {page_num + 1}: no se encontraron tablas")
+
+    if not registros:
+        text = page.extract_text() or ""
+        lineas = text.split('\n')
+
+    page.flush_cache()
+    return registros, advertencias, lineas
+
+# Estado de cada proceso del pool: el PDF se abre una sola vez por proceso
+_pdf_worker = None
+_perfil_worker = None
+
+def _iniciar_worker(pdf_data, perfil):
+    """Inicializador del pool: abre el PDF desde los bytes compartidos"""
+    global _pdf_worker, _perfil_worker
+    import pdfplumber
+    _pdf_worker = pdfplumber.open(io.BytesIO(pdf_data))
+    _perfil_worker = perfil
+    configurar_logs()
+
+def _procesar_pagina_worker(page_num):
+    return _procesar_pagina(_pdf_worker.pages[page_num], page_num, len(_pdf_worker.pages), _perfil_worker)
+
+def _acumular_paginas(resultados, total_paginas, progreso):
+    """Une los resultados por página (en orden) e informa el avance.
+
+    Devuelve (registros, lineas_por_pagina). Las líneas de texto se guardan
+    solo mientras ninguna tabla haya dado filas; después ya no hacen falta.
+    """
+    registros = []
+    lineas_por_pagina = []
+    for page_num, (registros_pagina, advertencias, lineas) in enumerate(resultados, 1):
+        registros.extend(registros_pagina)
+        if registros:
+            lineas_por_pagina = None
+        elif lineas_por_pagina is not None:
+            lineas_por_pagina.append(lineas)
+        if progreso:
+            progreso(page_num, total_paginas, len(registros), advertencias)
+    return registros, lineas_por_pagina
+
+def _extraer_paginas(pdf_data, procesos=None, progreso=None):
+    """Recorre todas las páginas una sola vez, en orden de página.
+
+    Devuelve (registros de tablas, líneas de texto por página para el parser
+    de texto o None). Con suficientes páginas, reparte las páginas entre un
+    pool acotado de procesos; cada proceso abre el PDF una vez a partir de los
+    mismos bytes.
+    """
+    # pdfplumber (y pdfminer) pesan: se cargan con el primer PDF, no al importar el módulo
+    import pdfplumber
+
+    procesos = PDF_MAX_PROCESOS if procesos is None else procesos
+
+    with pdfplumber.open(io.BytesIO(pdf_data)) as pdf:
+        total_paginas = len(pdf.pages)
+        log.info('PDF abierto', extra={'paginas': total_paginas})
+
+        # El diseño del proveedor se detecta en la primera página y se usa en todas
+        perfil = detectar_perfil(pdf.pages[0]) if total_paginas else None
+
+        if procesos <= 1 or total_paginas < PDF_PAGINAS_MINIMAS_POOL:
+            resultados = (
+                _procesar_pagina(page, page_num, total_paginas, perfil)
+                for page_num, page in enumerate(pdf.pages)
+            )
+            return _acumular_paginas(resultados, total_paginas, progreso)
+
+    # spawn: no heredar hilos ni conexiones del worker de gunicorn
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=min(procesos, total_paginas),
+        mp_context=contexto,
+        initializer=_iniciar_worker,
+        initargs=(pdf_data, perfil)
+    ) as pool:
+        # map conserva el orden de las páginas aunque terminen desordenadas
+        resultados = pool.map(_procesar_pagina_worker, range(total_paginas))
+        return _acumular_paginas(resultados, total_paginas, progreso)
+
+def _parsear_lineas_texto(lineas):
+    """Genera registros a partir de líneas de texto plano (cuando no hay tablas)"""
+    for linea in lineas:
+        if not linea.strip():
+            continue
+
+        # Saltar encabezados
+        if 'Pl' in linea and 'Bib' in linea:
+            continue
+
+        try:
+            # Dividir por espacios múltiples
+            partes = linea.strip().split()
+
+            if len(partes) < 3:
+                continue
+
+            # Intentar parsear posición (debe ser número)
+            if not partes[0].isdigit():
+                continue
+
+            posicion = int(partes[0])
+
+            # Estructura esperada: [Posición, Dorsal, Nombre(s)..., Categoría, Tiempo]
+            # Buscar dorsal (2do elemento, debe ser número)
+            dorsal = None
+            nombre_start = 1
+
+            if len(partes) > 1 and partes[1].isdigit():
+                dorsal = partes[1]
+                nombre_start = 2
+            else:
+                nombre_start = 1
+
+            # Buscar categoría y tiempo desde el final
+            categoria = None
+            tiempo = None
+            nombre_end = len(partes)
+
+            for idx in range(len(partes) - 1, nombre_start - 1, -1):
+                parte = partes[idx]
+
+                # Buscar tiempo (contiene ":" o "∶" - HH:MM:SS o MM:SS.S)
+                # Validar que tenga formato de tiempo
+                if (':' in parte or '∶' in parte) and not tiempo:
+                    # Debe tener dígitos alrededor de los dos puntos
+                    if any(c.isdigit() for c in parte):
+                        tiempo = parte
+                        nombre_end = idx
+                        continue
+
+                # Buscar categoría (M/F seguido de números, o Juvenil)
+                if not categoria:
+                    if (parte.startswith('M') or parte.startswith('F')) and any(c.isdigit() for c in parte):
+                        categoria = parte
+                        nombre_end = idx
+                        continue
+
+                    if 'Juvenil' in parte or 'Senior' in parte or 'Master' in parte or 'y Más' in parte:
+                        categoria = parte
+                        nombre_end = idx
+                        continue
+                if 'Juvenil' in parte or 'Senior' in parte or 'Master' in parte:
+                    categoria = parte
+                    nombre_end = idx
+                    continue
+
+            # Extraer nombre (entre inicio y fin)
+            nombre_partes = partes[nombre_start:nombre_end]
+            nombre_completo = ' '.join(nombre_partes)
+
+            if not nombre_completo or not nombre_completo.strip():
+                continue
+
+            # Limpiar nombres que contienen caracteres especiales o números
+            if any(c.isdigit() for c in nombre_completo):
+                continue
+
+            # Separar nombre y apellido
+            nombre_split = nombre_completo.split()
+            primer_nombre = nombre_split[0] if nombre_split else ""
+            apellido = ' '.join(nombre_split[1:]) if len(nombre_split) > 1 else ""
+
+            if posicion and primer_nombre and len(primer_nombre) > 1:
+                yield {
+                    'posicion': posicion,
+                    'nombre': primer_nombre,
+                    'apellido': apellido,
+                    'tiempo': tiempo,
+                    'categoria': categoria,
+                    'equipo': None,
+                    'dorsal': dorsal,
+                    'puntos': None
+                }
+                if log_filas.isEnabledFor(logging.DEBUG):
+                    log_filas.debug('Fila extraída de texto', extra={'posicion': posicion,
+                                                                    'nombre': f'{primer_nombre} {apellido}',
+                                                                    'categoria': categoria, 'tiempo': tiempo})
+
+        except Exception as e:
+            log.warning('Error en línea %r: %s', linea[:60], e)
+            continue
+
+def extraer_registros_pdf(pdf_data, procesos=None, progreso=None):
+    """Extrae los registros de resultados de un PDF (bytes).
+
+    Primero intenta con las tablas de cada página; si no sale ningún registro,
+    parsea el texto línea por línea. Si se pasa progreso, se llama como
+    progreso(paginas_procesadas, paginas_total, registros_extraidos, advertencias)
+    después de cada página. Lanza la excepción de pdfplumber si el archivo no
+    se puede leer.
+    """
+    registros, lineas_por_pagina = _extraer_paginas(pdf_data, procesos, progreso)
+
+    # Si no se extrajeron registros de tablas, parsear el texto ya extraído
+    if not registros:
+        log.info('No se encontraron registros en tablas, se parsea el texto')
+        registros = list(_parsear_lineas_texto(chain.from_iterable(lineas_por_pagina)))
+        if progreso:
+            progreso(None, None, len(registros), ['Sin tablas: resultados leídos del texto del PDF'])
+
+    return registros
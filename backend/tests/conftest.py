@@ -0,0 +1,12 @@
+"""Configuración común de las pruebas.
+
+Las pruebas unitarias no necesitan base de datos: sin DATABASE_URL, app se
+importa apuntando a una dirección sin servidor (como los benchmarks) y las
+pruebas que sí la usan se omiten.
+"""
+import os
+import sys
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:1/pruebas')
+os.environ.setdefault('LOG_NIVEL', 'CRITICAL')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,37 @@
+"""Clasificación de las búsquedas del mostrador de check-in, sin base de datos."""
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize('q, criterio, params', [
+    ('17', 'dorsal', (17,)),
+    ('007', 'dorsal', (7,)),
+    ('123456789', 'dorsal', (123456789,)),
+    ('reg-1a', 'codigo', ('REG-1A%',)),
+    ('REG-', 'codigo', ('REG-%',)),
+    ('Ana@Correo', 'correo', ('ana@correo%',)),
+    ('María Pe', 'nombre', ('María Pe%', 'María Pe%')),
+])
+def test_clasificar_busqueda(q, criterio, params):
+    assert app.clasificar_busqueda(q)[1:] == (params, criterio)
+
+
+@pytest.mark.parametrize('q', ['1234567890', '²', '١٢', '12 3', '-5'])
+def test_digitos_que_no_son_dorsal_buscan_por_nombre(q):
+    assert app.clasificar_busqueda(q)[2] == 'nombre'
+
+
+def test_codigo_no_hexadecimal_busca_por_nombre():
+    assert app.clasificar_busqueda('REG-XYZ')[2] == 'nombre'
+
+
+def test_busqueda_escapa_comodines_like():
+    assert app.clasificar_busqueda('50%_a\\b')[1] == ('50\\%\\_a\\\\b%',) * 2
+
+
+def test_busqueda_por_nombre_sin_tildes():
+    condicion, params, _ = app.clasificar_busqueda('Núñez')
+
+    assert condicion.count('%s') == len(params) == 2
+    assert 'nombre_busqueda' in condicion and 'apellido_busqueda' in condicion
@@ -0,0 +1,73 @@
+"""Caché en memoria de los endpoints públicos, sin base de datos."""
+import queue
+
+import app
+
+
+class DifusorSinEventos:
+    """Como DifusorEventos, pero sin hilo LISTEN: nunca llegan invalidaciones remotas"""
+    escuchando = False
+
+    def suscribir(self, clave):
+        return queue.Queue()
+
+
+def cache(ttl=60, max_entradas=3):
+    return app.CacheRespuestas(ttl, DifusorSinEventos(), max_entradas=max_entradas)
+
+
+def test_acierto_y_fallo():
+    cacheada = cache()
+
+    assert cacheada.obtener('rankings', ('rankings',), lambda: 'a') == ('a', False)
+    assert cacheada.obtener('rankings', ('rankings',), lambda: 'b') == ('a', True)
+
+
+def test_none_no_se_guarda():
+    cacheada = cache()
+
+    cacheada.obtener('contador_registros:99', ('carreras',), lambda: None)
+
+    assert cacheada.estadisticas()['entradas'] == 0
+
+
+def test_llena_descarta_la_mas_antigua():
+    cacheada = cache(max_entradas=2)
+
+    for clave in ('a', 'b', 'c'):
+        cacheada.obtener(clave, ('carreras',), lambda: clave)
+
+    assert cacheada.estadisticas()['entradas'] == 2
+    assert cacheada.obtener('a', ('carreras',), lambda: 'nueva') == ('nueva', False)
+    assert cacheada.obtener('c', ('carreras',), lambda: 'otra') == ('c', True)
+
+
+def test_vencida_se_descarta_al_leer():
+    cacheada = cache(ttl=0)
+
+    cacheada.obtener('rankings', ('rankings',), lambda: 'a')
+
+    assert cacheada.obtener('rankings', ('rankings',), lambda: 'b') == ('b', False)
+    assert cacheada.estadisticas()['entradas'] == 1
+
+
+def test_invalidar_por_tabla():
+    cacheada = cache()
+    cacheada.obtener('rankings', ('rankings',), lambda: 'a')
+    cacheada.obtener('carreras', ('carreras',), lambda: 'b')
+
+    cacheada.invalidar('rankings')
+
+    assert cacheada.obtener('rankings', ('rankings',), lambda: 'c') == ('c', False)
+    assert cacheada.obtener('carreras', ('carreras',), lambda: 'd') == ('b', True)
+
+
+def test_estadisticas_por_endpoint():
+    cacheada = cache(max_entradas=100)
+
+    for carrera_id in range(50):
+        cacheada.obtener(f'contador_registros:{carrera_id}', ('carreras',), lambda: {})
+
+    assert cacheada.estadisticas()['claves'] == {
+        'contador_registros': {'aciertos': 0, 'fallos': 50, 'ratio': 0.0}
+    }
@@ -0,0 +1,93 @@
+"""Lectura de los lotes de check-in y de las operaciones de los kioskos, sin base de datos."""
+import pytest
+
+import app
+
+
+def test_lote_codigos_y_dorsales_en_listas_paralelas():
+    codigos, dorsales = app.leer_lote_checkin({'codigos': [' reg-1a2b ', 'REG-3C4D'], 'dorsales': [7, '12']})
+
+    assert codigos == ['REG-1A2B', 'REG-3C4D', None, None]
+    assert dorsales == [None, None, 7, 12]
+
+
+def test_lote_solo_dorsales():
+    assert app.leer_lote_checkin({'dorsales': ['5'], 'codigos': None}) == ([None], [5])
+
+
+@pytest.mark.parametrize('data, mensaje', [
+    ({}, 'Envía codigos o dorsales'),
+    ({'codigos': [], 'dorsales': []}, 'Envía codigos o dorsales'),
+    ({'codigos': 'REG-1A2B'}, 'deben ser listas'),
+    ({'dorsales': {'1': 2}}, 'deben ser listas'),
+    ({'dorsales': ['7', 'x']}, 'deben ser números'),
+    ({'dorsales': [None]}, 'deben ser números'),
+    ({'codigos': ['REG'] * app.CHECKIN_LOTE_MAXIMO, 'dorsales': [1]}, 'Máximo'),
+])
+def test_lote_invalido(data, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        app.leer_lote_checkin(data)
+
+
+def test_lote_en_el_maximo():
+    codigos, dorsales = app.leer_lote_checkin({'dorsales': list(range(app.CHECKIN_LOTE_MAXIMO))})
+
+    assert len(codigos) == len(dorsales) == app.CHECKIN_LOTE_MAXIMO
+
+
+def op(op_id, fecha=None, tipo='marcar_asistencia', **campos):
+    return {'op_id': op_id, 'tipo': tipo, 'fecha': fecha, **campos}
+
+
+def test_operaciones_ordenadas_por_fecha_y_op_id():
+    validas, rechazadas = app.leer_operaciones_sync({'operaciones': [
+        op('c', '2024-05-01T08:00:00'), op('b', '2024-05-01T07:00:00'), op('a', '2024-05-01T08:00:00'),
+    ]})
+
+    assert [o['op_id'] for _, o in validas] == ['b', 'a', 'c']
+    assert rechazadas == {}
+
+
+def test_operaciones_fecha_con_zona_o_z():
+    (fecha_z, _), (fecha_offset, _) = app.leer_operaciones_sync({'operaciones': [
+        op('a', '2024-05-01T12:00:00Z'), op('b', '2024-05-01T12:00:00.500+00:00'),
+    ]})[0]
+
+    assert fecha_z.tzinfo is None
+    assert (fecha_offset - fecha_z).total_seconds() == 0.5
+
+
+def test_operaciones_fecha_futura_cuenta_como_ahora():
+    antes = app.datetime.now()
+
+    validas, _ = app.leer_operaciones_sync({'operaciones': [op('a', '2999-01-01T00:00:00'), op('b')]})
+
+    assert all(antes <= fecha <= app.datetime.now() for fecha, _ in validas)
+
+
+def test_operaciones_invalidas_se_rechazan_una_por_una():
+    validas, rechazadas = app.leer_operaciones_sync({'operaciones': [
+        op('ok', '2024-05-01T08:00:00', dorsal='12'),
+        op('fecha', 'ayer'),
+        op('numero', 1714550400),
+        op('tipo', tipo='borrar'),
+        op('dorsal', dorsal='²'),
+        op('bool', dorsal=True),
+        op('asistio', asistio='si'),
+    ]})
+
+    assert [o['op_id'] for _, o in validas] == ['ok']
+    assert set(rechazadas) == {'fecha', 'numero', 'tipo', 'dorsal', 'bool', 'asistio'}
+    assert all(r['resultado'] == 'rechazada' and r['error'] for r in rechazadas.values())
+
+
+@pytest.mark.parametrize('data, mensaje', [
+    ({}, 'lista de operaciones'),
+    ({'operaciones': []}, 'lista de operaciones'),
+    ({'operaciones': [op('a'), {'tipo': 'marcar_asistencia'}]}, 'op_id'),
+    ({'operaciones': [op('x' * 65)]}, 'op_id'),
+    ({'operaciones': [op(str(i)) for i in range(app.SYNC_OPERACIONES_MAXIMO + 1)]}, 'Máximo'),
+])
+def test_envio_invalido(data, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        app.leer_operaciones_sync(data)
@@ -0,0 +1,136 @@
+"""Importación de resultados desde CSV por el cliente de pruebas de Flask.
+
+Usa la base de datos de DATABASE_URL (se omite si no hay una disponible):
+    DATABASE_URL=postgresql://... python -m pytest backend/tests
+La lectura y validación de las filas se prueba sin base de datos en
+test_lectura_resultados.py.
+"""
+import io
+import secrets
+
+import pytest
+
+import app as aplicacion
+
+CSV_UTF8 = (
+    'Pos,Dorsal,Nombre,Categoría,Tiempo\r\n'
+    '2,17,María Núñez,F30-39,0:41:10\r\n'
+    '1,5,José Peña,M30-39,38:02\r\n'
+    '3,"9","Ortiz, Ana",F20-29,1:02:33.5\r\n'
+).encode('utf-8-sig')
+
+# Exportación típica de Excel en Windows: cp1252 y punto y coma
+CSV_CP1252 = (
+    'Pos;Dorsal;Nombre;Tiempo\r\n'
+    '1;5;José Peña;38:02\r\n'
+    '2;17;María Núñez;41:10\r\n'
+).encode('cp1252')
+
+
+@pytest.fixture(scope='module')
+def conexion():
+    conn = aplicacion.get_db_connection()
+    if not conn:
+        pytest.skip('Base de datos no disponible')
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope='module')
+def cliente(conexion):
+    """Cliente con un administrador temporal autenticado"""
+    with conexion.cursor() as cur:
+        cur.execute('''
+            INSERT INTO administradores (email, password_hash, nombre)
+            VALUES (%s, 'x', 'Pruebas') RETURNING id, email
+        ''', (f'pruebas-{secrets.token_hex(4)}@test.local',))
+        admin_id, email = cur.fetchone()
+    conexion.commit()
+
+    token = aplicacion.generar_token_admin(admin_id, email)
+    cliente = aplicacion.app.test_client()
+    cliente.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    yield cliente
+
+    with conexion.cursor() as cur:
+        cur.execute('DELETE FROM rankings WHERE creado_por = %s', (admin_id,))
+        cur.execute('DELETE FROM admin_tokens WHERE admin_id = %s', (admin_id,))
+        cur.execute('DELETE FROM administradores WHERE id = %s', (admin_id,))
+    conexion.commit()
+
+
+def subir(cliente, url, contenido, nombre='resultados.csv', **campos):
+    return cliente.post(url, data={**campos, 'archivo': (io.BytesIO(contenido), nombre)},
+                        content_type='multipart/form-data')
+
+
+def registros_ranking(conexion, ranking_id):
+    with conexion.cursor() as cur:
+        cur.execute('''
+            SELECT posicion, dorsal, nombre, tiempo FROM ranking_registros
+            WHERE ranking_id = %s ORDER BY posicion
+        ''', (ranking_id,))
+        filas = cur.fetchall()
+    conexion.commit()
+    return filas
+
+
+def test_crear_ranking_desde_csv(cliente, conexion):
+    respuesta = subir(cliente, '/api/rankings/crear-desde-archivo', CSV_UTF8, titulo='CSV de prueba')
+
+    assert respuesta.status_code == 200, respuesta.get_json()
+    assert respuesta.get_json()['registros_count'] == 3
+    filas = registros_ranking(conexion, respuesta.get_json()['ranking_id'])
+    assert [(posicion, dorsal) for posicion, dorsal, _, _ in filas] == [(1, 5), (2, 17), (3, 9)]
+    assert filas[0][2] == 'José'
+    assert filas[2][3] == '01:02:33.50'
+
+
+def test_crear_ranking_desde_csv_cp1252(cliente, conexion):
+    respuesta = subir(cliente, '/api/rankings/crear-desde-archivo', CSV_CP1252, titulo='CSV Excel')
+
+    assert respuesta.status_code == 200, respuesta.get_json()
+    filas = registros_ranking(conexion, respuesta.get_json()['ranking_id'])
+    assert [nombre for _, _, nombre, _ in filas] == ['José', 'María']
+
+
+def test_crear_ranking_desde_csv_numeros_invalidos(cliente, conexion):
+    contenido = (
+        'Pos,Dorsal,Nombre,Tiempo\n'
+        '²,12345678901234,Ana Ortiz,40:00\n'
+        '2,x1,Luis Gómez,41:00\n'
+    ).encode('utf-8')
+    respuesta = subir(cliente, '/api/rankings/crear-desde-archivo', contenido, titulo='CSV raro')
+
+    assert respuesta.status_code == 200, respuesta.get_json()
+    assert len(respuesta.get_json()['advertencias']) == 2
+    filas = registros_ranking(conexion, respuesta.get_json()['ranking_id'])
+    assert [(posicion, dorsal) for posicion, dorsal, _, _ in filas] == [(1, None), (2, None)]
+
+
+def test_reimportar_csv(cliente):
+    ranking_id = subir(cliente, '/api/rankings/crear-desde-archivo', CSV_UTF8,
+                       titulo='CSV a corregir').get_json()['ranking_id']
+    corregido = CSV_UTF8.replace(b'0:41:10', b'0:40:10')
+
+    respuesta = subir(cliente, f'/api/rankings/{ranking_id}/reimportar', corregido)
+
+    assert respuesta.status_code == 200, respuesta.get_json()
+    assert respuesta.get_json()['resumen']['actualizar'] == 1
+
+
+def test_reimportar_csv_confirmar_exige_version(cliente, conexion):
+    ranking_id = subir(cliente, '/api/rankings/crear-desde-archivo', CSV_UTF8,
+                       titulo='CSV a confirmar').get_json()['ranking_id']
+    corregido = CSV_UTF8.replace(b'0:41:10', b'0:40:10')
+    url = f'/api/rankings/{ranking_id}/reimportar'
+
+    assert subir(cliente, url, corregido, confirmar='1').status_code == 409
+    assert subir(cliente, url, corregido, confirmar='1', version='otra').status_code == 409
+
+    version = subir(cliente, url, corregido).get_json()['version']
+    respuesta = subir(cliente, url, corregido, confirmar='1', version=version)
+
+    assert respuesta.status_code == 200, respuesta.get_json()
+    assert respuesta.get_json()['aplicado'] is True
+    assert '00:40:10' in [tiempo for _, _, _, tiempo in registros_ranking(conexion, ranking_id)]
@@ -0,0 +1,110 @@
+"""Lectura de archivos de resultados (CSV) y validación de filas, sin base de datos."""
+import io
+import tempfile
+
+import pytest
+
+import app
+
+
+def subido(contenido):
+    """Archivo como lo entrega Werkzeug: un SpooledTemporaryFile en memoria"""
+    archivo = tempfile.SpooledTemporaryFile(max_size=500 * 1024, mode='rb+')
+    archivo.write(contenido)
+    archivo.seek(0)
+    return archivo
+
+
+def registros(filas, encabezado=('Pos', 'Dorsal', 'Nombre', 'Tiempo')):
+    resumen = {'filas': 0, 'importados': 0, 'advertencias': []}
+    indices = app._indices_columnas(list(encabezado))
+    return list(app._registros_desde_filas(iter(filas), indices, resumen)), resumen
+
+
+def test_filas_csv_utf8_con_bom_y_comas():
+    filas = list(app._filas_csv(subido('Pos,Nombre\r\n1,"Peña, José"\r\n'.encode('utf-8-sig'))))
+
+    assert filas == [['Pos', 'Nombre'], ['1', 'Peña, José']]
+
+
+def test_filas_csv_cp1252_con_punto_y_coma():
+    filas = list(app._filas_csv(subido('Pos;Nombre\r\n1;María Núñez\r\n'.encode('cp1252'))))
+
+    assert filas == [['Pos', 'Nombre'], ['1', 'María Núñez']]
+
+
+def test_filas_csv_campo_con_salto_de_linea():
+    filas = list(app._filas_csv(subido(b'a,b\r\n1,"x\r\ny"\r\n2,z\r\n')))
+
+    assert filas == [['a', 'b'], ['1', 'x\r\ny'], ['2', 'z']]
+
+
+def test_filas_csv_acepta_bytesio():
+    assert list(app._filas_csv(io.BytesIO(b'a,b\n1,2\n'))) == [['a', 'b'], ['1', '2']]
+
+
+def test_indices_por_encabezado_prefiere_tiempo_chip():
+    indices = app._indices_columnas(['Pos', 'Bib', 'Name', 'Gun Time', 'Chip Time'])
+
+    assert indices == {'posicion': 0, 'dorsal': 1, 'nombre': 2, 'tiempo': 4}
+
+
+def test_indices_por_mapeo():
+    indices = app._indices_columnas(['A', 'Corredor', 'C'], {'nombre': 'corredor', 'tiempo': 2})
+
+    assert indices == {'nombre': 1, 'tiempo': 2}
+
+
+@pytest.mark.parametrize('mapeo, mensaje', [
+    ({'edad': 'A'}, 'Campo desconocido'),
+    ({'nombre': 'Z'}, 'no está en el encabezado'),
+    ({'tiempo': 'A'}, 'columna de nombre'),
+])
+def test_indices_mapeo_invalido(mapeo, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        app._indices_columnas(['A', 'B'], mapeo)
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('12', 12), ('0', 0), ('123456789', 123456789),
+    ('1234567890', None), ('²', None), ('١٢', None), ('', None), ('-1', None), ('1.5', None),
+])
+def test_entero_celda(texto, esperado):
+    assert app._entero_celda(texto) == esperado
+
+
+def test_registros_normaliza_tiempo_y_separa_apellido():
+    filas, resumen = registros([['2', '17', 'María Núñez Peña', '41:10'], ['1º', '5', 'José', '1:02:03.5']])
+
+    assert [(r['posicion'], r['dorsal'], r['nombre'], r['apellido'], r['tiempo']) for r in filas] == [
+        (2, 17, 'María', 'Núñez Peña', '00:41:10'),
+        (1, 5, 'José', '', '01:02:03.50'),
+    ]
+    assert resumen == {'filas': 2, 'importados': 2, 'advertencias': []}
+
+
+def test_registros_omite_filas_vacias_y_sin_nombre():
+    filas, resumen = registros([['', '', '', ''], ['3', '9', '', '40:00'], ['4', '10', 'Ana', '']])
+
+    assert [r['nombre'] for r in filas] == ['Ana']
+    assert resumen['filas'] == 3
+    assert resumen['advertencias'] == ['Fila 3: sin nombre, se omite']
+
+
+def test_registros_valores_invalidos_dejan_advertencia():
+    filas, resumen = registros(
+        [['x', 'B12', 'Ana Ortiz', 'DNF', 'mucho']],
+        encabezado=('Pos', 'Dorsal', 'Nombre', 'Tiempo', 'Puntos'),
+    )
+
+    assert (filas[0]['posicion'], filas[0]['dorsal'], filas[0]['tiempo'], filas[0]['puntos']) == (1, None, None, None)
+    assert len(resumen['advertencias']) == 3
+
+
+def test_registros_posicion_provisional_continua_entre_lotes(monkeypatch):
+    monkeypatch.setattr(app, 'IMPORT_FILAS_POR_LOTE', 2)
+
+    filas, resumen = registros([['', '', f'Corredor{i}', ''] for i in range(5)])
+
+    assert [r['posicion'] for r in filas] == [1, 2, 3, 4, 5]
+    assert resumen['importados'] == 5
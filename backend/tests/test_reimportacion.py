@@ -0,0 +1,104 @@
+"""Diff de la re-importación de resultados (emparejamiento y comparación), sin base de datos."""
+from decimal import Decimal
+
+import pytest
+
+import app
+
+
+def guardado(id, nombre, apellido='', dorsal=None, tiempo=None, categoria=None, equipo=None, puntos=None):
+    return {'id': id, 'nombre': nombre, 'apellido': apellido, 'dorsal': dorsal, 'tiempo': tiempo,
+            'categoria': categoria, 'equipo': equipo, 'puntos': puntos}
+
+
+def diff(existentes, nuevos, campos=app.REIMPORT_CAMPOS):
+    return app.calcular_diff_ranking(existentes, nuevos, campos)
+
+
+@pytest.mark.parametrize('campo, actual, nuevo', [
+    ('tiempo', '00:41:10', '41:10'),
+    ('tiempo', '01:02:03.50', '1:02:03.5'),
+    ('tiempo', None, ''),
+    ('puntos', Decimal('10.00'), '10'),
+    ('puntos', Decimal('7.50'), 7.5),
+    ('puntos', None, ''),
+    ('dorsal', 17, '17'),
+    ('categoria', '', None),
+])
+def test_valor_sin_cambio(campo, actual, nuevo):
+    assert not app._valor_cambio(campo, actual, nuevo)
+
+
+@pytest.mark.parametrize('campo, actual, nuevo', [
+    ('tiempo', '00:41:10', '00:41:11'),
+    ('tiempo', None, '40:00'),
+    ('tiempo', 'DNF', 'DNS'),
+    ('puntos', Decimal('10.00'), '10.5'),
+    ('puntos', Decimal('10.00'), None),
+    ('dorsal', None, 17),
+    ('categoria', 'M30-39', 'M40-49'),
+])
+def test_valor_con_cambio(campo, actual, nuevo):
+    assert app._valor_cambio(campo, actual, nuevo)
+
+
+def test_diff_empareja_por_dorsal_antes_que_por_nombre():
+    existentes = [guardado(1, 'Ana', 'Ortiz', dorsal=5), guardado(2, 'Luis', 'Gómez', dorsal=9)]
+    # Con el dorsal 5 se empareja aunque el apellido venga corregido; Luis, por nombre, con otro dorsal
+    nuevos = [{'nombre': 'Ana', 'apellido': 'Ortíz', 'dorsal': 5}, {'nombre': 'Luis', 'apellido': 'Gómez', 'dorsal': 12}]
+
+    insertar, actualizar, eliminar, sin_cambios = diff(existentes, nuevos, ('nombre', 'apellido', 'dorsal'))
+
+    assert (insertar, eliminar) == ([], [])
+    assert {a['id']: a['cambios'] for a in actualizar} == {
+        1: {'apellido': ['Ortiz', 'Ortíz']},
+        2: {'dorsal': [9, 12]},
+    }
+    assert sin_cambios == 0
+
+
+def test_diff_nombre_sin_tildes_ni_mayusculas():
+    existentes = [guardado(1, 'María', 'Núñez', tiempo='00:41:10')]
+    nuevos = [{'nombre': 'MARIA', 'apellido': 'nunez  ', 'tiempo': '41:10'}]
+
+    insertar, actualizar, eliminar, sin_cambios = diff(existentes, nuevos, ('tiempo',))
+
+    assert (insertar, actualizar, eliminar, sin_cambios) == ([], [], [], 1)
+
+
+def test_diff_nombres_repetidos_se_emparejan_uno_a_uno():
+    existentes = [guardado(1, 'Ana', 'Ortiz', tiempo='00:40:00'), guardado(2, 'Ana', 'Ortiz', tiempo='00:50:00')]
+    nuevos = [{'nombre': 'Ana', 'apellido': 'Ortiz', 'tiempo': t} for t in ('40:00', '50:00', '55:00')]
+
+    insertar, actualizar, eliminar, sin_cambios = diff(existentes, nuevos, ('tiempo',))
+
+    # En orden: el primero libre de cada nombre; la tercera Ana es nueva
+    assert insertar == [nuevos[2]]
+    assert (actualizar, eliminar, sin_cambios) == ([], [], 2)
+
+
+def test_diff_inserta_y_elimina_lo_que_no_se_empareja():
+    existentes = [guardado(1, 'Ana', dorsal=5), guardado(2, 'Luis', dorsal=9)]
+    nuevos = [{'nombre': 'Ana', 'dorsal': 5}, {'nombre': 'Eva', 'dorsal': 7}]
+
+    insertar, actualizar, eliminar, sin_cambios = diff(existentes, nuevos, ('nombre', 'dorsal'))
+
+    assert [n['nombre'] for n in insertar] == ['Eva']
+    assert [r['id'] for r in eliminar] == [2]
+    assert (actualizar, sin_cambios) == ([], 1)
+
+
+def test_diff_solo_compara_los_campos_pedidos():
+    existentes = [guardado(1, 'Ana', dorsal=5, equipo='Club A', puntos=Decimal('10.00'), tiempo='00:40:00')]
+    nuevos = [{'nombre': 'Ana', 'dorsal': 5, 'tiempo': '40:01'}]
+
+    _, actualizar, _, _ = diff(existentes, nuevos, app.REIMPORT_CAMPOS_PDF)
+
+    assert actualizar[0]['cambios'] == {'tiempo': ['00:40:00', '40:01']}
+
+
+def test_version_ranking_no_depende_del_orden():
+    registros = [guardado(2, 'Luis'), guardado(1, 'Ana', puntos=Decimal('1.5'))]
+
+    assert app._version_ranking(registros) == app._version_ranking(registros[::-1])
+    assert app._version_ranking(registros) != app._version_ranking([registros[0]])
@@ -16,9 +16,16 @@ pkill -f "python.*app.py" 2>/dev/null
 pkill -f "http.server 8000" 2>/dev/null
 sleep 2
 
+# Aplicar migraciones pendientes del esquema
+echo "🗄️  Aplicando migraciones..."
+cd /root/projects/vo2rank/backend
+if ! /root/projects/vo2rank/.venv/bin/python migraciones.py; then
+    echo "   ❌ Error al aplicar migraciones"
+    exit 1
+fi
+
 # Iniciar Backend (Puerto 5000)
 echo "📡 Iniciando Backend en puerto 5000..."
-cd /root/projects/vo2rank/backend
 /root/projects/vo2rank/.venv/bin/python app.py > /tmp/backend.log 2>&1 &
 BACKEND_PID=$!
 echo "   Backend PID: $BACKEND_PID"